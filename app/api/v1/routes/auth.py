@@ -1,105 +1,108 @@
-from fastapi import APIRouter, HTTPException, Depends, Header
+from fastapi import APIRouter, HTTPException, Depends, Header, Request
 from sqlalchemy.orm import Session
 from app.db.database import get_db
-from app.models.user import User, UserRole
-from app.models.blacklisted_token import BlacklistedToken
-from app.services.auth.jwt_handler import create_access_token, decode_access_token, create_refresh_token, decode_refresh_token, extract_token
+from app.models.user import User
+from app.core.config import jwt_config
+from app.services.auth.jwt_handler import decode_access_token, decode_refresh_token
 from app.services.auth.otp_handler import OTPHandler
-from app.utils.validators import normalize_phone_number
+from app.services.auth.dependencies import require_active_token
+from app.services.auth.rate_limiter import rate_limit
+from app.services.auth.blacklist import are_tokens_revoked, is_token_revoked, revoke_token
+from app.services.auth.refresh_families import create_refresh_family, rotate_refresh_token, revoke_refresh_family
+from app.services.auth.sessions import list_sessions, revoke_session, revoke_all_sessions
+from app.services.user_service import get_or_create_user_by_identifier
+from app.services.identifier_filter import get_identifier_filter
 from app.schemas.auth_schema import (
+    IdentifierRequest,
+    AuthCheckResponse,
     RequestOTPRequest,
     RequestOTPResponse,
     VerifyOTPRequest,
     VerifyOTPResponse,
     TokenResponse,
     RefreshRequest,
-    LogoutResponse
+    LogoutResponse,
+    SessionListResponse,
+    IntrospectRequest,
+    IntrospectResponse,
+    TokenIntrospection
 )
 
 router = APIRouter(prefix="/auth", tags=["Auth"])
 
 
+# Check whether an email or phone number is registered
+@router.post("/check", response_model=AuthCheckResponse, operation_id="checkIdentifierApi", dependencies=[Depends(rate_limit("check_identifier"))])
+def check_identifier(request: IdentifierRequest, db: Session = Depends(get_db)):
+    """Tell the login form whether to show sign-in or sign-up"""
+    identifier_type = OTPHandler.get_identifier_type(request.identifier)
+
+    # Most probes are for new identifiers; the bloom filter rules them out without a query
+    user_exists = (
+        get_identifier_filter().might_exist(request.identifier)
+        and OTPHandler.get_user_by_identifier(request.identifier, db) is not None
+    )
+
+    return AuthCheckResponse(
+        user_exists=user_exists,
+        message="User exists" if user_exists else "User not found",
+        identifier_type=identifier_type
+    )
+
+
 # Request OTP endpoint
-@router.post("/request-otp", response_model=RequestOTPResponse, operation_id="requestOtpApi")
-def request_otp(request: RequestOTPRequest, db: Session = Depends(get_db)):
+@router.post("/request-otp", response_model=RequestOTPResponse, operation_id="requestOtpApi", dependencies=[Depends(rate_limit("request_otp"))])
+def request_otp(request: RequestOTPRequest):
     """Request an OTP to be sent to the user's email or phone"""
 
-    # Check if user exists
-    user = OTPHandler.get_user_by_identifier(request.identifier, db)
     identifier_type = OTPHandler.get_identifier_type(request.identifier)
 
-    if not user:
-        # Create a temporary user record for OTP purposes
-        # This will be used to store the OTP temporarily
-        if identifier_type == "email":
-            user = User(
-                name="",  # Will be updated during verification
-                email=request.identifier,
-                phone_number=None,
-                role=UserRole.user
-            )
-        else:
-            # Normalize phone number before storing in database
-            normalized_phone = normalize_phone_number(request.identifier)
-            user = User(
-                name="",  # Will be updated during verification
-                email=None,
-                phone_number=normalized_phone,
-                role=UserRole.user
-            )
-        db.add(user)
-        db.commit()
-        db.refresh(user)
-
-    # Create OTP
-    otp = OTPHandler.create_otp(user.id)
+    # Create OTP keyed by identifier; the user row is only created on verification
+    otp = OTPHandler.create_otp(request.identifier)
+
+    # A code sent within the cooldown is still live, so don't send it again
+    if not otp["issued"]:
+        return RequestOTPResponse(
+            message=f"OTP already sent to your {identifier_type}",
+            identifier_type=identifier_type,
+            retry_after=otp["retry_after"]
+        )
 
     # Send OTP message to RabbitMQ
     success = OTPHandler.send_otp_message(request.identifier, otp["code"], identifier_type)
 
     if not success:
+        # Let the client retry immediately instead of waiting out the cooldown
+        OTPHandler.discard_otp(request.identifier)
         raise HTTPException(status_code=500, detail="Failed to send OTP message")
 
     return RequestOTPResponse(
         message=f"OTP sent successfully to your {identifier_type}",
-        identifier_type=identifier_type
+        identifier_type=identifier_type,
+        retry_after=otp["retry_after"]
     )
 
 
 # Verify OTP endpoint (merges signup and login logic)
-@router.post("/verify-otp", response_model=VerifyOTPResponse, operation_id="verifyOtpApi")
-def verify_otp(request: VerifyOTPRequest, db: Session = Depends(get_db)):
+@router.post("/verify-otp", response_model=VerifyOTPResponse, operation_id="verifyOtpApi", dependencies=[Depends(rate_limit("verify_otp"))])
+def verify_otp(request: VerifyOTPRequest, http_request: Request, db: Session = Depends(get_db)):
     """Verify OTP and authenticate user. Creates new user if doesn't exist."""
 
-    # Get user by identifier
-    user = OTPHandler.get_user_by_identifier(request.identifier, db)
-    identifier_type = OTPHandler.get_identifier_type(request.identifier)
+    # Validate OTP before touching the database
+    if not OTPHandler.validate_otp(request.identifier, request.otp_code):
+        raise HTTPException(status_code=400, detail="Invalid or expired OTP")
 
+    # Get user by identifier, creating it on first successful login
+    user = OTPHandler.get_user_by_identifier(request.identifier, db)
+    created = False
     if not user:
-        raise HTTPException(status_code=400, detail="User not found. Please request OTP first.")
+        user, created = get_or_create_user_by_identifier(db, request.identifier)
 
-    # Validate OTP
-    if not OTPHandler.validate_otp(user.id, request.otp_code):
-        raise HTTPException(status_code=400, detail="Invalid or expired OTP")
+    # New users have no name yet; they can add it later through profile update
+    is_new_user = created or not user.name
 
-    # Check if this is a new user (empty name indicates new user)
-    is_new_user = user.name == "" or user.name is None
-
-    # For new users, we don't require name during OTP verification
-    # Users can add their name later through profile update
-    if is_new_user:
-        # Keep the temporary name for now, user can update it later
-        pass
-
-    # Generate tokens
-    access_token = create_access_token({
-        "user_id": user.id,
-        "email": user.email,
-        "phone_number": user.phone_number
-    })
-    refresh_token = create_refresh_token({
-        "user_id": user.id
-    })
+    # Generate tokens for a new session
+    access_token, refresh_token = create_refresh_family(db, user, http_request.headers.get("user-agent"))
 
     return VerifyOTPResponse(
         access_token=access_token,
@@ -110,35 +113,47 @@ def verify_otp(request: VerifyOTPRequest, db: Session = Depends(get_db)):
 
 # Check current user
 @router.post("/check-user", operation_id="checkUserApi", include_in_schema=False)
-def check_user(
-    token: str = Depends(extract_token),
-    db: Session = Depends(get_db)
-):
-    payload = decode_access_token(token)
-    if not payload:
-        raise HTTPException(status_code=401, detail="Invalid token")
-    # Check if token is blacklisted
-    if db.query(BlacklistedToken).filter_by(token=token).first():
-        raise HTTPException(status_code=401, detail="Token blacklisted")
+def check_user(payload: dict = Depends(require_active_token)):
     return {"msg": "Token is valid"}
 
 
+# Validate many access tokens at once (for gateways)
+@router.post("/introspect", response_model=IntrospectResponse, operation_id="introspectApi", include_in_schema=False)
+def introspect(request: IntrospectRequest):
+    if len(request.tokens) > jwt_config.introspect_max_tokens:
+        raise HTTPException(status_code=413, detail=f"At most {jwt_config.introspect_max_tokens} tokens per request")
+
+    payloads = [decode_access_token(token) for token in request.tokens]
+    verified = [(token, payload) for token, payload in zip(request.tokens, payloads) if payload]
+    revoked = iter(are_tokens_revoked(verified))
+
+    results = []
+    for payload in payloads:
+        if not payload:
+            results.append(TokenIntrospection(active=False, error="invalid"))
+        elif next(revoked):
+            results.append(TokenIntrospection(active=False, error="revoked"))
+        else:
+            results.append(TokenIntrospection(active=True, claims=payload))
+    return IntrospectResponse(results=results)
+
+
 # Refresh token
-@router.post("/refresh", response_model=TokenResponse, operation_id="refreshTokenApi")
-def refresh_token(request: RefreshRequest, db: Session = Depends(get_db)):
+@router.post("/refresh", response_model=TokenResponse, operation_id="refreshTokenApi", dependencies=[Depends(rate_limit("refresh"))])
+def refresh_token(request: RefreshRequest, http_request: Request, db: Session = Depends(get_db)):
     refresh_token = request.refresh_token
     
     payload = decode_refresh_token(refresh_token)
     if not payload:
         raise HTTPException(status_code=401, detail="Invalid refresh token")
 
-    # Check Redis blacklist first (faster)
-    from app.services.auth.blacklist import is_token_blacklisted
-    if is_token_blacklisted(refresh_token):
-        raise HTTPException(status_code=401, detail="Token blacklisted")
+    # Family tokens rotate in a single Redis script call
+    if "fid" in payload:
+        access_token, new_refresh_token = rotate_refresh_token(db, payload)
+        return TokenResponse(access_token=access_token, refresh_token=new_refresh_token)
 
-    # Also check database blacklist for consistency
-    if db.query(BlacklistedToken).filter_by(token=refresh_token).first():
+    # Tokens issued before families existed are exchanged once for a family token
+    if is_token_revoked(refresh_token, payload):
         raise HTTPException(status_code=401, detail="Token blacklisted")
 
     user_id = payload["user_id"]
@@ -146,12 +161,8 @@ def refresh_token(request: RefreshRequest, db: Session = Depends(get_db)):
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
 
-    access_token = create_access_token({
-        "user_id": user.id,
-        "email": user.email,
-        "phone_number": user.phone_number
-    })
-    new_refresh_token = create_refresh_token({"user_id": user.id})
+    revoke_token(db, user.id, refresh_token, payload)
+    access_token, new_refresh_token = create_refresh_family(db, user, http_request.headers.get("user-agent"))
 
     return TokenResponse(access_token=access_token, refresh_token=new_refresh_token)
 
@@ -167,13 +178,37 @@ def logout(request: RefreshRequest, db: Session = Depends(get_db)):
 
     user_id = payload["user_id"]
     
-    # Blacklist refresh token in database
-    db.add(BlacklistedToken(user_id=user_id, token=refresh_token))
-    db.commit()
-    
-    # Also blacklist in Redis for faster access (7 days expiration)
-    from app.services.auth.blacklist import blacklist_token
-    blacklist_token(refresh_token, expires_in=7*24*3600)  # 7 days
+    if "fid" in payload:
+        # Kills this token and every token rotated from the same login
+        revoke_refresh_family(db, user_id, payload["fid"])
+    else:
+        # Blacklist refresh token by jti in database and Redis until it expires
+        revoke_token(db, user_id, refresh_token, payload)
     
     return {"msg": "Logged out successfully"}
 
+
+# List the caller's active sessions
+@router.get("/sessions", response_model=SessionListResponse, operation_id="listSessionsApi")
+def get_sessions(payload: dict = Depends(require_active_token)):
+    return SessionListResponse(sessions=list_sessions(payload["user_id"], payload.get("sid")))
+
+
+# Revoke one of the caller's sessions
+@router.delete("/sessions/{session_id}", response_model=LogoutResponse, operation_id="revokeSessionApi")
+def delete_session(
+    session_id: str,
+    payload: dict = Depends(require_active_token),
+    db: Session = Depends(get_db)
+):
+    if not revoke_session(db, payload["user_id"], session_id):
+        raise HTTPException(status_code=404, detail="Session not found")
+    return {"msg": "Session revoked successfully"}
+
+
+# Log out everywhere
+@router.post("/logout-all", response_model=LogoutResponse, operation_id="logoutAllApi")
+def logout_all(payload: dict = Depends(require_active_token), db: Session = Depends(get_db)):
+    # One INCR invalidates every access token; families are dropped in bulk
+    revoke_all_sessions(db, payload["user_id"])
+    return {"msg": "Logged out from all sessions successfully"}
@@ -0,0 +1,15 @@
+from fastapi import APIRouter
+from fastapi.responses import JSONResponse
+from app.core.config import jwt_config
+from app.services.auth.signing_keys import get_jwks
+
+router = APIRouter(tags=["Auth"])
+
+
+# Public keys for verifying access tokens without calling this service
+@router.get("/.well-known/jwks.json", operation_id="jwksApi", include_in_schema=False)
+def jwks():
+    return JSONResponse(
+        content=get_jwks(),
+        headers={"Cache-Control": f"public, max-age={jwt_config.jwks_max_age_seconds}"}
+    )
@@ -1,52 +1,96 @@
-from fastapi import APIRouter, Depends, HTTPException, Header
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, Header, Response
 from sqlalchemy.orm import Session
+from app.core.config import app_config
 from app.models.user import User
 from app.schemas.user_schema import UserCreate , UserOut, UserUpdate
 from app.db.database import get_db
-from app.services.auth.jwt_handler import decode_access_token, extract_token
-from app.models.blacklisted_token import BlacklistedToken
+from app.services.auth.dependencies import require_active_token
+from app.services.auth.jwt_handler import profile_claim_fields
+from app.services.auth.refresh_families import cache_access_claims
 from app.services.user_service import validate_and_update_user
+from app.services.identifier_filter import register_identifiers
+from app.services.user_cache import cache_user, invalidate_user, load_user
 
 router = APIRouter(prefix='/users',tags=["User"])
         
 # User creation is now handled through /auth/signup endpoint
 
+# Claims every access token carries, and the profile fields UserOut needs on top
+IDENTITY_CLAIMS = ("user_id", "phone_number", "email", "pv")
+PROFILE_FIELDS = ("name", "role")
+
+
+def stateless_profile_missing_claims() -> list:
+    """Profile fields the stateless profile needs but JWT_PROFILE_CLAIMS leaves out"""
+    configured = profile_claim_fields()
+    return [field for field in PROFILE_FIELDS if field not in configured]
+
+
+def _claims_are_current(payload: dict, client_version: Optional[int]) -> bool:
+    """Token carries the full profile and is at least as new as the client's copy"""
+    if not all(claim in payload for claim in IDENTITY_CLAIMS + PROFILE_FIELDS):
+        return False
+    return client_version is None or payload["pv"] >= client_version
+
+
 # Get current user info
 @router.get("/profile", response_model=UserOut, operation_id="getProfileApi")
 def get_current_user_info(
-    token: str = Depends(extract_token),
-    db: Session = Depends(get_db)
+    response: Response,
+    payload: dict = Depends(require_active_token),
+    db: Session = Depends(get_db),
+    x_profile_version: Optional[int] = Header(None)
 ):
-    # Check if token is blacklisted
-    if db.query(BlacklistedToken).filter_by(token=token).first():
-        raise HTTPException(status_code=401, detail="Token blacklisted")
-    
-    payload = decode_access_token(token)
-    if not payload:
-        raise HTTPException(status_code=401, detail="Invalid token")
-    user = db.query(User).filter_by(id=payload["user_id"]).first()
-    if not user:
+    # Answer from the verified token, no DB round-trip (session opens lazily)
+    if app_config.stateless_profile and _claims_are_current(payload, x_profile_version):
+        response.headers["X-Profile-Version"] = str(payload["pv"])
+        return UserOut(
+            id=payload["user_id"],
+            name=payload["name"],
+            phone_number=payload["phone_number"],
+            email=payload["email"],
+            role=payload["role"]
+        )
+
+    # Redis snapshot first; Postgres only on a cache miss
+    record = load_user(db, payload["user_id"])
+    if not record:
         raise HTTPException(status_code=404, detail="User not found")
-    return user
+    response.headers["X-Profile-Version"] = str(record["profile_version"])
+    return UserOut(
+        id=record["id"],
+        name=record["name"],
+        phone_number=record["phone_number"],
+        email=record["email"],
+        role=record["role"]
+    )
 
 # Update user profile
 @router.patch("/profile", response_model=UserOut, operation_id="updateProfileApi")
 def update_user_profile(
     update: UserUpdate,
-    token: str = Depends(extract_token),
+    response: Response,
+    payload: dict = Depends(require_active_token),
     db: Session = Depends(get_db)
 ):
-    # Check if token is blacklisted
-    if db.query(BlacklistedToken).filter_by(token=token).first():
-        raise HTTPException(status_code=401, detail="Token blacklisted")
-    
-    payload = decode_access_token(token)
-    if not payload:
-        raise HTTPException(status_code=401, detail="Invalid token")
     user = db.query(User).filter_by(id=payload["user_id"]).first()
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
+    previous_identifiers = (user.email, user.phone_number)
     user = validate_and_update_user(user, update, db)
     db.commit()
     db.refresh(user)
+    # Next /auth/refresh mints tokens with the updated claims
+    cache_access_claims(user)
+    # Drop keys of a replaced email or phone number, then write the new snapshot through
+    invalidate_user(user.id, *[
+        identifier for identifier in previous_identifiers
+        if identifier not in (user.email, user.phone_number)
+    ])
+    cache_user(user)
+    # New email or phone number must answer "exists" on every worker
+    register_identifiers(user.email, user.phone_number)
+    # Clients send this back as X-Profile-Version until their token catches up
+    response.headers["X-Profile-Version"] = str(user.profile_version)
     return user
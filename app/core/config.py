@@ -82,9 +82,57 @@ class JWTConfig(BaseSettings):
     secret_key: str = os.getenv("SECRET_KEY")
     refresh_secret_key: str = os.getenv("REFRESH_SECRET_KEY")
     algorithm: str = os.getenv("ALGORITHM", "HS256")
+    # Refresh tokens are only verified by this service, so they stay HMAC-signed
+    refresh_algorithm: str = os.getenv("REFRESH_ALGORITHM", "HS256")
     access_token_expire_minutes: int = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "60"))
     refresh_token_expire_days: int = int(os.getenv("REFRESH_TOKEN_EXPIRE_DAYS", "7"))
 
+    # In-process cache of tokens recently confirmed as not revoked
+    revocation_local_ttl_seconds: int = int(os.getenv("REVOCATION_LOCAL_TTL_SECONDS", "5"))
+    revocation_local_max_entries: int = int(os.getenv("REVOCATION_LOCAL_MAX_ENTRIES", "10000"))
+    # How long Redis is trusted to mirror the Postgres blacklist before it is rebuilt in the
+    # background; bounds how long an evicted revocation can go unnoticed
+    revocation_sync_ttl_seconds: int = int(os.getenv("REVOCATION_SYNC_TTL_SECONDS", "300"))
+
+    # Verified-token payload cache (0 disables it)
+    decode_cache_size: int = int(os.getenv("JWT_DECODE_CACHE_SIZE", "0"))
+    # Upper bound on tokens accepted by one /auth/introspect call
+    introspect_max_tokens: int = int(os.getenv("INTROSPECT_MAX_TOKENS", "500"))
+
+    # Asymmetric access-token keys (ALGORITHM=RS256/EdDSA), as "kid=/path/key.pem,..."
+    private_keys: Optional[str] = os.getenv("JWT_PRIVATE_KEYS")
+    public_keys: Optional[str] = os.getenv("JWT_PUBLIC_KEYS")  # Retired, verify-only keys
+    active_kid: Optional[str] = os.getenv("JWT_ACTIVE_KID")
+    jwks_max_age_seconds: int = int(os.getenv("JWKS_MAX_AGE_SECONDS", "300"))
+
+    # User fields embedded in access tokens alongside the profile version ("pv")
+    profile_claims: str = os.getenv("JWT_PROFILE_CLAIMS", "name,role,avatar_url")
+
+    class Config:
+        env_file = ".env"
+        case_sensitive = False
+
+
+class RateLimitConfig(BaseSettings):
+    """Rate limit settings; policies are "limit/period_seconds", empty disables one"""
+
+    enabled: bool = os.getenv("RATE_LIMIT_ENABLED", "true").lower() == "true"
+    # Use the first X-Forwarded-For address as client IP (only behind a trusted proxy)
+    trust_proxy: bool = os.getenv("RATE_LIMIT_TRUST_PROXY", "false").lower() == "true"
+
+    request_otp_ip: str = os.getenv("RATE_LIMIT_REQUEST_OTP_IP", "20/60")
+    request_otp_identifier: str = os.getenv("RATE_LIMIT_REQUEST_OTP_IDENTIFIER", "3/60")
+    verify_otp_ip: str = os.getenv("RATE_LIMIT_VERIFY_OTP_IP", "30/60")
+    verify_otp_identifier: str = os.getenv("RATE_LIMIT_VERIFY_OTP_IDENTIFIER", "10/600")
+    refresh_ip: str = os.getenv("RATE_LIMIT_REFRESH_IP", "60/60")
+    check_identifier_ip: str = os.getenv("RATE_LIMIT_CHECK_IDENTIFIER_IP", "60/60")
+
+    # Local pre-admission: each worker leases this fraction of a policy's limit
+    # per Redis call (policies whose batch would be below the minimum always go to Redis)
+    local_lease_fraction: float = float(os.getenv("RATE_LIMIT_LOCAL_LEASE_FRACTION", "0.1"))
+    local_min_batch: int = int(os.getenv("RATE_LIMIT_LOCAL_MIN_BATCH", "5"))
+    local_max_keys: int = int(os.getenv("RATE_LIMIT_LOCAL_MAX_KEYS", "10000"))
+
     class Config:
         env_file = ".env"
         case_sensitive = False
@@ -96,6 +144,21 @@ class AppConfig(BaseSettings):
     pythonpath: Optional[str] = os.getenv("PYTHONPATH")
     # CORS Settings - comma-separated list of allowed origins
     cors_origins: Optional[str] = os.getenv("CORS_ORIGINS", "*")
+    # Serve GET /users/profile from access-token claims when they are current
+    stateless_profile: bool = os.getenv("STATELESS_PROFILE", "false").lower() == "true"
+    # Country code (digits only, e.g. "98") applied to national phone numbers with a leading 0; required
+    phone_default_country_code: str = os.getenv("PHONE_DEFAULT_COUNTRY_CODE", "")
+    # Read-through user cache (Redis user:{id} snapshots)
+    user_cache_ttl_seconds: int = int(os.getenv("USER_CACHE_TTL_SECONDS", "3600"))
+    # Concurrent misses for one user share a single fetch; the Redis lock extends that across workers
+    single_flight_redis_lock: bool = os.getenv("SINGLE_FLIGHT_REDIS_LOCK", "true").lower() == "true"
+    single_flight_lock_ms: int = int(os.getenv("SINGLE_FLIGHT_LOCK_MS", "2000"))
+    # Bloom filter behind POST /auth/check (sized for max(capacity, 2x users))
+    identifier_filter_capacity: int = int(os.getenv("IDENTIFIER_FILTER_CAPACITY", "100000"))
+    identifier_filter_error_rate: float = float(os.getenv("IDENTIFIER_FILTER_ERROR_RATE", "0.01"))
+    # Idempotency-Key: how long responses are replayable, and how long a duplicate waits for the first request
+    idempotency_ttl_seconds: int = int(os.getenv("IDEMPOTENCY_TTL_SECONDS", "86400"))
+    idempotency_lock_seconds: int = int(os.getenv("IDEMPOTENCY_LOCK_SECONDS", "10"))
 
     class Config:
         env_file = ".env"
@@ -107,4 +170,5 @@ database_config = DatabaseConfig()
 redis_config = RedisConfig()
 rabbitmq_config = RabbitMQConfig()
 jwt_config = JWTConfig()
+rate_limit_config = RateLimitConfig()
 app_config = AppConfig()
\ No newline at end of file
@@ -0,0 +1,76 @@
+"""revoke tokens by jti with expiry
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2025-01-02 00:00:00
+
+Replaces the full-JWT `token` column with a fixed-size `jti` (or SHA-256
+digest prefix for tokens without one) and records each token's `exp` so
+rows can be purged and Redis TTLs match the token lifetime.
+"""
+import hashlib
+from datetime import datetime, timezone
+from typing import Sequence, Union
+
+import jwt
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0002"
+down_revision: Union[str, Sequence[str], None] = "0001"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    with op.batch_alter_table("blacklisted_tokens") as batch_op:
+        batch_op.add_column(sa.Column("jti", sa.String(length=32), nullable=True))
+        batch_op.add_column(sa.Column("expires_at", sa.DateTime(timezone=True), nullable=True))
+
+    conn = op.get_bind()
+    now = datetime.now(timezone.utc)
+    seen = set()
+    for row_id, token in conn.execute(sa.text("SELECT id, token FROM blacklisted_tokens")).fetchall():
+        try:
+            claims = jwt.decode(token, options={"verify_signature": False, "verify_exp": False})
+        except jwt.InvalidTokenError:
+            claims = {}
+
+        jti = claims.get("jti") or hashlib.sha256(token.encode("utf-8")).hexdigest()[:32]
+        exp = claims.get("exp")
+        expires_at = datetime.fromtimestamp(exp, tz=timezone.utc) if exp else None
+
+        # Expired, undecodable or duplicate revocations carry no information
+        if expires_at is None or expires_at <= now or jti in seen:
+            conn.execute(sa.text("DELETE FROM blacklisted_tokens WHERE id = :id"), {"id": row_id})
+            continue
+
+        seen.add(jti)
+        conn.execute(
+            sa.text("UPDATE blacklisted_tokens SET jti = :jti, expires_at = :expires_at WHERE id = :id"),
+            {"jti": jti, "expires_at": expires_at, "id": row_id},
+        )
+
+    with op.batch_alter_table("blacklisted_tokens") as batch_op:
+        batch_op.drop_index("ix_blacklisted_tokens_token")
+        batch_op.drop_column("token")
+        batch_op.alter_column("jti", existing_type=sa.String(length=32), nullable=False)
+        batch_op.alter_column("expires_at", existing_type=sa.DateTime(timezone=True), nullable=False)
+        batch_op.create_index("ix_blacklisted_tokens_jti", ["jti"], unique=True)
+        batch_op.create_index("ix_blacklisted_tokens_expires_at", ["expires_at"])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    # Full tokens can't be recovered from their jti
+    op.execute("DELETE FROM blacklisted_tokens")
+    with op.batch_alter_table("blacklisted_tokens") as batch_op:
+        batch_op.drop_index("ix_blacklisted_tokens_expires_at")
+        batch_op.drop_index("ix_blacklisted_tokens_jti")
+        batch_op.drop_column("expires_at")
+        batch_op.drop_column("jti")
+        batch_op.add_column(sa.Column("token", sa.String(), nullable=False))
+        batch_op.create_index("ix_blacklisted_tokens_token", ["token"])
@@ -0,0 +1,109 @@
+"""store canonical user identifiers
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2025-01-06 00:00:00
+
+Rewrites phone numbers to E.164 ("+" and digits) and lower-cases emails so
+every identifier lookup is a single equality on its unique index. National
+numbers (leading 0) need PHONE_DEFAULT_COUNTRY_CODE in the environment.
+
+Nothing is changed if any row can't be canonicalized or two rows collapse to
+the same identifier: the migration aborts and lists them, so the accounts
+can be merged or corrected by hand before it is run again.
+"""
+import os
+import re
+from typing import Dict, List, Optional, Sequence, Tuple, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0006"
+down_revision: Union[str, Sequence[str], None] = "0005"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Problem rows listed in the abort message
+MAX_LISTED_PROBLEMS = 50
+
+
+def _canonical_phone(phone: str) -> Optional[str]:
+    """Same rules as app.utils.validators.normalize_phone_number, frozen for this revision"""
+    digits = re.sub(r"[\s\-().]", "", phone.strip())
+    country_code = os.getenv("PHONE_DEFAULT_COUNTRY_CODE", "")
+    if digits.startswith("+"):
+        digits = digits[1:]
+    elif digits.startswith("00"):
+        digits = digits[2:]
+    elif digits.startswith("0") and country_code:
+        digits = country_code + digits[1:]
+    return f"+{digits}" if re.fullmatch(r"[1-9]\d{7,14}", digits) else None
+
+
+def _plan(conn, column: str, canonical) -> Tuple[List[Tuple[str, str]], List[str]]:
+    """Canonical value of every row that changes, and the rows that block the backfill"""
+    rows = conn.execute(
+        sa.text(f"SELECT id, {column} FROM users WHERE {column} IS NOT NULL ORDER BY created_at, id")
+    ).fetchall()
+
+    owners: Dict[str, Tuple[str, str]] = {}
+    updates = []
+    problems = []
+    for user_id, value in rows:
+        target = canonical(value)
+        if target is None:
+            problems.append(f"users.{column} of {user_id} ({value!r}) can't be canonicalized")
+            continue
+        if target in owners:
+            other_id, other_value = owners[target]
+            problems.append(
+                f"users.{column} of {user_id} ({value!r}) and of {other_id} ({other_value!r}) are both {target!r}"
+            )
+            continue
+        owners[target] = (user_id, value)
+        if target != value:
+            updates.append((user_id, target))
+    return updates, problems
+
+
+def _apply(conn, column: str, updates: List[Tuple[str, str]]) -> None:
+    # Canonical values are fixed points, so no target is another changing row's current value
+    for user_id, target in updates:
+        conn.execute(sa.text(f"UPDATE users SET {column} = :value WHERE id = :id"), {"value": target, "id": user_id})
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    conn = op.get_bind()
+    phone_updates, phone_problems = _plan(conn, "phone_number", _canonical_phone)
+    email_updates, email_problems = _plan(conn, "email", lambda email: email.strip().lower())
+
+    problems = phone_problems + email_problems
+    if problems:
+        listed = "\n  ".join(problems[:MAX_LISTED_PROBLEMS])
+        more = len(problems) - MAX_LISTED_PROBLEMS
+        hint = "" if os.getenv("PHONE_DEFAULT_COUNTRY_CODE") else (
+            "\nNational phone numbers (leading 0) need PHONE_DEFAULT_COUNTRY_CODE to be set."
+        )
+        raise RuntimeError(
+            f"Cannot canonicalize user identifiers, resolve these rows and run the migration again:\n  {listed}"
+            + (f"\n  ... and {more} more" if more > 0 else "")
+            + hint
+        )
+
+    with op.batch_alter_table("users") as batch_op:
+        batch_op.alter_column("phone_number", existing_type=sa.String(length=15), type_=sa.String(length=16))
+
+    _apply(conn, "phone_number", phone_updates)
+    _apply(conn, "email", email_updates)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    # Previous format stored phone numbers without the leading "+"
+    op.execute("UPDATE users SET phone_number = substr(phone_number, 2) WHERE phone_number LIKE '+%'")
+    with op.batch_alter_table("users") as batch_op:
+        batch_op.alter_column("phone_number", existing_type=sa.String(length=16), type_=sa.String(length=15))
@@ -0,0 +1,33 @@
+"""add refresh_token_families.current_jti
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2025-01-07 00:00:00
+
+Durable copy of the family's current refresh jti kept in Redis, so a family
+Redis lost is only restored for the token that was last issued. Families
+created before this revision have none and need a new login.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0007"
+down_revision: Union[str, Sequence[str], None] = "0006"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    with op.batch_alter_table("refresh_token_families") as batch_op:
+        batch_op.add_column(sa.Column("current_jti", sa.String(length=32), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table("refresh_token_families") as batch_op:
+        batch_op.drop_column("current_jti")
@@ -1 +1,77 @@
- 
\ No newline at end of file
+"""init
+
+Revision ID: 0001
+Revises:
+Create Date: 2025-01-01 00:00:00
+
+Baseline schema. Databases created by `Base.metadata.create_all` before
+migrations were introduced should be stamped with this revision
+(`alembic stamp 0001`) and then upgraded.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0001"
+down_revision: Union[str, Sequence[str], None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        "users",
+        sa.Column("id", sa.String(), nullable=False),
+        sa.Column("name", sa.String(length=100), nullable=True),
+        sa.Column("phone_number", sa.String(length=15), nullable=True),
+        sa.Column("avatar_url", sa.String(), nullable=True),
+        sa.Column("card_number", sa.String(), nullable=True),
+        sa.Column("card_holder_name", sa.String(), nullable=True),
+        sa.Column("role", sa.Enum("user", "group_admin", name="userrole"), nullable=False),
+        sa.Column("email", sa.String(length=255), nullable=True),
+        sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.text("(CURRENT_TIMESTAMP)"), nullable=False),
+        sa.Column("updated_at", sa.DateTime(timezone=True), server_default=sa.text("(CURRENT_TIMESTAMP)"), nullable=False),
+        sa.PrimaryKeyConstraint("id"),
+        sa.UniqueConstraint("id"),
+    )
+    op.create_index("ix_users_name", "users", ["name"])
+    op.create_index("ix_users_phone_number", "users", ["phone_number"], unique=True)
+    op.create_index("ix_users_email", "users", ["email"], unique=True)
+    op.create_index("ix_users_created_at", "users", ["created_at"])
+
+    op.create_table(
+        "otp_codes",
+        sa.Column("id", sa.String(), nullable=False),
+        sa.Column("user_id", sa.String(), nullable=False),
+        sa.Column("code", sa.String(length=5), nullable=False),
+        sa.Column("expires_at", sa.DateTime(timezone=True), nullable=False),
+        sa.Column("is_used", sa.Boolean(), nullable=False),
+        sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.text("(CURRENT_TIMESTAMP)"), nullable=False),
+        sa.ForeignKeyConstraint(["user_id"], ["users.id"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("id"),
+        sa.UniqueConstraint("id"),
+    )
+    op.create_index("ix_otp_codes_expires_at", "otp_codes", ["expires_at"])
+
+    op.create_table(
+        "blacklisted_tokens",
+        sa.Column("id", sa.String(), nullable=False),
+        sa.Column("user_id", sa.String(), nullable=False),
+        sa.Column("token", sa.String(), nullable=False),
+        sa.Column("blacklisted_at", sa.DateTime(timezone=True), server_default=sa.text("(CURRENT_TIMESTAMP)"), nullable=False),
+        sa.ForeignKeyConstraint(["user_id"], ["users.id"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index("ix_blacklisted_tokens_token", "blacklisted_tokens", ["token"])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table("blacklisted_tokens")
+    op.drop_table("otp_codes")
+    op.drop_table("users")
+    sa.Enum(name="userrole").drop(op.get_bind(), checkfirst=True)
@@ -1,15 +1,25 @@
 import time
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
+from fastapi.exception_handlers import request_validation_exception_handler
+from fastapi.exceptions import RequestValidationError
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 
 from app.db.database import Base, engine
 # Import models to ensure they're registered with Base
-from app.models import user, otp_code, blacklisted_token
-from app.api.v1.routes import users, auth, health
+from app.models import user, otp_code, blacklisted_token, refresh_token_family
+from app.api.v1.routes import users, auth, health, jwks
+from app.rabbitmq.config import rabbitmq_config
 from app.rabbitmq.setup import init_rabbitmq
+from app.rabbitmq.publisher import get_background_publisher, close_background_publisher
 from app.redis.setup import init_redis
-from app.services.user_lookup_consumer import start_consumer
+from app.services.user_lookup_consumer import start_consumer, start_async_consumer, stop_async_consumer
+from app.services.auth.blacklist import rebuild_blacklist_cache
+from app.services.identifier_filter import init_identifier_filter, get_identifier_filter
 from app.core.config import app_config
+from app.utils.validators import MissingCountryCodeError, check_phone_country_code
+from app.services.auth.signing_keys import init_key_ring
+from app.services.idempotency import IdempotencyMiddleware
 
 # Create FastAPI application
 app = FastAPI(
@@ -21,6 +31,14 @@ app = FastAPI(
 @app.on_event("startup")
 async def startup_event():
     """Initialize all services on startup"""
+    # National phone numbers can't be canonicalized without a country code; they get a 400 until it is set
+    if not check_phone_country_code():
+        print("⚠️ PHONE_DEFAULT_COUNTRY_CODE is not set; national phone numbers (leading 0) will be rejected")
+
+    # Asymmetric signing keys are loaded now, so a missing or invalid key file fails the boot
+    if init_key_ring():
+        print("✅ Access-token signing keys loaded")
+
     # Initialize database with retry logic
     max_retries = 5
     for attempt in range(max_retries):
@@ -40,17 +58,61 @@ async def startup_event():
     
     # Initialize RabbitMQ
     init_rabbitmq()
+
+    # Start the OTP publisher thread (it reconnects on its own if RabbitMQ is down)
+    get_background_publisher()
     
     # Initialize Redis
     init_redis()
+
+    # Mirror database revocations into Redis so token checks skip the database
+    if rebuild_blacklist_cache():
+        print("✅ Token blacklist cache ready")
+    else:
+        print("⚠️ Token blacklist cache unavailable, falling back to database checks")
+    
+    # Load registered identifiers so POST /auth/check rarely needs the database
+    if init_identifier_filter():
+        print("✅ Identifier filter ready")
+    else:
+        print("⚠️ Identifier filter unavailable, identifier checks will query the database")
+    
+    # Stateless profiles need every UserOut field in the access token
+    if app_config.stateless_profile:
+        missing = users.stateless_profile_missing_claims()
+        if missing:
+            print(f"⚠️ STATELESS_PROFILE is on but JWT_PROFILE_CLAIMS lacks {', '.join(missing)}; profiles will be read from the cache")
     
     # Start consumer
     try:
-        start_consumer()
-        print("✅ Consumer started")
+        if rabbitmq_config.transport == "async":
+            await start_async_consumer()
+        else:
+            start_consumer()
+        print(f"✅ Consumer started ({rabbitmq_config.transport} transport)")
     except Exception as e:
         print(f"⚠️ Consumer failed: {e}")
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Flush queued messages before the process exits"""
+    if rabbitmq_config.transport == "async":
+        await stop_async_consumer()
+    close_background_publisher()
+    print("✅ Publisher stopped")
+    get_identifier_filter().stop_tailing()
+
+@app.exception_handler(RequestValidationError)
+async def validation_exception_handler(request: Request, exc: RequestValidationError):
+    """A national phone number without a configured country code is a 400, not a 422"""
+    for error in exc.errors():
+        if isinstance(error.get("ctx", {}).get("error"), MissingCountryCodeError):
+            return JSONResponse(status_code=400, content={"detail": str(error["ctx"]["error"])})
+    return await request_validation_exception_handler(request, exc)
+
+# Replay stored responses for retried requests carrying an Idempotency-Key
+app.add_middleware(IdempotencyMiddleware)
+
 # Configure CORS middleware
 # Allow all origins for development
 app.add_middleware(
@@ -64,4 +126,5 @@ app.add_middleware(
 
 app.include_router(health.router)
 app.include_router(users.router)
-app.include_router(auth.router)
\ No newline at end of file
+app.include_router(auth.router)
+app.include_router(jwks.router)
\ No newline at end of file
@@ -9,5 +9,6 @@ class BlacklistedToken(Base):
     
     id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
     user_id = Column(String, ForeignKey("users.id",ondelete="CASCADE"),nullable=False)
-    token = Column(String, nullable=False, index=True)
+    jti = Column(String(32), nullable=False, unique=True, index=True)  # Token `jti` or SHA-256 digest prefix
+    expires_at = Column(DateTime(timezone=True), nullable=False, index=True)  # Row can be purged after this
     blacklisted_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
\ No newline at end of file
@@ -0,0 +1,14 @@
+import uuid
+from sqlalchemy.sql import func
+from sqlalchemy import Column, String, DateTime, ForeignKey
+from app.db.database import Base
+
+class RefreshTokenFamily(Base):
+    __tablename__ = "refresh_token_families"
+
+    # Rotation runs in Redis; current_jti is the durable copy used to restore a lost family
+    id = Column(String(32), primary_key=True, default=lambda: uuid.uuid4().hex)
+    user_id = Column(String, ForeignKey("users.id", ondelete="CASCADE"), nullable=False, index=True)
+    current_jti = Column(String(32), nullable=True)
+    revoked_at = Column(DateTime(timezone=True), nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
\ No newline at end of file
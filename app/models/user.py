@@ -2,7 +2,7 @@ import enum
 import uuid
 from sqlalchemy.sql import func
 import uuid
-from sqlalchemy import Column, String, DateTime, Enum
+from sqlalchemy import Column, String, DateTime, Enum, Integer
 from app.db.database import Base
 
 
@@ -15,12 +15,14 @@ class User(Base):
 
     id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()), unique=True, nullable=False)
     name = Column(String(100), nullable=True, index=True)  # Specify a maximum length for name
-    phone_number = Column(String(15), unique=True, nullable=True, index=True)  # Limit phone number length, allow null for email users
+    phone_number = Column(String(16), unique=True, nullable=True, index=True)  # Canonical E.164 ("+" and up to 15 digits), null for email users
     avatar_url = Column(String, nullable=True)
     card_number = Column(String, nullable=True)
     card_holder_name = Column(String, nullable=True)
     role = Column(Enum(UserRole), nullable=False, default=UserRole.user)  # Set default role
-    email = Column(String(255), unique=True, nullable=True, index=True)  # Limit email length, allow null for phone users
+    email = Column(String(255), unique=True, nullable=True, index=True)  # Lower-cased, null for phone users
+    profile_version = Column(Integer, nullable=False, default=1, server_default="1")  # Bumped on every profile change
+    session_version = Column(Integer, nullable=False, default=0, server_default="0")  # Bumped to log out everywhere
     created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False, index=True)
     updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), nullable=False)
 
@@ -0,0 +1,160 @@
+import logging
+from typing import Any, Awaitable, Callable, Dict, Optional
+import aio_pika
+from aio_pika.abc import AbstractChannel, AbstractExchange, AbstractIncomingMessage, AbstractQueue, AbstractRobustConnection
+from .codecs import get_codec
+from .config import rabbitmq_config
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncRabbitMQTransport:
+    """
+    RabbitMQ connection on the application's event loop (aio-pika).
+
+    One robust connection reconnects and restores its consumers on its own;
+    publishes are confirmed by the broker and awaited rather than handed to
+    a thread.
+    """
+
+    def __init__(self):
+        self.connection: Optional[AbstractRobustConnection] = None
+        self.channel: Optional[AbstractChannel] = None
+        self._exchanges: Dict[str, AbstractExchange] = {}
+        self._consumers: Dict[str, AbstractQueue] = {}
+
+    async def connect(self) -> None:
+        """Establish connection to RabbitMQ"""
+        try:
+            self.connection = await aio_pika.connect_robust(
+                host=rabbitmq_config.host,
+                port=rabbitmq_config.port,
+                login=rabbitmq_config.username,
+                password=rabbitmq_config.password,
+                virtualhost=rabbitmq_config.virtual_host,
+                heartbeat=rabbitmq_config.heartbeat
+            )
+            await self._open_channel()
+            logger.info("Async RabbitMQ transport connected successfully")
+        except Exception as e:
+            logger.error(f"Failed to connect async RabbitMQ transport: {e}")
+            raise
+
+    async def _open_channel(self) -> None:
+        """Open the confirm channel; exchanges are declared again on first use"""
+        self.channel = await self.connection.channel(publisher_confirms=True)
+        await self.channel.set_qos(prefetch_count=rabbitmq_config.consumer_prefetch_count)
+        self._exchanges.clear()
+
+    async def disconnect(self) -> None:
+        """Cancel consumers and close the connection"""
+        for consumer_tag, queue in list(self._consumers.items()):
+            try:
+                await queue.cancel(consumer_tag)
+            except Exception as e:
+                logger.error(f"Failed to cancel consumer {consumer_tag}: {e}")
+        self._consumers.clear()
+        self._exchanges.clear()
+        if self.connection and not self.connection.is_closed:
+            await self.connection.close()
+        logger.info("Async RabbitMQ transport disconnected")
+
+    async def consume(self, queue_name: str, callback: Callable[[AbstractIncomingMessage], Awaitable[Any]]) -> str:
+        """
+        Consume a queue with a coroutine callback that acks or nacks each message
+
+        Returns:
+            Consumer tag
+        """
+        try:
+            queue = await self.channel.declare_queue(
+                queue_name,
+                durable=True,
+                arguments={'x-message-ttl': rabbitmq_config.message_ttl}
+            )
+            logger.info(f"Declared queue with TTL: {queue_name}")
+        except aio_pika.exceptions.ChannelPreconditionFailed as e:
+            logger.warning(f"Failed to declare queue {queue_name} with TTL: {e}")
+            # The broker closed the channel; use the existing queue as declared on a fresh one
+            failed, self.channel = self.channel, None
+            try:
+                await failed.close()
+            except Exception:
+                pass
+            await self._open_channel()
+            try:
+                queue = await self.channel.declare_queue(queue_name, passive=True)
+                logger.info(f"Queue {queue_name} already exists")
+            except Exception as e2:
+                logger.error(f"Failed to verify queue {queue_name}: {e2}")
+                raise
+        consumer_tag = await queue.consume(callback)
+        self._consumers[consumer_tag] = queue
+        logger.info(f"Async consumer setup for queue: {queue_name}")
+        return consumer_tag
+
+    async def stop_consuming(self) -> None:
+        """Stop receiving new deliveries; unacked ones can still be settled"""
+        for consumer_tag, queue in list(self._consumers.items()):
+            await queue.cancel(consumer_tag)
+            del self._consumers[consumer_tag]
+        logger.info("Stopped consuming messages")
+
+    async def publish_message(
+        self,
+        exchange: str,
+        routing_key: str,
+        message: Dict[str, Any],
+        correlation_id: Optional[str] = None,
+        content_type: Optional[str] = None
+    ) -> bool:
+        """
+        Publish a message and wait for the broker to confirm it
+
+        Returns:
+            bool: True if the broker confirmed the message, False otherwise
+        """
+        try:
+            codec = get_codec(content_type or rabbitmq_config.content_type)
+            target = self._exchanges.get(exchange)
+            if target is None:
+                target = self._exchanges[exchange] = await self.channel.declare_exchange(
+                    exchange, rabbitmq_config.exchange_type, durable=True
+                )
+
+            await target.publish(
+                aio_pika.Message(
+                    body=codec.encode(message),
+                    content_type=codec.content_type,
+                    correlation_id=correlation_id,
+                    delivery_mode=aio_pika.DeliveryMode.PERSISTENT
+                ),
+                routing_key=routing_key,
+                mandatory=False
+            )
+            return True
+        except Exception as e:
+            logger.error(f"Failed to publish message to {exchange}: {e}")
+            return False
+
+
+# Global async transport instance
+_async_transport: Optional[AsyncRabbitMQTransport] = None
+
+
+async def get_async_transport() -> AsyncRabbitMQTransport:
+    """Get or create the connected async transport"""
+    global _async_transport
+    if _async_transport is None:
+        transport = AsyncRabbitMQTransport()
+        await transport.connect()
+        _async_transport = transport
+    return _async_transport
+
+
+async def close_async_transport() -> None:
+    """Close the async transport"""
+    global _async_transport
+    if _async_transport:
+        await _async_transport.disconnect()
+        _async_transport = None
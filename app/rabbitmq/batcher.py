@@ -0,0 +1,97 @@
+import logging
+import threading
+import time
+from concurrent.futures import Executor
+from typing import Any, Callable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Called with the handler's verdict for one message; safe from any thread
+Settle = Callable[[bool], None]
+
+
+class MessageBatcher:
+    """
+    Groups consumed messages into batches of up to `max_size`, waiting at
+    most `max_wait_ms` after the first one arrives. Each batch is handled on
+    the executor by `handle_batch`, which returns one success flag per
+    message, in order; every message is then settled with its flag.
+    """
+
+    def __init__(
+        self,
+        handle_batch: Callable[[List[Any]], List[bool]],
+        executor: Executor,
+        max_size: int,
+        max_wait_ms: int
+    ):
+        self.handle_batch = handle_batch
+        self.executor = executor
+        self.max_size = max(1, max_size)
+        self.max_wait = max_wait_ms / 1000
+        self._items: List[Tuple[Any, Settle]] = []
+        self._condition = threading.Condition()
+        self._closed = False
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._run, daemon=True, name="Batcher")
+        self._thread.start()
+
+    def submit(self, item: Any, settle: Settle) -> None:
+        """
+        Queue one message for the next batch
+
+        Raises:
+            RuntimeError: if the batcher is closed
+        """
+        with self._condition:
+            if self._closed:
+                raise RuntimeError("Batcher is closed")
+            self._items.append((item, settle))
+            if len(self._items) == 1 or len(self._items) >= self.max_size:
+                self._condition.notify()
+
+    def close(self) -> None:
+        """Hand any queued messages to the executor and stop batching"""
+        with self._condition:
+            self._closed = True
+            self._condition.notify()
+        if self._thread and self._thread.is_alive():
+            self._thread.join()
+
+    def _run(self) -> None:
+        while True:
+            with self._condition:
+                while not self._items and not self._closed:
+                    self._condition.wait()
+                if not self._items:
+                    return
+
+                # Linger for more messages unless the batch is already full
+                deadline = time.monotonic() + self.max_wait
+                while len(self._items) < self.max_size and not self._closed:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._condition.wait(remaining)
+
+                batch = self._items[:self.max_size]
+                self._items = self._items[self.max_size:]
+
+            try:
+                self.executor.submit(self._process, batch)
+            except RuntimeError:
+                # Executor already shut down; let the broker redeliver
+                for _, settle in batch:
+                    settle(False)
+
+    def _process(self, batch: List[Tuple[Any, Settle]]) -> None:
+        try:
+            results = self.handle_batch([item for item, _ in batch])
+        except Exception as e:
+            logger.error(f"💥 Batch of {len(batch)} failed: {e}")
+            results = [False] * len(batch)
+
+        for (_, settle), success in zip(batch, results):
+            settle(success)
@@ -0,0 +1,79 @@
+import json
+import logging
+from typing import Any, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+JSON_CONTENT_TYPE = "application/json"
+MSGPACK_CONTENT_TYPE = "application/msgpack"
+
+
+class UnsupportedContentType(ValueError):
+    """No codec is registered for a message's content type"""
+
+
+class Codec:
+    """Serialises message bodies for one AMQP content type"""
+
+    def __init__(self, content_type: str, encode: Callable[[Any], bytes], decode: Callable[[bytes], Any]):
+        self.content_type = content_type
+        self.encode = encode
+        self.decode = decode
+
+
+# Codecs by content type
+_codecs: Dict[str, Codec] = {}
+
+
+def register_codec(codec: Codec, *aliases: str) -> Codec:
+    """Register a codec under its content type and any aliases"""
+    for content_type in (codec.content_type, *aliases):
+        _codecs[content_type] = codec
+    return codec
+
+
+def get_codec(content_type: Optional[str] = None) -> Codec:
+    """
+    Codec for a content type; peers that don't set one send JSON
+
+    Raises:
+        UnsupportedContentType: if no codec is registered for it
+    """
+    # Drop parameters such as "; charset=utf-8"
+    content_type = (content_type or JSON_CONTENT_TYPE).split(";")[0].strip().lower()
+    codec = _codecs.get(content_type)
+    if codec is None:
+        raise UnsupportedContentType(f"Unsupported content type: {content_type}")
+    return codec
+
+
+def decode_body(body: bytes, content_type: Optional[str] = None) -> Any:
+    """Decode a message body according to its content type"""
+    return get_codec(content_type).decode(body)
+
+
+try:
+    import orjson
+
+    JSON_CODEC = register_codec(Codec(JSON_CONTENT_TYPE, orjson.dumps, orjson.loads))
+except ImportError:
+    JSON_CODEC = register_codec(Codec(
+        JSON_CONTENT_TYPE,
+        lambda message: json.dumps(message, separators=(",", ":")).encode("utf-8"),
+        json.loads
+    ))
+
+try:
+    import msgpack
+
+    MSGPACK_CODEC: Optional[Codec] = register_codec(
+        Codec(
+            MSGPACK_CONTENT_TYPE,
+            lambda message: msgpack.packb(message, use_bin_type=True),
+            lambda body: msgpack.unpackb(body, raw=False)
+        ),
+        "application/x-msgpack"
+    )
+except ImportError:
+    MSGPACK_CODEC = None
+    logger.debug("msgpack is not installed, only JSON messages are supported")
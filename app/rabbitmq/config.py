@@ -36,8 +36,34 @@ class RabbitMQConfig(BaseSettings):
     user_lookup_response_key: str = "user.lookup.response"
     
     # Message settings
+    # Body encoding of published lookup messages; incoming ones are decoded by their own content type
+    content_type: str = os.getenv("RABBITMQ_CONTENT_TYPE", "application/json")
     message_ttl: int = int(os.getenv("RABBITMQ_MESSAGE_TTL", "300000"))  # 5 minutes in milliseconds
     
+    # "blocking": pika consumer thread and worker pool; "async": aio-pika on the app event loop
+    transport: str = os.getenv("RABBITMQ_TRANSPORT", "blocking")
+    
+    # Consumer settings: unacked deliveries in flight and threads handling them
+    consumer_prefetch_count: int = int(os.getenv("RABBITMQ_CONSUMER_PREFETCH_COUNT", "128"))
+    consumer_workers: int = int(os.getenv("RABBITMQ_CONSUMER_WORKERS", "8"))
+    # Lookups are resolved in batches of up to this many, waiting at most linger ms to fill one
+    consumer_batch_size: int = int(os.getenv("RABBITMQ_CONSUMER_BATCH_SIZE", "32"))
+    consumer_batch_linger_ms: int = int(os.getenv("RABBITMQ_CONSUMER_BATCH_LINGER_MS", "10"))
+    # Identifiers plus user ids accepted in one user_lookup_bulk message
+    user_lookup_bulk_max_items: int = int(os.getenv("RABBITMQ_USER_LOOKUP_BULK_MAX_ITEMS", "1000"))
+    
+    # Background publisher settings
+    publisher_queue_size: int = int(os.getenv("RABBITMQ_PUBLISHER_QUEUE_SIZE", "10000"))
+    publisher_batch_size: int = int(os.getenv("RABBITMQ_PUBLISHER_BATCH_SIZE", "100"))
+    publisher_linger_ms: int = int(os.getenv("RABBITMQ_PUBLISHER_LINGER_MS", "5"))
+    publisher_shutdown_timeout: float = float(os.getenv("RABBITMQ_PUBLISHER_SHUTDOWN_TIMEOUT", "5.0"))
+    # Disk journal for messages published while the broker is unreachable (empty disables it).
+    # Records hold OTP codes: point it at a private directory, never a shared one like /tmp
+    spool_path: Optional[str] = os.getenv("RABBITMQ_SPOOL_PATH", "")
+    spool_max_bytes: int = int(os.getenv("RABBITMQ_SPOOL_MAX_BYTES", str(64 * 1024 * 1024)))
+    # Spooled messages older than this are dropped instead of replayed (OTPs expire after 600s)
+    spool_max_age_seconds: int = int(os.getenv("RABBITMQ_SPOOL_MAX_AGE_SECONDS", "600"))
+    
     class Config:
         env_file = ".env"
         case_sensitive = False
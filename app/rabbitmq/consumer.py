@@ -1,13 +1,22 @@
-import json
+import functools
 import logging
-from typing import Callable, Optional
+from concurrent.futures import Executor
+from typing import Any, Callable, NamedTuple, Optional
 import pika
+from .batcher import MessageBatcher
+from .codecs import get_codec
 from .config import rabbitmq_config
 from .setup import RabbitMQSetup
 
 logger = logging.getLogger(__name__)
 
 
+class Delivery(NamedTuple):
+    """Decoded message body and the content type it arrived in"""
+    data: Any
+    content_type: str
+
+
 class RabbitMQConsumer:
     """Handles consuming messages from RabbitMQ"""
     
@@ -22,8 +31,8 @@ class RabbitMQConsumer:
             self.connection = self.setup.create_connection()
             self.channel = self.connection.channel()
             
-            # Set QoS to process one message at a time
-            self.channel.basic_qos(prefetch_count=1)
+            # Keep enough unacked deliveries in flight to feed the worker pool
+            self.channel.basic_qos(prefetch_count=rabbitmq_config.consumer_prefetch_count)
             
             logger.info("RabbitMQ consumer connected successfully")
         except Exception as e:
@@ -105,6 +114,11 @@ class RabbitMQConsumer:
         if self.channel and not self.channel.is_closed:
             self.channel.stop_consuming()
         logger.info("Stopped consuming messages")
+    
+    def stop_consuming_threadsafe(self) -> None:
+        """Stop consuming from a thread other than the one running the connection"""
+        if self.connection and self.connection.is_open:
+            self.connection.add_callback_threadsafe(self.stop_consuming)
 
 
 def create_otp_message_callback(handler_func: Callable) -> Callable:
@@ -120,7 +134,7 @@ def create_otp_message_callback(handler_func: Callable) -> Callable:
     def callback(ch, method, properties, body):
         try:
             # Parse message
-            message_data = json.loads(body.decode('utf-8'))
+            message_data = get_codec(properties.content_type).decode(body)
             logger.info(f"Received OTP message: {message_data}")
             
             # Process the message
@@ -135,8 +149,9 @@ def create_otp_message_callback(handler_func: Callable) -> Callable:
                 ch.basic_nack(delivery_tag=method.delivery_tag, requeue=True)
                 logger.warning("OTP message processing failed, requeuing")
                 
-        except json.JSONDecodeError as e:
-            logger.error(f"Failed to parse message JSON: {e}")
+        except ValueError as e:
+            # Undecodable body or unsupported content type
+            logger.error(f"Failed to parse message: {e}")
             ch.basic_nack(delivery_tag=method.delivery_tag, requeue=False)
         except Exception as e:
             logger.error(f"Error processing OTP message: {e}")
@@ -145,28 +160,71 @@ def create_otp_message_callback(handler_func: Callable) -> Callable:
     return callback
 
 
-def create_user_lookup_callback(handler: Callable) -> Callable:
-    """Ultra-clean callback creator"""
-    def callback(ch, method, properties, body):
+def create_user_lookup_callback(
+    handler: Optional[Callable] = None,
+    executor: Optional[Executor] = None,
+    batcher: Optional[MessageBatcher] = None
+) -> Callable:
+    """
+    Ultra-clean callback creator
+    
+    Bodies are decoded according to their content type. With an executor,
+    messages are handled on its workers; with a batcher, they are grouped
+    (as Delivery items) and handled by its batch handler. Either way the ack
+    or nack is handed back to the connection thread, which owns the channel.
+    """
+    def settle(ch, delivery_tag: int, success: bool, requeue: bool = True) -> None:
+        if success:
+            ch.basic_ack(delivery_tag=delivery_tag)
+        else:
+            ch.basic_nack(delivery_tag=delivery_tag, requeue=requeue)
+    
+    def process(data: dict) -> bool:
+        request_id = data.get('request_id', 'UNKNOWN')
         try:
-            data = json.loads(body.decode('utf-8'))
-            request_id = data.get('request_id', 'UNKNOWN')
-            
             logger.info(f"📨 {request_id}")
             success = handler(data)
-            
             if success:
-                ch.basic_ack(delivery_tag=method.delivery_tag)
                 logger.info(f"✅ {request_id}")
             else:
-                ch.basic_nack(delivery_tag=method.delivery_tag, requeue=True)
                 logger.warning(f"⚠️ {request_id}")
-                
-        except json.JSONDecodeError as e:
-            logger.error(f"❌ JSON: {e}")
-            ch.basic_nack(delivery_tag=method.delivery_tag, requeue=False)
         except Exception as e:
             logger.error(f"💥 Error: {e}")
+            success = False
+        return success
+    
+    def callback(ch, method, properties, body):
+        try:
+            codec = get_codec(properties.content_type)
+            data = codec.decode(body)
+            if not isinstance(data, dict):
+                raise ValueError(f"Expected an object, got {type(data).__name__}")
+        except Exception as e:
+            logger.error(f"❌ Decode: {e}")
+            ch.basic_nack(delivery_tag=method.delivery_tag, requeue=False)
+            return
+        
+        if executor is None and batcher is None:
+            settle(ch, method.delivery_tag, process(data))
+            return
+        
+        def settle_threadsafe(success: bool) -> None:
+            try:
+                ch.connection.add_callback_threadsafe(
+                    functools.partial(settle, ch, method.delivery_tag, success)
+                )
+            except Exception as e:
+                # Connection is gone; the broker redelivers unacked messages
+                logger.error(f"💥 Ack failed: {e}")
+        
+        try:
+            if batcher is not None:
+                logger.info(f"📨 {data.get('request_id', 'UNKNOWN')}")
+                batcher.submit(Delivery(data, codec.content_type), settle_threadsafe)
+            else:
+                executor.submit(lambda: settle_threadsafe(process(data)))
+        except RuntimeError:
+            # Executor or batcher is shutting down
             ch.basic_nack(delivery_tag=method.delivery_tag, requeue=True)
     
     return callback
@@ -1,7 +1,8 @@
-import json
 import logging
+import threading
 from typing import Dict, Any, Optional
 import pika
+from .codecs import JSON_CODEC, get_codec
 from .config import rabbitmq_config
 from .setup import RabbitMQSetup
 
@@ -15,25 +16,36 @@ class RabbitMQProducer:
         self.connection: Optional[pika.BlockingConnection] = None
         self.channel: Optional[pika.channel.Channel] = None
         self.setup = RabbitMQSetup()
+        # BlockingConnection is not thread-safe and consumer workers publish concurrently
+        self._lock = threading.RLock()
     
     def connect(self) -> None:
         """Establish connection to RabbitMQ"""
-        try:
-            self.connection = self.setup.create_connection()
-            self.channel = self.connection.channel()
-            logger.info("RabbitMQ producer connected successfully")
-        except Exception as e:
-            logger.error(f"Failed to connect RabbitMQ producer: {e}")
-            raise
+        with self._lock:
+            try:
+                self.connection = self.setup.create_connection()
+                self.channel = self.connection.channel()
+                logger.info("RabbitMQ producer connected successfully")
+            except Exception as e:
+                logger.error(f"Failed to connect RabbitMQ producer: {e}")
+                raise
     
     def disconnect(self) -> None:
         """Close RabbitMQ connection"""
-        if self.channel and not self.channel.is_closed:
-            self.channel.close()
-        if self.connection and not self.connection.is_closed:
-            self.connection.close()
+        with self._lock:
+            if self.channel and not self.channel.is_closed:
+                self.channel.close()
+            if self.connection and not self.connection.is_closed:
+                self.connection.close()
         logger.info("RabbitMQ producer disconnected")
     
+    def _basic_publish(self, **kwargs) -> None:
+        """Publish on the shared channel, reconnecting first if needed"""
+        with self._lock:
+            if not self.connection or self.connection.is_closed:
+                self.connect()
+            self.channel.basic_publish(**kwargs)
+    
     def publish_otp_message(self, identifier: str, otp_code: str, routing_key: str) -> bool:
         """
         Publish OTP message to appropriate queue
@@ -46,9 +58,6 @@ class RabbitMQProducer:
         Returns:
             bool: True if message published successfully, False otherwise
         """
-        if not self.connection or self.connection.is_closed:
-            self.connect()
-
         try:
             # Prepare message data
             from datetime import datetime
@@ -59,13 +68,13 @@ class RabbitMQProducer:
             }
 
             # Publish message
-            self.channel.basic_publish(
+            self._basic_publish(
                 exchange=rabbitmq_config.otp_exchange,
                 routing_key=routing_key,
-                body=json.dumps(message_data),
+                body=JSON_CODEC.encode(message_data),
                 properties=pika.BasicProperties(
                     delivery_mode=2,  # Make message persistent
-                    content_type='application/json'
+                    content_type=JSON_CODEC.content_type
                 )
             )
 
@@ -84,7 +93,14 @@ class RabbitMQProducer:
         """Convenience method for publishing SMS OTP"""
         return self.publish_otp_message(phone_number, otp_code, rabbitmq_config.sms_routing_key)
     
-    def publish_message(self, exchange: str, routing_key: str, message: Dict[str, Any], correlation_id: Optional[str] = None) -> bool:
+    def publish_message(
+        self,
+        exchange: str,
+        routing_key: str,
+        message: Dict[str, Any],
+        correlation_id: Optional[str] = None,
+        content_type: Optional[str] = None
+    ) -> bool:
         """
         Generic method for publishing messages to any exchange
         
@@ -93,28 +109,28 @@ class RabbitMQProducer:
             routing_key: Routing key
             message: Message data as dictionary
             correlation_id: Optional correlation ID
+            content_type: Body encoding, defaults to RABBITMQ_CONTENT_TYPE
             
         Returns:
             bool: True if message published successfully, False otherwise
         """
-        if not self.connection or self.connection.is_closed:
-            self.connect()
-
         try:
+            codec = get_codec(content_type or rabbitmq_config.content_type)
+            
             # Prepare properties
             properties = pika.BasicProperties(
                 delivery_mode=2,  # Make message persistent
-                content_type='application/json'
+                content_type=codec.content_type
             )
             
             if correlation_id:
                 properties.correlation_id = correlation_id
 
             # Publish message
-            self.channel.basic_publish(
+            self._basic_publish(
                 exchange=exchange,
                 routing_key=routing_key,
-                body=json.dumps(message),
+                body=codec.encode(message),
                 properties=properties
             )
 
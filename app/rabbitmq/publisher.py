@@ -0,0 +1,388 @@
+import json
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+import pika
+from pika.adapters.select_connection import SelectConnection
+from .codecs import JSON_CODEC
+from .config import rabbitmq_config
+from .setup import RabbitMQSetup
+from .spool import PublishSpool
+
+logger = logging.getLogger(__name__)
+
+
+class PublishError(Exception):
+    """A message was rejected, dropped or could not be enqueued"""
+
+
+# (exchange, routing_key, body, correlation_id, future)
+_Message = Tuple[str, str, bytes, Optional[str], Future]
+
+
+class BackgroundPublisher:
+    """
+    Publishes messages from a dedicated I/O thread.
+
+    Callers enqueue into a bounded queue and get a Future back immediately;
+    the thread drains the queue in batches on an asynchronous pika
+    connection with publisher confirms enabled, and resolves each Future when
+    the broker acks (or fails it on nack / connection loss).
+
+    While the broker is unreachable, messages are appended to a disk spool
+    instead (their Future resolves with False) and replayed in order, with
+    confirms, once the connection is back. New messages keep going through
+    the spool until it is empty, so ordering is preserved. Records older
+    than `spool_max_age_seconds` are dropped rather than replayed, so an
+    OTP never arrives after it has expired.
+    """
+
+    def __init__(self):
+        self._queue: "queue.Queue[_Message]" = queue.Queue(maxsize=rabbitmq_config.publisher_queue_size)
+        self._connection: Optional[SelectConnection] = None
+        self._channel = None
+        self._online = False
+        # Delivery tag -> queued message, or None for a record replayed from the spool
+        self._unconfirmed: Dict[int, Optional[_Message]] = {}
+        self._delivery_tag = 0
+        self._drain_scheduled = False
+        self._lock = threading.Lock()
+        self._stopping = False
+        self._thread: Optional[threading.Thread] = None
+
+        # Replay progress: unconfirmed spool records and the offset they end at
+        self._replay_pending = 0
+        self._replay_failed = False
+        self._replay_end = 0
+        self._spool: Optional[PublishSpool] = None
+        if rabbitmq_config.spool_path:
+            try:
+                self._spool = PublishSpool(rabbitmq_config.spool_path, rabbitmq_config.spool_max_bytes)
+            except Exception as e:
+                logger.error(f"Publish spool disabled: {e}")
+
+    def start(self) -> None:
+        """Start the I/O thread (idempotent)"""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stopping = False
+        self._thread = threading.Thread(target=self._run, name="rabbitmq-publisher", daemon=True)
+        self._thread.start()
+        logger.info("RabbitMQ background publisher started")
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        """Flush queued and unconfirmed messages (up to `timeout` seconds), then close"""
+        timeout = rabbitmq_config.publisher_shutdown_timeout if timeout is None else timeout
+        deadline = time.monotonic() + timeout
+        while self._has_pending() and time.monotonic() < deadline:
+            time.sleep(0.05)
+
+        self._stopping = True
+        connection = self._connection
+        if connection and connection.is_open:
+            connection.ioloop.add_callback_threadsafe(connection.close)
+        if self._thread:
+            self._thread.join(timeout=max(0.0, deadline - time.monotonic()) + 1)
+
+        # Whatever is still queued survives the restart in the spool
+        self._spool_messages(self._take_queued())
+        if self._spool:
+            self._spool.close()
+        logger.info("RabbitMQ background publisher stopped")
+
+    def _has_pending(self) -> bool:
+        if not self._queue.empty() or self._unconfirmed:
+            return True
+        return self._online and self._spool is not None and not self._spool.is_empty()
+
+    def publish(self, exchange: str, routing_key: str, message: Dict[str, Any], correlation_id: Optional[str] = None) -> Future:
+        """
+        Enqueue a message for publishing
+
+        Returns:
+            Future resolved with True once the broker confirms the message,
+            with False once it is spooled for replay, or failed with
+            PublishError (already failed if the queue or spool is full)
+        """
+        future: Future = Future()
+        # Notification workers only read JSON, and spool records carry the body as text
+        entry = (exchange, routing_key, JSON_CODEC.encode(message), correlation_id, future)
+
+        # Broker down, or older messages still waiting in the spool
+        if self._spool and (not self._online or not self._spool.is_empty()):
+            self._spool_messages([entry])
+            self._schedule(self._replay)
+            return future
+
+        try:
+            self._queue.put_nowait(entry)
+        except queue.Full:
+            future.set_exception(PublishError("Publish queue is full"))
+            return future
+
+        self._schedule_drain()
+        return future
+
+    def publish_otp_message(self, identifier: str, otp_code: str, routing_key: str) -> Future:
+        """Enqueue an OTP message (same payload as `RabbitMQProducer.publish_otp_message`)"""
+        message_data = {
+            "identifier": identifier,
+            "otp_code": otp_code,
+            "timestamp": datetime.utcnow().isoformat()
+        }
+        return self.publish(rabbitmq_config.otp_exchange, routing_key, message_data)
+
+    # --- I/O thread -----------------------------------------------------
+
+    def _run(self) -> None:
+        """Connect, run the I/O loop, and reconnect until stopped"""
+        while not self._stopping:
+            try:
+                self._connection = SelectConnection(
+                    RabbitMQSetup.connection_parameters(),
+                    on_open_callback=self._on_connection_open,
+                    on_open_error_callback=self._on_connection_open_error,
+                    on_close_callback=self._on_connection_closed
+                )
+                self._connection.ioloop.start()
+            except Exception as e:
+                logger.error(f"RabbitMQ publisher I/O loop failed: {e}")
+
+            if not self._stopping:
+                time.sleep(rabbitmq_config.retry_delay)
+
+    def _schedule(self, callback, delay: float = 0) -> bool:
+        """Run `callback` on the I/O thread; False if there is no open connection"""
+        connection = self._connection
+        if not (connection and connection.is_open and self._online):
+            # The channel-open callback replays and drains whatever is pending
+            return False
+        try:
+            connection.ioloop.add_callback_threadsafe(lambda: connection.ioloop.call_later(delay, callback))
+            return True
+        except Exception:
+            return False
+
+    def _schedule_drain(self) -> None:
+        """Wake the I/O thread once per batch, however many messages arrive"""
+        with self._lock:
+            if self._drain_scheduled:
+                return
+            self._drain_scheduled = True
+
+        if not self._schedule(self._drain, rabbitmq_config.publisher_linger_ms / 1000):
+            with self._lock:
+                self._drain_scheduled = False
+
+    def _basic_publish(self, exchange: str, routing_key: str, body: bytes, correlation_id: Optional[str]) -> int:
+        """Publish on the confirm channel and return the delivery tag"""
+        self._channel.basic_publish(
+            exchange=exchange,
+            routing_key=routing_key,
+            body=body,
+            properties=pika.BasicProperties(
+                delivery_mode=2,  # Make message persistent
+                content_type=JSON_CODEC.content_type,
+                correlation_id=correlation_id
+            )
+        )
+        self._delivery_tag += 1
+        return self._delivery_tag
+
+    def _drain(self) -> None:
+        """Publish up to one batch from the queue (runs on the I/O thread)"""
+        with self._lock:
+            self._drain_scheduled = False
+        if not self._online:
+            return
+
+        if self._spool and not self._spool.is_empty():
+            # Keep ordering: queued messages go behind the spooled ones
+            self._spool_messages(self._take_queued())
+            self._replay()
+            return
+
+        batch = self._take_queued(rabbitmq_config.publisher_batch_size)
+        for entry in batch:
+            exchange, routing_key, body, correlation_id, future = entry
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                tag = self._basic_publish(exchange, routing_key, body, correlation_id)
+            except Exception as e:
+                future.set_exception(PublishError(f"Failed to publish to {exchange}: {e}"))
+                continue
+            self._unconfirmed[tag] = entry
+
+        if batch:
+            logger.debug(f"Published batch of {len(batch)} message(s)")
+        if not self._queue.empty():
+            self._schedule_drain()
+
+    def _replay(self) -> None:
+        """Publish the next batch of spooled records (runs on the I/O thread)"""
+        if not self._spool or not self._online or self._replay_pending:
+            return
+
+        payloads, end = self._spool.read(limit=rabbitmq_config.publisher_batch_size)
+        if not payloads:
+            if not self._queue.empty():
+                self._schedule_drain()
+            return
+
+        self._replay_failed = False
+        self._replay_end = end
+        expired = 0
+        oldest = time.time() - rabbitmq_config.spool_max_age_seconds
+        for payload in payloads:
+            record = json.loads(payload)
+            if record.get("enqueued_at", 0) < oldest:
+                expired += 1
+                continue
+            try:
+                tag = self._basic_publish(
+                    record["exchange"], record["routing_key"], record["body"].encode("utf-8"), record.get("correlation_id")
+                )
+            except Exception as e:
+                logger.error(f"Failed to replay spooled message: {e}")
+                self._replay_failed = True
+                break
+            self._unconfirmed[tag] = None
+            self._replay_pending += 1
+
+        if expired:
+            logger.warning(f"Dropped {expired} spooled message(s) older than {rabbitmq_config.spool_max_age_seconds}s")
+        if self._replay_pending:
+            logger.info(f"Replaying {self._replay_pending} spooled message(s)")
+        elif self._replay_failed:
+            # Nothing is awaiting a confirm that would schedule the retry
+            self._schedule(self._replay, rabbitmq_config.retry_delay)
+        else:
+            # Every record in the batch had expired
+            self._spool.commit(end)
+            self._schedule(self._replay)
+
+    def _on_replay_confirmed(self, acked: bool) -> None:
+        """Commit a replayed batch once every record in it is confirmed"""
+        self._replay_pending -= 1
+        self._replay_failed = self._replay_failed or not acked
+        if self._replay_pending > 0:
+            return
+        if self._replay_failed:
+            # Retry the whole batch from the last committed offset
+            self._schedule(self._replay, rabbitmq_config.retry_delay)
+            return
+        self._spool.commit(self._replay_end)
+        self._schedule(self._replay)
+
+    def _spool_messages(self, messages: List[_Message]) -> None:
+        """Journal messages for replay, or fail them if there is no room"""
+        for exchange, routing_key, body, correlation_id, future in messages:
+            if future.cancelled():
+                continue
+            payload = json.dumps({
+                "exchange": exchange,
+                "routing_key": routing_key,
+                "body": body.decode("utf-8"),
+                "correlation_id": correlation_id,
+                "enqueued_at": time.time()
+            }).encode("utf-8")
+            if self._spool and self._spool.append(payload):
+                future.set_result(False)
+            else:
+                future.set_exception(PublishError("Broker unavailable and publish spool is full"))
+
+    def _take_queued(self, limit: Optional[int] = None) -> List[_Message]:
+        messages: List[_Message] = []
+        while limit is None or len(messages) < limit:
+            try:
+                messages.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return messages
+
+    def _on_connection_open(self, connection: SelectConnection) -> None:
+        connection.channel(on_open_callback=self._on_channel_open)
+
+    def _on_connection_open_error(self, connection: SelectConnection, error: Exception) -> None:
+        logger.error(f"RabbitMQ publisher failed to connect: {error}")
+        connection.ioloop.stop()
+
+    def _on_connection_closed(self, connection: SelectConnection, reason: Exception) -> None:
+        self._go_offline(f"Connection closed before confirmation: {reason}")
+        connection.ioloop.stop()
+
+    def _on_channel_open(self, channel) -> None:
+        channel.add_on_close_callback(self._on_channel_closed)
+        channel.confirm_delivery(self._on_delivery_confirmation)
+        self._channel = channel
+        self._delivery_tag = 0
+        self._online = True
+        logger.info("RabbitMQ publisher channel open with confirms")
+        self._replay()
+        self._drain()
+
+    def _on_channel_closed(self, channel, reason: Exception) -> None:
+        logger.warning(f"RabbitMQ publisher channel closed: {reason}")
+        self._go_offline(f"Channel closed before confirmation: {reason}")
+        if self._connection and self._connection.is_open:
+            self._connection.close()
+
+    def _go_offline(self, reason: str) -> None:
+        """Move unconfirmed and queued messages to the spool (or fail them)"""
+        if not self._online and not self._unconfirmed:
+            return
+        self._online = False
+        self._channel = None
+        # Unconfirmed replayed records are still in the spool and will be replayed again
+        self._replay_pending = 0
+        self._replay_failed = False
+
+        unconfirmed, self._unconfirmed = self._unconfirmed, {}
+        pending = [entry for _, entry in sorted(unconfirmed.items()) if entry is not None]
+        if self._spool:
+            self._spool_messages(pending + self._take_queued())
+        else:
+            for *_, future in pending:
+                future.set_exception(PublishError(reason))
+
+    def _on_delivery_confirmation(self, frame) -> None:
+        """Resolve futures for a (possibly multiple) ack or nack"""
+        method = frame.method
+        acked = isinstance(method, pika.spec.Basic.Ack)
+        tags = [tag for tag in self._unconfirmed if tag <= method.delivery_tag] if method.multiple else [method.delivery_tag]
+        for tag in tags:
+            if tag not in self._unconfirmed:
+                continue
+            entry = self._unconfirmed.pop(tag)
+            if entry is None:
+                self._on_replay_confirmed(acked)
+            elif acked:
+                entry[-1].set_result(True)
+            else:
+                entry[-1].set_exception(PublishError("Message was nacked by the broker"))
+
+
+# Global publisher instance
+_background_publisher: Optional[BackgroundPublisher] = None
+
+
+def get_background_publisher() -> BackgroundPublisher:
+    """Get or create the background publisher, starting its I/O thread"""
+    global _background_publisher
+    if _background_publisher is None:
+        _background_publisher = BackgroundPublisher()
+        _background_publisher.start()
+    return _background_publisher
+
+
+def close_background_publisher() -> None:
+    """Flush and stop the background publisher"""
+    global _background_publisher
+    if _background_publisher:
+        _background_publisher.stop()
+        _background_publisher = None
@@ -13,25 +13,28 @@ class RabbitMQSetup:
         self.connection = connection
         self.channel = None
     
+    @staticmethod
+    def connection_parameters() -> pika.ConnectionParameters:
+        """Connection parameters shared by blocking and asynchronous connections"""
+        credentials = pika.PlainCredentials(
+            rabbitmq_config.username, 
+            rabbitmq_config.password
+        )
+        
+        return pika.ConnectionParameters(
+            host=rabbitmq_config.host,
+            port=rabbitmq_config.port,
+            virtual_host=rabbitmq_config.virtual_host,
+            credentials=credentials,
+            heartbeat=rabbitmq_config.heartbeat,
+            connection_attempts=rabbitmq_config.connection_attempts,
+            retry_delay=rabbitmq_config.retry_delay
+        )
+    
     def create_connection(self) -> pika.BlockingConnection:
         """Create a new RabbitMQ connection"""
         try:
-            credentials = pika.PlainCredentials(
-                rabbitmq_config.username, 
-                rabbitmq_config.password
-            )
-            
-            parameters = pika.ConnectionParameters(
-                host=rabbitmq_config.host,
-                port=rabbitmq_config.port,
-                virtual_host=rabbitmq_config.virtual_host,
-                credentials=credentials,
-                heartbeat=rabbitmq_config.heartbeat,
-                connection_attempts=rabbitmq_config.connection_attempts,
-                retry_delay=rabbitmq_config.retry_delay
-            )
-            
-            connection = pika.BlockingConnection(parameters)
+            connection = pika.BlockingConnection(self.connection_parameters())
             logger.info(f"Connected to RabbitMQ at {rabbitmq_config.host}:{rabbitmq_config.port}")
             return connection
             
@@ -0,0 +1,140 @@
+import fcntl
+import logging
+import mmap
+import os
+import struct
+import threading
+import zlib
+from typing import List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Header: magic, format version, replayed-up-to offset, end-of-data offset
+_HEADER = struct.Struct("<4sIQQ")
+_MAGIC = b"PSPL"
+_VERSION = 1
+# Record: payload length, crc32 of the payload, payload
+_RECORD = struct.Struct("<II")
+
+
+class PublishSpool:
+    """
+    Append-only, memory-mapped journal of messages waiting for the broker.
+
+    Records are length-prefixed and crc32-checked, appended at the write
+    offset and consumed in order from the read offset. Once everything has
+    been replayed both offsets are reset, so the file never grows past
+    `max_bytes`. Each process locks its own slot file (`<path>.<n>`); a
+    restarted worker takes over an unlocked slot and replays what is left.
+    Slot files are readable by their owner only.
+    """
+
+    def __init__(self, path: str, max_bytes: int, max_slots: int = 64):
+        if max_bytes <= _HEADER.size + _RECORD.size:
+            raise ValueError("Spool size is too small")
+
+        self._lock = threading.Lock()
+        self._file, self.path = self._open_slot(path, max_slots)
+        self.max_bytes = max_bytes
+
+        if os.fstat(self._file.fileno()).st_size < max_bytes:
+            self._file.truncate(max_bytes)  # Sparse on most filesystems
+        self._map = mmap.mmap(self._file.fileno(), max_bytes)
+
+        magic, version, self._read_offset, self._write_offset = _HEADER.unpack_from(self._map, 0)
+        if magic != _MAGIC or version != _VERSION or not (
+            _HEADER.size <= self._read_offset <= self._write_offset <= max_bytes
+        ):
+            if magic != b"\x00" * 4:
+                logger.warning(f"Discarding unreadable publish spool {self.path}")
+            self._reset()
+        elif self._write_offset > self._read_offset:
+            logger.info(f"Publish spool {self.path} holds {self._write_offset - self._read_offset} bytes to replay")
+
+    @staticmethod
+    def _open_slot(path: str, max_slots: int):
+        """Open and exclusively lock the first free slot file; returns (file, path)"""
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, mode=0o700, exist_ok=True)
+        for slot in range(max_slots):
+            slot_path = f"{path}.{slot}"
+            spool_file = os.fdopen(os.open(slot_path, os.O_RDWR | os.O_CREAT, 0o600), "r+b")
+            try:
+                fcntl.flock(spool_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                spool_file.close()
+                continue
+            # Tighten slots created before the mode was enforced
+            os.fchmod(spool_file.fileno(), 0o600)
+            return spool_file, slot_path
+        raise RuntimeError(f"All {max_slots} publish spool slots at {path} are in use")
+
+    def _reset(self) -> None:
+        self._read_offset = self._write_offset = _HEADER.size
+        self._write_header()
+
+    def _write_header(self) -> None:
+        _HEADER.pack_into(self._map, 0, _MAGIC, _VERSION, self._read_offset, self._write_offset)
+
+    def append(self, payload: bytes) -> bool:
+        """
+        Append one record
+
+        Returns:
+            False if the spool is full
+        """
+        with self._lock:
+            end = self._write_offset + _RECORD.size + len(payload)
+            if end > self.max_bytes:
+                return False
+            _RECORD.pack_into(self._map, self._write_offset, len(payload), zlib.crc32(payload))
+            self._map[self._write_offset + _RECORD.size:end] = payload
+            # Publish the record only after it is fully written
+            self._write_offset = end
+            self._write_header()
+            return True
+
+    def read(self, offset: Optional[int] = None, limit: int = 100) -> Tuple[List[bytes], int]:
+        """
+        Read up to `limit` records starting at `offset` (default: the read offset)
+
+        Returns:
+            (payloads, offset just past the last one returned)
+        """
+        with self._lock:
+            offset = self._read_offset if offset is None else max(offset, self._read_offset)
+            payloads = []
+            while offset < self._write_offset and len(payloads) < limit:
+                length, checksum = _RECORD.unpack_from(self._map, offset)
+                start = offset + _RECORD.size
+                payload = bytes(self._map[start:start + length])
+                if start + length > self._write_offset or zlib.crc32(payload) != checksum:
+                    # Torn or corrupted tail: nothing after it can be trusted
+                    logger.error(f"Corrupted record at offset {offset} in {self.path}, dropping the rest")
+                    self._write_offset = offset
+                    self._write_header()
+                    break
+                payloads.append(payload)
+                offset = start + length
+            return payloads, offset
+
+    def commit(self, offset: int) -> None:
+        """Mark everything before `offset` as delivered"""
+        with self._lock:
+            self._read_offset = min(max(offset, self._read_offset), self._write_offset)
+            if self._read_offset == self._write_offset:
+                self._reset()
+            else:
+                self._write_header()
+
+    def is_empty(self) -> bool:
+        with self._lock:
+            return self._read_offset == self._write_offset
+
+    def close(self) -> None:
+        """Flush to disk and release the slot"""
+        with self._lock:
+            self._map.flush()
+            self._map.close()
+            self._file.close()
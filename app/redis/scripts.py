@@ -0,0 +1,62 @@
+import hashlib
+import logging
+from typing import Any, Dict, Optional, Sequence
+import redis
+from .cache import get_cache
+
+logger = logging.getLogger(__name__)
+
+
+class RedisScript:
+    """Lua script executed with EVALSHA, reloaded automatically if Redis lost it"""
+
+    def __init__(self, name: str, source: str):
+        self.name = name
+        self.source = source
+        self.sha = hashlib.sha1(source.encode("utf-8")).hexdigest()
+
+    def __call__(self, keys: Sequence[str], args: Sequence[Any] = (), client: Optional[redis.Redis] = None) -> Any:
+        """
+        Run the script atomically
+
+        Raises:
+            RuntimeError: if Redis is unavailable
+            redis.RedisError: if the script fails
+        """
+        client = client or get_cache().client
+        if not client:
+            raise RuntimeError("Redis is not available")
+
+        try:
+            return client.evalsha(self.sha, len(keys), *keys, *args)
+        except redis.exceptions.NoScriptError:
+            # Redis restarted or flushed its script cache since startup
+            client.script_load(self.source)
+            return client.evalsha(self.sha, len(keys), *keys, *args)
+
+
+# Scripts registered by the modules that use them
+_scripts: Dict[str, RedisScript] = {}
+
+
+def register_script(name: str, source: str) -> RedisScript:
+    """Register a Lua script so it is preloaded at startup"""
+    script = RedisScript(name, source)
+    _scripts[name] = script
+    return script
+
+
+def load_scripts() -> bool:
+    """Load every registered script into Redis (SCRIPT LOAD)"""
+    client = get_cache().client
+    if not client:
+        return False
+
+    try:
+        for script in _scripts.values():
+            client.script_load(script.source)
+        logger.info(f"Loaded {len(_scripts)} Redis script(s)")
+        return True
+    except Exception as e:
+        logger.error(f"Failed to load Redis scripts: {e}")
+        return False
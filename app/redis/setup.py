@@ -1,5 +1,6 @@
 import logging
 from .connection import check_redis_health
+from .scripts import load_scripts
 
 logger = logging.getLogger(__name__)
 
@@ -9,6 +10,7 @@ def init_redis() -> None:
     logger.info("Starting Redis initialization...")
     try:
         if check_redis_health():
+            load_scripts()
             logger.info("Redis setup completed successfully")
         else:
             logger.error("Redis health check failed")
@@ -1,5 +1,6 @@
 from pydantic import BaseModel, field_validator
-from typing import Optional
+from typing import Any, Dict, List, Optional
+from app.utils.validators import parse_identifier
 
 class IdentifierRequest(BaseModel):
     identifier: str  # Can be either email or phone_number
@@ -9,7 +10,8 @@ class IdentifierRequest(BaseModel):
     def validate_identifier(cls, v: str) -> str:
         if not v or not v.strip():
             raise ValueError('Identifier cannot be empty')
-        return v.strip()
+        # Canonical form (lower-cased email or E.164 phone number)
+        return parse_identifier(v)[1]
 
 class AuthCheckResponse(BaseModel):
     user_exists: bool
@@ -25,7 +27,8 @@ class RequestOTPRequest(BaseModel):
     def validate_identifier(cls, v: str) -> str:
         if not v or not v.strip():
             raise ValueError('Identifier cannot be empty')
-        return v.strip()
+        # Canonical form (lower-cased email or E.164 phone number)
+        return parse_identifier(v)[1]
 
 
 class VerifyOTPRequest(BaseModel):
@@ -37,7 +40,8 @@ class VerifyOTPRequest(BaseModel):
     def validate_identifier(cls, v: str) -> str:
         if not v or not v.strip():
             raise ValueError('Identifier cannot be empty')
-        return v.strip()
+        # Canonical form (lower-cased email or E.164 phone number)
+        return parse_identifier(v)[1]
 
     @field_validator('otp_code')
     @classmethod
@@ -54,6 +58,7 @@ class VerifyOTPRequest(BaseModel):
 class RequestOTPResponse(BaseModel):
     message: str
     identifier_type: str
+    retry_after: Optional[int] = None  # Seconds until another code can be sent
 
 
 class VerifyOTPResponse(BaseModel):
@@ -70,3 +75,24 @@ class RefreshRequest(BaseModel):
 
 class LogoutResponse(BaseModel):
     msg: str
+
+class SessionInfo(BaseModel):
+    session_id: str
+    created_at: int  # Unix timestamp
+    last_used_at: int  # Unix timestamp
+    user_agent: Optional[str] = None
+    current: bool  # True for the session of the calling access token
+
+class SessionListResponse(BaseModel):
+    sessions: List[SessionInfo]
+
+class IntrospectRequest(BaseModel):
+    tokens: List[str]
+
+class TokenIntrospection(BaseModel):
+    active: bool
+    claims: Optional[Dict[str, Any]] = None  # Verified payload, only for active tokens
+    error: Optional[str] = None  # "invalid" or "revoked" for inactive tokens
+
+class IntrospectResponse(BaseModel):
+    results: List[TokenIntrospection]  # Same order as the request
@@ -15,7 +15,7 @@ class UserCreate(BaseModel):
 class UserOut(BaseModel):
     id : str
     name : str
-    phone_number : str
+    phone_number : Optional[str]
     email : Optional[str]
     role : RoleEnum
      
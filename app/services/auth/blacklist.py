@@ -1,79 +1,456 @@
-from typing import Optional
-from app.redis.cache import cache_set, cache_get, cache_delete, cache_exists
+import logging
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional, Tuple
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from app.core.config import jwt_config
+from app.db.database import SessionLocal
+from app.models.blacklisted_token import BlacklistedToken
+from app.models.refresh_token_family import RefreshTokenFamily
+from app.models.user import User
+from app.redis.cache import get_cache, cache_set, cache_get, cache_delete, cache_exists
+from app.services.auth.jwt_handler import get_token_id, get_token_ttl
+from app.utils.expiring_cache import ExpiringLRUCache
+
+logger = logging.getLogger(__name__)
+
+# Set once Redis holds every revocation recorded in Postgres. It expires so that
+# revocations lost to eviction are restored within REVOCATION_SYNC_TTL_SECONDS
+SYNC_MARKER_KEY = "blacklist:__synced__"
+
+
+def session_version_key(user_id: str) -> str:
+    """Redis key of a user's session version (tokens with a lower `sv` are revoked)"""
+    return f"session_version:{user_id}"
+
+
+def revoked_session_key(session_id: str) -> str:
+    """Redis key of a revoked session (access tokens with that `sid` are revoked)"""
+    return f"revoked_session:{session_id}"
+
+
+def _access_token_ttl() -> int:
+    return jwt_config.access_token_expire_minutes * 60
+
+
+def _session_version_ttl() -> int:
+    # Outlives every refresh token, so a rotation never mints from a forgotten version
+    return jwt_config.refresh_token_expire_days * 24 * 3600
+
+
+def _session_keys(session_id: Optional[str]) -> List[str]:
+    return [revoked_session_key(session_id)] if session_id else []
+
+# Token ids recently confirmed as not revoked, so the hot path skips Redis too
+_not_revoked_cache = ExpiringLRUCache(maxsize=jwt_config.revocation_local_max_entries)
+_rebuild_lock = threading.Lock()
+_rebuild_thread: Optional[threading.Thread] = None
+_rebuild_thread_lock = threading.Lock()
+
+
+def _rebuild_in_background() -> None:
+    """Start one rebuild thread unless one is already running"""
+    global _rebuild_thread
+    with _rebuild_thread_lock:
+        if _rebuild_thread and _rebuild_thread.is_alive():
+            return
+        _rebuild_thread = threading.Thread(target=TokenBlacklist.rebuild_from_db, name="blacklist-rebuild", daemon=True)
+        _rebuild_thread.start()
+
+
+def _is_synced(marker_ttl: int) -> bool:
+    """
+    True if Redis can answer for Postgres, given the TTL of the sync marker.
+    A missing or half-expired marker schedules a background rebuild; until
+    it finishes, callers check Postgres.
+    """
+    if marker_ttl < jwt_config.revocation_sync_ttl_seconds / 2:
+        _rebuild_in_background()
+    return marker_ttl > 0
 
 
 class TokenBlacklist:
     """Redis-based token blacklist service"""
 
     @staticmethod
-    def blacklist_token(token: str, expires_in: int = 3600) -> bool:
+    def blacklist_token(token_id: str, expires_in: int = 3600) -> bool:
         """
         Add a token to the blacklist
 
         Args:
-            token: JWT token to blacklist
+            token_id: Token `jti` (see `get_token_id`)
             expires_in: Time in seconds until token expires (default: 1 hour)
 
         Returns:
             True if successfully blacklisted, False otherwise
         """
-        key = f"blacklist:{token}"
-        return cache_set(key, "blacklisted", expire=expires_in)
+        _not_revoked_cache.delete(token_id)
+        key = f"blacklist:{token_id}"
+        success = cache_set(key, "blacklisted", expire=expires_in)
+        if not success:
+            # Force the next lookup to rebuild from Postgres
+            cache_delete(SYNC_MARKER_KEY)
+        return success
+
+    @staticmethod
+    def revoke_session(session_id: str) -> bool:
+        """
+        Revoke every access token of a session until the last one expires
+
+        Returns:
+            True if the Redis entry was written, False otherwise
+        """
+        success = cache_set(revoked_session_key(session_id), "revoked", expire=_access_token_ttl())
+        if not success:
+            # The family's revoked_at in Postgres still answers until Redis is rebuilt
+            cache_delete(SYNC_MARKER_KEY)
+        _not_revoked_cache.clear()
+        return success
 
     @staticmethod
-    def is_blacklisted(token: str) -> bool:
+    def is_blacklisted(token_id: str) -> bool:
         """
         Check if a token is blacklisted
 
         Args:
-            token: JWT token to check
+            token_id: Token `jti` to check
 
         Returns:
             True if token is blacklisted, False otherwise
         """
-        key = f"blacklist:{token}"
+        key = f"blacklist:{token_id}"
         return cache_exists(key)
 
     @staticmethod
-    def remove_from_blacklist(token: str) -> bool:
+    def is_revoked(
+        token_id: str,
+        expires_at: Optional[float] = None,
+        user_id: Optional[str] = None,
+        session_version: int = 0,
+        session_id: Optional[str] = None
+    ) -> bool:
+        """
+        Check revocation through the in-process cache, then Redis, and only
+        fall back to Postgres when Redis is unavailable or not yet rebuilt
+
+        Args:
+            token_id: Token `jti` to check (signature must already be verified)
+            expires_at: Token `exp` as a Unix timestamp, caps the local cache TTL
+            user_id: Token owner, enables the session version check
+            session_version: Token `sv` claim
+            session_id: Token `sid` claim, enables the revoked session check
+
+        Returns:
+            True if token is revoked, False otherwise
+        """
+        if _not_revoked_cache.get(token_id):
+            return False
+
+        revoked = TokenBlacklist._is_revoked_in_redis(token_id, user_id, session_version, session_id)
+        if revoked is None:
+            revoked = TokenBlacklist._is_revoked_in_db(token_id, user_id, session_version, session_id)
+
+        if not revoked:
+            TokenBlacklist._remember_not_revoked(token_id, expires_at)
+        return revoked
+
+    @staticmethod
+    def are_revoked(tokens: List[Tuple[str, dict]]) -> List[bool]:
+        """
+        Batch variant of `is_revoked` for verified (token, payload) pairs.
+        Everything the local cache can't answer is checked in one Redis pipeline.
+
+        Returns:
+            One revocation flag per input, in order
+        """
+        results: List[Optional[bool]] = []
+        pending = []
+        for index, (token, payload) in enumerate(tokens):
+            token_id = get_token_id(token, payload)
+            if _not_revoked_cache.get(token_id):
+                results.append(False)
+            else:
+                results.append(None)
+                pending.append((index, token_id, payload))
+
+        if not pending:
+            return results
+
+        client = get_cache().client
+        checked = None
+        if client:
+            try:
+                user_ids = list({payload["user_id"] for _, _, payload in pending if payload.get("user_id")})
+                pipe = client.pipeline(transaction=False)
+                pipe.ttl(SYNC_MARKER_KEY)
+                for _, token_id, payload in pending:
+                    pipe.exists(f"blacklist:{token_id}", *_session_keys(payload.get("sid")))
+                for user_id in user_ids:
+                    pipe.get(session_version_key(user_id))
+                replies = pipe.execute()
+                if _is_synced(replies[0]):
+                    checked = (replies[1:len(pending) + 1], dict(zip(user_ids, replies[len(pending) + 1:])))
+            except Exception as e:
+                logger.error(f"Error checking blacklist in Redis: {e}")
+
+        if checked is None:
+            # Redis down or not rebuilt yet: take the single-token path for each
+            for index, token_id, payload in pending:
+                results[index] = TokenBlacklist.is_revoked(
+                    token_id, payload.get("exp"), payload.get("user_id"), payload.get("sv", 0), payload.get("sid")
+                )
+            return results
+
+        blacklisted, versions = checked
+        for (index, token_id, payload), in_blacklist in zip(pending, blacklisted):
+            user_id = payload.get("user_id")
+            revoked = in_blacklist > 0
+            if not revoked and user_id:
+                if versions.get(user_id) is None:
+                    versions[user_id] = TokenBlacklist.restore_session_version(user_id)
+                if versions[user_id] is None:
+                    revoked = TokenBlacklist._is_revoked_in_db(
+                        token_id, user_id, payload.get("sv", 0), payload.get("sid")
+                    )
+                else:
+                    revoked = payload.get("sv", 0) < int(versions[user_id])
+            if not revoked:
+                TokenBlacklist._remember_not_revoked(token_id, payload.get("exp"))
+            results[index] = revoked
+        return results
+
+    @staticmethod
+    def _remember_not_revoked(token_id: str, expires_at: Optional[float]) -> None:
+        """Cache a negative lookup locally, never past the token's own expiry"""
+        cache_until = time.time() + jwt_config.revocation_local_ttl_seconds
+        if expires_at:
+            cache_until = min(cache_until, expires_at)
+        _not_revoked_cache.set(token_id, True, cache_until)
+
+    @staticmethod
+    def _is_revoked_in_redis(
+        token_id: str,
+        user_id: Optional[str],
+        session_version: int,
+        session_id: Optional[str] = None
+    ) -> Optional[bool]:
+        """Check Redis in one round-trip; None means Redis can't answer"""
+        client = get_cache().client
+        if not client:
+            return None
+
+        revocation_keys = [f"blacklist:{token_id}", *_session_keys(session_id)]
+        try:
+            pipe = client.pipeline(transaction=False)
+            pipe.exists(*revocation_keys)
+            pipe.ttl(SYNC_MARKER_KEY)
+            if user_id:
+                pipe.get(session_version_key(user_id))
+            revoked, marker_ttl, *current_version = pipe.execute()
+            current_version = current_version[0] if current_version else None
+        except Exception as e:
+            logger.error(f"Error checking blacklist in Redis: {e}")
+            return None
+
+        if not _is_synced(marker_ttl):
+            # Redis lost its data (restart/eviction) or the marker expired; rebuilt in the background
+            return None
+        if revoked:
+            return True
+
+        if user_id:
+            if current_version is None:
+                current_version = TokenBlacklist.restore_session_version(user_id)
+                if current_version is None:
+                    return None
+            if session_version < int(current_version):
+                return True
+        return False
+
+    @staticmethod
+    def _is_revoked_in_db(
+        token_id: str,
+        user_id: Optional[str],
+        session_version: int,
+        session_id: Optional[str] = None
+    ) -> bool:
+        """Check the Postgres source of truth"""
+        with SessionLocal() as db:
+            if db.query(BlacklistedToken.id).filter_by(jti=token_id).first() is not None:
+                return True
+            if session_id and db.query(RefreshTokenFamily.revoked_at).filter_by(id=session_id).scalar() is not None:
+                return True
+            if user_id:
+                current_version = db.query(User.session_version).filter_by(id=user_id).scalar()
+                return current_version is not None and session_version < current_version
+            return False
+
+    @staticmethod
+    def restore_session_version(user_id: str) -> Optional[int]:
+        """Copy a user's session version from Postgres into Redis if it is missing there"""
+        try:
+            with SessionLocal() as db:
+                current_version = db.query(User.session_version).filter_by(id=user_id).scalar() or 0
+            client = get_cache().client
+            # NX keeps a concurrent INCR from being overwritten
+            client.set(session_version_key(user_id), current_version, nx=True, ex=_session_version_ttl())
+            return int(client.get(session_version_key(user_id)))
+        except Exception as e:
+            logger.error(f"Failed to restore session version for user {user_id}: {e}")
+            return None
+
+    @staticmethod
+    def revoke(db: Session, user_id: str, token: str, payload: dict) -> bool:
+        """
+        Revoke a verified token in Postgres and Redis until its own `exp`
+
+        Args:
+            db: Database session
+            user_id: Owner of the token
+            token: Encoded JWT
+            payload: Verified payload of the token
+
+        Returns:
+            True if the Redis entry was written, False otherwise
+        """
+        token_id = get_token_id(token, payload)
+        expires_at = datetime.fromtimestamp(payload["exp"], tz=timezone.utc)
+
+        try:
+            db.add(BlacklistedToken(user_id=user_id, jti=token_id, expires_at=expires_at))
+            db.commit()
+        except IntegrityError:
+            # Already revoked (e.g. repeated logout)
+            db.rollback()
+
+        return TokenBlacklist.blacklist_token(token_id, expires_in=max(1, get_token_ttl(payload)))
+
+    @staticmethod
+    def rebuild_from_db() -> bool:
+        """
+        Copy every unexpired revocation from Postgres into Redis, unless
+        another worker did so recently. Runs at startup and in the background,
+        never on the request path.
+
+        Returns:
+            True if Redis now mirrors Postgres, False otherwise
+        """
+        client = get_cache().client
+        if not client:
+            return False
+
+        with _rebuild_lock:
+            try:
+                if client.ttl(SYNC_MARKER_KEY) >= jwt_config.revocation_sync_ttl_seconds / 2:
+                    return True
+
+                now = datetime.now(timezone.utc)
+                restored = 0
+                with SessionLocal() as db:
+                    pipe = client.pipeline(transaction=False)
+                    rows = db.query(BlacklistedToken.jti, BlacklistedToken.expires_at).filter(
+                        BlacklistedToken.expires_at > now
+                    )
+                    for jti, expires_at in rows.yield_per(1000):
+                        if expires_at.tzinfo is None:
+                            expires_at = expires_at.replace(tzinfo=timezone.utc)
+                        ttl = int((expires_at - now).total_seconds())
+                        if ttl <= 0:
+                            continue
+                        pipe.set(f"blacklist:{jti}", "blacklisted", ex=ttl)
+                        restored += 1
+                    # Sessions revoked recently enough to still have live access tokens
+                    rows = db.query(RefreshTokenFamily.id, RefreshTokenFamily.revoked_at).filter(
+                        RefreshTokenFamily.revoked_at > now - timedelta(seconds=_access_token_ttl())
+                    )
+                    for family_id, revoked_at in rows.yield_per(1000):
+                        if revoked_at.tzinfo is None:
+                            revoked_at = revoked_at.replace(tzinfo=timezone.utc)
+                        ttl = _access_token_ttl() - int((now - revoked_at).total_seconds())
+                        if ttl > 0:
+                            pipe.set(revoked_session_key(family_id), "revoked", ex=ttl)
+                    pipe.set(SYNC_MARKER_KEY, "1", ex=jwt_config.revocation_sync_ttl_seconds)
+                    pipe.execute()
+
+                logger.info(f"Rebuilt Redis blacklist from database ({restored} tokens)")
+                return True
+            except Exception as e:
+                logger.error(f"Failed to rebuild Redis blacklist: {e}")
+                return False
+
+    @staticmethod
+    def remove_from_blacklist(token_id: str) -> bool:
         """
         Remove a token from the blacklist (useful for testing)
 
         Args:
-            token: JWT token to remove
+            token_id: Token `jti` to remove
 
         Returns:
             True if successfully removed, False otherwise
         """
-        key = f"blacklist:{token}"
+        key = f"blacklist:{token_id}"
         return cache_delete(key)
 
     @staticmethod
-    def get_blacklist_status(token: str) -> Optional[str]:
+    def get_blacklist_status(token_id: str) -> Optional[str]:
         """
         Get the blacklist status of a token
 
         Args:
-            token: JWT token to check
+            token_id: Token `jti` to check
 
         Returns:
             "blacklisted" if token is blacklisted, None otherwise
         """
-        key = f"blacklist:{token}"
+        key = f"blacklist:{token_id}"
         return cache_get(key)
 
 
 # Convenience functions for direct use
-def blacklist_token(token: str, expires_in: int = 3600) -> bool:
+def blacklist_token(token_id: str, expires_in: int = 3600) -> bool:
     """Add token to blacklist"""
-    return TokenBlacklist.blacklist_token(token, expires_in)
+    return TokenBlacklist.blacklist_token(token_id, expires_in)
 
 
-def is_token_blacklisted(token: str) -> bool:
+def is_token_blacklisted(token_id: str) -> bool:
     """Check if token is blacklisted"""
-    return TokenBlacklist.is_blacklisted(token)
+    return TokenBlacklist.is_blacklisted(token_id)
+
+
+def is_token_revoked(token: str, payload: dict) -> bool:
+    """Check if a verified token is revoked using the tiered lookup"""
+    return TokenBlacklist.is_revoked(
+        get_token_id(token, payload),
+        payload.get("exp"),
+        payload.get("user_id"),
+        payload.get("sv", 0),
+        payload.get("sid")
+    )
+
+
+def are_tokens_revoked(tokens: List[Tuple[str, dict]]) -> List[bool]:
+    """Check many verified tokens with at most one Redis round-trip"""
+    return TokenBlacklist.are_revoked(tokens)
+
+
+def revoke_token(db: Session, user_id: str, token: str, payload: dict) -> bool:
+    """Revoke a verified token until it expires"""
+    return TokenBlacklist.revoke(db, user_id, token, payload)
+
+
+def clear_local_revocation_cache() -> None:
+    """Forget locally cached "not revoked" decisions"""
+    _not_revoked_cache.clear()
+
+
+def rebuild_blacklist_cache() -> bool:
+    """Repopulate the Redis blacklist from the database"""
+    return TokenBlacklist.rebuild_from_db()
 
 
-def remove_token_from_blacklist(token: str) -> bool:
+def remove_token_from_blacklist(token_id: str) -> bool:
     """Remove token from blacklist"""
-    return TokenBlacklist.remove_from_blacklist(token)
\ No newline at end of file
+    return TokenBlacklist.remove_from_blacklist(token_id)
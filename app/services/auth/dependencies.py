@@ -0,0 +1,19 @@
+from fastapi import Depends, HTTPException
+from app.services.auth.jwt_handler import decode_access_token, extract_token
+from app.services.auth.blacklist import is_token_revoked
+
+
+def require_active_token(token: str = Depends(extract_token)) -> dict:
+    """
+    Resolve the bearer token to its verified payload.
+    Signature and expiry are checked first so forged or stale tokens never
+    reach the revocation lookup, which normally resolves without the database.
+    """
+    payload = decode_access_token(token)
+    if not payload:
+        raise HTTPException(status_code=401, detail="Invalid token")
+
+    if is_token_revoked(token, payload):
+        raise HTTPException(status_code=401, detail="Token blacklisted")
+
+    return payload
@@ -1,13 +1,22 @@
+import hashlib
+import time
+import uuid
 import jwt
-from datetime import datetime, timedelta
+from enum import Enum
+from datetime import datetime, timedelta, timezone
 from fastapi import HTTPException, Security
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from typing import Optional
 from app.core.config import jwt_config
+from app.services.auth.signing_keys import get_key_ring, is_asymmetric
+from app.utils.expiring_cache import ExpiringLRUCache
 
 # Security scheme for Swagger UI
 security = HTTPBearer()
 
+# Verified payloads keyed by token digest; disabled when the size is 0
+_decode_cache = ExpiringLRUCache(maxsize=jwt_config.decode_cache_size)
+
 
 def extract_token(credentials: HTTPAuthorizationCredentials = Security(security)) -> str:
     """
@@ -24,32 +33,95 @@ def extract_token(credentials: HTTPAuthorizationCredentials = Security(security)
     return token
 
 
+def profile_claim_fields() -> tuple:
+    """User fields configured to ride in access tokens (JWT_PROFILE_CLAIMS)"""
+    return tuple(filter(None, (f.strip() for f in jwt_config.profile_claims.split(","))))
+
+
+def get_access_token_claims(user) -> dict:
+    """Identity claims, session version, and the configured profile claims with their version"""
+    claims = {
+        "user_id": user.id,
+        "email": user.email,
+        "phone_number": user.phone_number,
+        "pv": user.profile_version,
+        "sv": user.session_version,
+    }
+    for field in profile_claim_fields():
+        value = getattr(user, field, None)
+        claims[field] = value.value if isinstance(value, Enum) else value
+    return claims
+
+
 def create_access_token(data: dict):
     to_encode = data.copy()
-    expire = datetime.now() + timedelta(minutes=jwt_config.access_token_expire_minutes)
-    to_encode.update({"exp":expire})
+    expire = datetime.now(timezone.utc) + timedelta(minutes=jwt_config.access_token_expire_minutes)
+    to_encode.update({"exp": expire, "jti": uuid.uuid4().hex})
+    if is_asymmetric(jwt_config.algorithm):
+        kid, private_key = get_key_ring().signing_key()
+        return jwt.encode(to_encode, private_key, algorithm=jwt_config.algorithm, headers={"kid": kid})
     return jwt.encode(to_encode, jwt_config.secret_key, algorithm=jwt_config.algorithm)
     
 def create_refresh_token(data: dict):
     to_encode = data.copy()
-    expire = datetime.now() + timedelta(days=jwt_config.refresh_token_expire_days)
+    expire = datetime.now(timezone.utc) + timedelta(days=jwt_config.refresh_token_expire_days)
     to_encode.update({"exp": expire})
-    return jwt.encode(to_encode, jwt_config.refresh_secret_key, algorithm=jwt_config.algorithm)
+    to_encode.setdefault("jti", uuid.uuid4().hex)
+    return jwt.encode(to_encode, jwt_config.refresh_secret_key, algorithm=jwt_config.refresh_algorithm)
     
-def decode_access_token(token: str):
+def _decode_cached(token: str, key, algorithm: str, kind: str) -> Optional[dict]:
+    """Verify a token, reusing the payload of an identical token verified before"""
+    if _decode_cache.maxsize <= 0:
+        return _decode(token, key, algorithm)
+
+    cache_key = (kind, hashlib.sha256(token.encode("utf-8")).digest())
+    payload = _decode_cache.get(cache_key)
+    if payload is not None:
+        return payload.copy()
+
+    payload = _decode(token, key, algorithm)
+    if payload and "exp" in payload:
+        # Evicted at exp, so a cached payload is never served for an expired token
+        _decode_cache.set(cache_key, payload.copy(), payload["exp"])
+    return payload
+
+
+def _decode(token: str, key, algorithm: str) -> Optional[dict]:
     try:
-        payload = jwt.decode(token, jwt_config.secret_key, algorithms=[jwt_config.algorithm])
+        if is_asymmetric(algorithm):
+            # Pick the public key by the token's kid so rotated keys keep verifying
+            key = get_key_ring().verification_key(jwt.get_unverified_header(token).get("kid"))
+            if key is None:
+                return None
+        payload = jwt.decode(token, key, algorithms=[algorithm])
         return payload
     except jwt.ExpiredSignatureError:
         return None
     except jwt.InvalidTokenError:
         return None
+
+def decode_access_token(token: str):
+    return _decode_cached(token, jwt_config.secret_key, jwt_config.algorithm, "access")
     
 def decode_refresh_token(token: str):
-    try:
-        payload = jwt.decode(token, jwt_config.refresh_secret_key, algorithms=[jwt_config.algorithm])
-        return payload
-    except jwt.ExpiredSignatureError:
-        return None
-    except jwt.InvalidTokenError:
-        return None
\ No newline at end of file
+    return _decode_cached(token, jwt_config.refresh_secret_key, jwt_config.refresh_algorithm, "refresh")
+
+
+def get_decode_cache_stats() -> dict:
+    """Size and hit/miss counters of the verified-token cache"""
+    return _decode_cache.stats()
+
+def get_token_id(token: str, payload: dict) -> str:
+    """
+    Fixed-size revocation id for a token: its `jti` claim, or a 32-char
+    SHA-256 digest for tokens issued before `jti` was added
+    """
+    jti = payload.get("jti")
+    if jti:
+        return jti
+    return hashlib.sha256(token.encode("utf-8")).hexdigest()[:32]
+
+
+def get_token_ttl(payload: dict) -> int:
+    """Seconds until the token's `exp`, never negative"""
+    return max(0, int(payload.get("exp", 0) - time.time()))
@@ -1,14 +1,68 @@
+import logging
 import random
 import string
-from datetime import datetime, timedelta
+from concurrent.futures import Future
 from sqlalchemy.orm import Session
-from sqlalchemy import or_
 from app.models.user import User
 from app.redis.cache import get_cache
-from app.rabbitmq.producer import get_rabbitmq_producer
-from app.utils.validators import normalize_phone_number
+from app.redis.scripts import register_script
+from app.rabbitmq.publisher import get_background_publisher
+from app.utils.validators import get_identifier_type, parse_identifier
 from typing import Optional
 
+logger = logging.getLogger(__name__)
+
+# OTP settings
+OTP_EXPIRE_SECONDS = 600  # Enforced solely by the Redis key TTL
+OTP_MAX_ATTEMPTS = 5  # Wrong codes allowed before the OTP is burned
+OTP_RESEND_COOLDOWN_SECONDS = 60  # Repeated requests within this window reuse the live code
+
+# Compare, count the failed attempt and delete in one atomic step, so a code
+# can be consumed at most once even under concurrent verifies.
+# Returns 1 on success, 0 on mismatch/missing, -1 when attempts are exhausted.
+VERIFY_OTP_SCRIPT = register_script("otp_verify", """
+-- KEYS[1]: OTP hash; ARGV[1]: submitted code, ARGV[2]: max attempts
+local code = redis.call('HGET', KEYS[1], 'code')
+if not code then
+    return 0
+end
+if code == ARGV[1] then
+    redis.call('DEL', KEYS[1])
+    return 1
+end
+local attempts = redis.call('HINCRBY', KEYS[1], 'attempts', 1)
+if attempts >= tonumber(ARGV[2]) then
+    redis.call('DEL', KEYS[1])
+    return -1
+end
+return 0
+""")
+
+# Issue a new code unless one was sent within the cooldown, in which case the
+# live code is returned untouched and nothing should be republished.
+# Returns {issued (1/0), code, seconds until a resend is allowed, send count}.
+ISSUE_OTP_SCRIPT = register_script("otp_issue", """
+-- KEYS[1]: OTP hash; ARGV[1]: new code, ARGV[2]: TTL, ARGV[3]: resend cooldown
+local now = tonumber(redis.call('TIME')[1])
+local cooldown = tonumber(ARGV[3])
+local code = redis.call('HGET', KEYS[1], 'code')
+local sent_at = tonumber(redis.call('HGET', KEYS[1], 'sent_at') or '0')
+if code and now - sent_at < cooldown then
+    local send_count = tonumber(redis.call('HGET', KEYS[1], 'send_count') or '1')
+    return {0, code, cooldown - (now - sent_at), send_count}
+end
+local send_count = redis.call('HINCRBY', KEYS[1], 'send_count', 1)
+redis.call('HSET', KEYS[1], 'code', ARGV[1], 'attempts', 0, 'sent_at', now)
+redis.call('EXPIRE', KEYS[1], ARGV[2])
+return {1, ARGV[1], cooldown, send_count}
+""")
+
+
+def _log_otp_delivery_failure(future: Future) -> None:
+    """Report OTP messages the broker never confirmed"""
+    if not future.cancelled() and future.exception() is not None:
+        logger.error(f"OTP message was not delivered: {future.exception()}")
+
 
 class OTPHandler:
     """Handles OTP generation, validation, and messaging"""
@@ -19,108 +73,101 @@ class OTPHandler:
         return ''.join(random.choices(string.digits, k=length))
 
     @staticmethod
-    def create_otp(user_id: str, db: Session = None) -> dict:
-        """Create a new OTP for a user and store in Redis cache"""
-        # Generate OTP code
-        otp_code = OTPHandler.generate_otp_code()
+    def canonical_identifier(identifier: str) -> str:
+        """
+        Canonical form of an email or phone number, used to key pending OTPs
 
-        # Create cache key for the OTP
-        cache_key = f"otp:{user_id}"
+        Raises:
+            ValueError: if a phone number is malformed
+        """
+        return parse_identifier(identifier)[1]
 
-        # Prepare OTP data
-        otp_data = {
-            "code": otp_code,
-            "created_at": datetime.utcnow().isoformat(),
-            "is_used": False
-        }
+    @staticmethod
+    def create_otp(identifier: str, db: Session = None) -> dict:
+        """
+        Create a new OTP for an email or phone number and store in Redis cache,
+        or reuse the live one if it was sent within the resend cooldown
+        """
+        # Generate OTP code
+        otp_code = OTPHandler.generate_otp_code()
 
-        # Store in Redis cache with 10-minute expiration
-        cache = get_cache()
-        success = cache.set(cache_key, otp_data, expire=600)  # 600 seconds = 10 minutes
+        # Pending OTPs are keyed by identifier, so no user row is needed yet
+        cache_key = f"otp:{OTPHandler.canonical_identifier(identifier)}"
 
-        if not success:
-            raise Exception("Failed to store OTP in cache")
+        # Store as a hash with 10-minute expiration in one atomic step
+        try:
+            issued, code, retry_after, send_count = ISSUE_OTP_SCRIPT(
+                keys=[cache_key],
+                args=[otp_code, OTP_EXPIRE_SECONDS, OTP_RESEND_COOLDOWN_SECONDS]
+            )
+        except Exception as e:
+            raise Exception(f"Failed to store OTP in cache: {e}")
 
         # Return OTP data (without exposing the actual code for security)
         return {
-            "user_id": user_id,
-            "code": otp_code,  # Only return for internal use (like sending)
-            "expires_in": 600
+            "identifier": identifier,
+            "code": code,  # Only return for internal use (like sending)
+            "expires_in": OTP_EXPIRE_SECONDS,
+            "issued": bool(issued),  # False: live code reused, don't send again
+            "retry_after": int(retry_after),
+            "send_count": int(send_count)
         }
 
     @staticmethod
-    def validate_otp(user_id: str, otp_code: str, db: Session = None) -> bool:
-        """Validate an OTP code for a user from Redis cache"""
-        cache_key = f"otp:{user_id}"
-        cache = get_cache()
-
-        # Get OTP data from cache
-        otp_data = cache.get(cache_key)
-
-        if not otp_data:
+    def discard_otp(identifier: str) -> bool:
+        """
+        Drop an identifier's pending code and resend cooldown (e.g. when it
+        could not be sent). send_count is kept until the hash expires, so a
+        failed send does not reset the count of codes sent.
+        """
+        cache_key = f"otp:{OTPHandler.canonical_identifier(identifier)}"
+        client = get_cache().client
+        if not client:
             return False
 
-        # Check if OTP is already used
-        if otp_data.get("is_used", False):
-            return False
-
-        # Check if the provided code matches
-        if otp_data.get("code") != otp_code:
+        try:
+            return client.hdel(cache_key, "code", "attempts", "sent_at") > 0
+        except Exception as e:
+            logger.error(f"Failed to discard OTP {cache_key}: {e}")
             return False
 
-        # Check if OTP has expired (10 minutes from creation)
-        created_at_str = otp_data.get("created_at")
-        if created_at_str:
-            try:
-                created_at = datetime.fromisoformat(created_at_str)
-                if datetime.utcnow() - created_at > timedelta(minutes=10):
-                    # OTP expired, remove from cache
-                    cache.delete(cache_key)
-                    return False
-            except (ValueError, TypeError):
-                # Invalid date format, consider OTP invalid
-                cache.delete(cache_key)
-                return False
+    @staticmethod
+    def validate_otp(identifier: str, otp_code: str, db: Session = None) -> bool:
+        """Validate and consume an OTP code for an identifier in one Redis round-trip"""
+        cache_key = f"otp:{OTPHandler.canonical_identifier(identifier)}"
 
-        # OTP is valid, remove it from cache immediately after validation
-        cache.delete(cache_key)
+        try:
+            result = VERIFY_OTP_SCRIPT(keys=[cache_key], args=[otp_code, OTP_MAX_ATTEMPTS])
+        except Exception as e:
+            logger.error(f"Failed to verify OTP: {e}")
+            return False
 
-        return True
+        if result == -1:
+            logger.warning(f"OTP attempts exhausted for {cache_key}")
+        return result == 1
 
     @staticmethod
     def get_user_by_identifier(identifier: str, db: Session) -> Optional[User]:
-        """Get user by email or phone number"""
-        # Check if it's an email or phone
-        import re
-        email_pattern = r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$'
-        is_email = re.match(email_pattern, identifier) is not None
-
-        if is_email:
-            return db.query(User).filter(User.email == identifier).first()
-        else:
-            # Normalize phone number before querying
-            # Check both normalized and original to handle existing data with '+'
-            normalized_phone = normalize_phone_number(identifier)
-            return db.query(User).filter(
-                or_(
-                    User.phone_number == normalized_phone,
-                    User.phone_number == identifier
-                )
-            ).first()
+        """Get user by email or phone number (one equality on its unique index)"""
+        try:
+            identifier_type, value = parse_identifier(identifier)
+        except ValueError:
+            return None
+
+        column = User.email if identifier_type == "email" else User.phone_number
+        return db.query(User).filter(column == value).first()
 
     @staticmethod
     def get_identifier_type(identifier: str) -> str:
         """Determine if identifier is email or phone_number"""
-        import re
-        email_pattern = r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$'
-        return "email" if re.match(email_pattern, identifier) else "phone_number"
+        return get_identifier_type(identifier)
 
     @staticmethod
     def send_otp_message(identifier: str, otp_code: str, identifier_type: str) -> bool:
-        """Send OTP message to RabbitMQ"""
+        """Queue OTP message for RabbitMQ; returns once it is enqueued, not delivered"""
         try:
             from app.rabbitmq.config import rabbitmq_config
-            producer = get_rabbitmq_producer()
+            publisher = get_background_publisher()
 
             # Determine routing key based on identifier type
             if identifier_type == "email":
@@ -131,7 +178,10 @@ class OTPHandler:
                 print(f"Invalid identifier type: {identifier_type}")
                 return False
 
-            return producer.publish_otp_message(identifier, otp_code, routing_key)
+            future = publisher.publish_otp_message(identifier, otp_code, routing_key)
+            future.add_done_callback(_log_otp_delivery_failure)
+            # Only a full queue fails synchronously; broker failures are logged
+            return not (future.done() and future.exception() is not None)
         except Exception as e:
             print(f"Failed to send OTP message: {e}")
             return False
\ No newline at end of file
@@ -1,73 +1,286 @@
+import hashlib
+import logging
+import math
+import threading
 import time
-from typing import Optional
-from app.redis.cache import get_cache, cache_get, cache_set, cache_incr
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+from fastapi import HTTPException, Request, Response
+from starlette.concurrency import run_in_threadpool
+from app.core.config import rate_limit_config
+from app.redis.scripts import register_script
+from app.services.auth.otp_handler import OTPHandler
+from app.utils.expiring_cache import ExpiringLRUCache
 
-# Rate limiting configuration
-MAX_REQUESTS_PER_MINUTE = 60
-WINDOW_SECONDS = 60
+logger = logging.getLogger(__name__)
+
+# Generic cell rate algorithm: each key stores only its "theoretical arrival
+# time" (TAT), so checking and consuming is a single atomic script call.
+# Times are in milliseconds, taken from the Redis clock so all workers agree.
+# A worker leasing a batch asks for up to `quantity` but settles for as few as
+# `minimum`, and hands back the unspent requests of its expired lease first,
+# so every decision is one call and unused leases don't shrink the budget.
+# A batch takes at most half of what is left, so near the limit leases shrink
+# instead of one worker holding requests the others are denied.
+GCRA_SCRIPT = register_script("rate_limit_gcra", """
+-- KEYS[1]: limiter key
+-- ARGV[1]: limit (requests per period), ARGV[2]: period in ms, ARGV[3]: quantity,
+-- ARGV[4]: least quantity to grant (default: quantity), ARGV[5]: unused requests handed back (default: 0)
+local limit = tonumber(ARGV[1])
+local period = tonumber(ARGV[2])
+local quantity = tonumber(ARGV[3])
+local minimum = tonumber(ARGV[4] or ARGV[3])
+local returned = tonumber(ARGV[5] or 0)
+local interval = period / limit
+
+local now = redis.call('TIME')
+now = tonumber(now[1]) * 1000 + math.floor(tonumber(now[2]) / 1000)
+
+local tat = tonumber(redis.call('GET', KEYS[1]) or now) - interval * returned
+if tat < now then
+    tat = now
+end
+
+local available = math.floor((now + period - tat) / interval)
+local granted = math.min(quantity, math.max(minimum, math.floor(available / 2)))
+if available < minimum then
+    -- Denied: only handed-back requests are stored
+    if returned > 0 then
+        if tat > now then
+            redis.call('SET', KEYS[1], tat, 'PX', math.ceil(tat - now))
+        else
+            redis.call('DEL', KEYS[1])
+        end
+    end
+    return {0, 0, math.ceil(tat + interval * minimum - period - now), math.ceil(tat - now), 0}
+end
+
+local new_tat = tat + interval * granted
+redis.call('SET', KEYS[1], new_tat, 'PX', math.ceil(new_tat - now))
+return {1, math.floor((now + period - new_tat) / interval), 0, math.ceil(new_tat - now), granted}
+""")
+
+
+@dataclass(frozen=True)
+class RateLimitPolicy:
+    """Allow `limit` requests per `period` seconds, with bursts up to `limit`"""
+    limit: int
+    period: int
+
+    @classmethod
+    def parse(cls, value: str) -> Optional["RateLimitPolicy"]:
+        """Parse "limit/period" (e.g. "5/60"); empty or "0/..." disables the policy"""
+        if not value or not value.strip():
+            return None
+        limit, _, period = value.partition("/")
+        policy = cls(limit=int(limit), period=int(period or 60))
+        return policy if policy.limit > 0 else None
+
+
+@dataclass(frozen=True)
+class RateLimitResult:
+    """Outcome of one limiter check"""
+    allowed: bool
+    limit: int
+    remaining: int
+    retry_after: float  # Seconds until the request would be allowed
+    reset_after: float  # Seconds until the full quota is available again
+
+
+class _Lease:
+    """Slice of a key's global budget reserved by this worker"""
+
+    def __init__(self, tokens: int, result: RateLimitResult, expires_at: float):
+        self.tokens = tokens
+        self.remaining = result.remaining  # Global allowance left after leasing
+        self.reset_at = time.time() + result.reset_after
+        self.expires_at = expires_at  # Spendable until then; leftovers are handed back afterwards
+        self.refilling = False
 
 
 class RateLimiter:
-    """Redis-based rate limiter"""
+    """
+    Redis-based GCRA rate limiter with an in-process pre-admission tier.
+
+    Each worker leases a batch of requests from the global budget in one
+    script call and spends it locally, topping it up in the background when
+    it runs low. Keys Redis has just denied are rejected locally until their
+    retry time. Leased requests are already counted globally, so workers can
+    never exceed the limit together; what an expired lease left unspent is
+    handed back with the worker's next call for the key. Policies too small
+    for a useful batch always go to Redis.
+    """
 
     def __init__(self):
-        self.cache = get_cache()
+        self._leases = ExpiringLRUCache(maxsize=rate_limit_config.local_max_keys)
+        self._denied = ExpiringLRUCache(maxsize=rate_limit_config.local_max_keys)
+        self._lock = threading.Lock()
+        self._refills = ThreadPoolExecutor(max_workers=2, thread_name_prefix="rate-limit-refill")
 
-    def _get_key(self, identifier: str) -> str:
+    def _get_key(self, scope: str, identifier: str) -> str:
         """Generate cache key for rate limiting"""
-        return f"rate_limit:{identifier}"
+        return f"rate_limit:{scope}:{identifier}"
 
-    def is_rate_limited(self, identifier: str) -> bool:
+    def hit(self, scope: str, identifier: str, policy: RateLimitPolicy, quantity: int = 1) -> Optional[RateLimitResult]:
         """
-        Check if the identifier is rate limited
+        Consume `quantity` requests from the identifier's allowance
 
         Args:
-            identifier: Unique identifier (e.g., user ID, IP address)
+            scope: Policy name (e.g. "request_otp:ip")
+            identifier: Unique identifier (e.g. IP address, email, phone number)
+            policy: Limit to enforce
+            quantity: Number of requests to consume
 
         Returns:
-            True if rate limited, False otherwise
+            The limiter decision, or None if Redis is unavailable
         """
-        key = self._get_key(identifier)
-        current_time = int(time.time())
-
-        # Get current request count
-        request_count = cache_get(key) or 0
-
-        # Reset counter if window has passed
-        if request_count == 0:
-            # First request in this window
-            cache_set(key, 1, expire=WINDOW_SECONDS)
-            return False
-
-        if request_count >= MAX_REQUESTS_PER_MINUTE:
-            return True
-
-        # Increment counter
-        new_count = cache_incr(key, 1)
-        if new_count is None:
-            # Fallback if increment fails
-            return False
-
-        return new_count > MAX_REQUESTS_PER_MINUTE
-
-    def get_remaining_requests(self, identifier: str) -> int:
-        """Get remaining requests allowed for the identifier"""
-        key = self._get_key(identifier)
-        current_count = cache_get(key) or 0
-        remaining = max(0, MAX_REQUESTS_PER_MINUTE - current_count)
-        return remaining
-
-    def get_reset_time(self, identifier: str) -> Optional[int]:
-        """Get the time when the rate limit resets (Unix timestamp)"""
-        key = self._get_key(identifier)
-        ttl = self.cache.ttl(key)
-
-        if ttl == -2:  # Key doesn't exist
-            return None
-        elif ttl == -1:  # Key exists but no expiration
-            return None
-        else:
-            return int(time.time()) + ttl
+        return self._take(scope, identifier, policy, quantity, quantity)[0]
+
+    def _take(self, scope: str, identifier: str, policy: RateLimitPolicy, quantity: int,
+              minimum: int = 1, returned: int = 0) -> Tuple[Optional[RateLimitResult], int]:
+        """
+        Consume between `minimum` and `quantity` requests in one script call,
+        first handing back `returned` unspent ones
+
+        Returns:
+            (limiter decision or None if Redis is unavailable, requests granted)
+        """
+        try:
+            allowed, remaining, retry_after_ms, reset_after_ms, granted = GCRA_SCRIPT(
+                keys=[self._get_key(scope, identifier)],
+                args=[policy.limit, policy.period * 1000, quantity, minimum, returned]
+            )
+        except Exception as e:
+            # Fail open: an unavailable limiter must not take login down
+            logger.error(f"Rate limit check failed for {scope}: {e}")
+            return None, 0
+
+        return RateLimitResult(
+            allowed=bool(allowed),
+            limit=policy.limit,
+            remaining=int(remaining),
+            retry_after=retry_after_ms / 1000,
+            reset_after=reset_after_ms / 1000
+        ), int(granted)
+
+    def acquire(self, scope: str, identifier: str, policy: RateLimitPolicy) -> Optional[RateLimitResult]:
+        """
+        Consume one request, deciding locally whenever this worker can
+
+        Returns:
+            The limiter decision, or None if Redis is unavailable
+        """
+        key = (scope, identifier)
+        now = time.time()
+
+        denied = self._denied.get(key)
+        if denied:
+            return RateLimitResult(
+                allowed=False,
+                limit=policy.limit,
+                remaining=0,
+                retry_after=max(0.0, denied.retry_after - now),
+                reset_after=max(0.0, denied.reset_after - now)
+            )
+
+        batch = self._batch_size(policy)
+        if batch <= 1:
+            return self._remember_denial(key, self.hit(scope, identifier, policy))
+
+        refill = False
+        returned = 0
+        with self._lock:
+            lease = self._leases.get(key)
+            if lease and lease.expires_at <= now:
+                # Expired: hand its leftovers back with the call below
+                returned, lease.tokens = lease.tokens, 0
+                lease = None
+            if lease and lease.tokens > 0:
+                lease.tokens -= 1
+                result = RateLimitResult(
+                    allowed=True,
+                    limit=policy.limit,
+                    remaining=lease.remaining + lease.tokens,
+                    retry_after=0.0,
+                    reset_after=max(0.0, lease.reset_at - now)
+                )
+                # Near the limit the lease just drains: what is left globally goes to whichever worker asks
+                if lease.tokens <= batch // 2 and lease.remaining >= batch and not lease.refilling:
+                    lease.refilling = refill = True
+            else:
+                lease = None
+
+        if lease:
+            if refill:
+                self._refills.submit(self._refill, key, policy, batch)
+            return result
+
+        # Local budget exhausted: one call leases up to a batch, or at least this request
+        result, granted = self._take(scope, identifier, policy, batch, returned=returned)
+        if not result or not result.allowed:
+            return self._remember_denial(key, result)
+
+        self._store_lease(key, policy, granted - 1, result)
+        return RateLimitResult(
+            allowed=True,
+            limit=policy.limit,
+            remaining=result.remaining + granted - 1,
+            retry_after=0.0,
+            reset_after=result.reset_after
+        )
+
+    def _batch_size(self, policy: RateLimitPolicy) -> int:
+        """Requests leased per Redis call for a policy (1 disables local admission)"""
+        batch = int(policy.limit * rate_limit_config.local_lease_fraction)
+        return batch if batch >= rate_limit_config.local_min_batch else 1
+
+    def _store_lease(self, key: Tuple[str, str], policy: RateLimitPolicy, tokens: int, result: RateLimitResult) -> None:
+        """
+        Add leased requests to the local budget and extend its lifetime.
+        A lease is spendable for as long as the policy takes to emit one
+        batch; it is kept for a full period after that so its leftovers can
+        be handed back.
+        """
+        now = time.time()
+        expires_at = now + policy.period * rate_limit_config.local_lease_fraction
+        with self._lock:
+            lease = self._leases.get(key)
+            if lease:
+                lease.tokens += tokens
+                lease.remaining = result.remaining
+                lease.reset_at = now + result.reset_after
+                lease.expires_at = expires_at
+                lease.refilling = False
+            else:
+                lease = _Lease(tokens, result, expires_at)
+            self._leases.set(key, lease, now + policy.period)
+
+    def _refill(self, key: Tuple[str, str], policy: RateLimitPolicy, batch: int) -> None:
+        """Top up a running-low lease in the background, with whatever the budget has left"""
+        result, granted = self._take(key[0], key[1], policy, batch)
+        if result and result.allowed:
+            self._store_lease(key, policy, granted, result)
+        # Otherwise the lease stays marked as refilling, so it drains without
+        # further calls and the request after it goes to Redis
+
+    def _remember_denial(self, key: Tuple[str, str], result: Optional[RateLimitResult]) -> Optional[RateLimitResult]:
+        """Reject the key locally until Redis would allow it again"""
+        if result and not result.allowed:
+            now = time.time()
+            self._denied.set(key, RateLimitResult(
+                allowed=False,
+                limit=result.limit,
+                remaining=0,
+                retry_after=now + result.retry_after,  # Stored as absolute times
+                reset_after=now + result.reset_after
+            ), now + result.retry_after)
+        return result
+
+    def is_rate_limited(self, scope: str, identifier: str, policy: RateLimitPolicy) -> bool:
+        """Check and consume one request; True if it must be rejected"""
+        result = self.acquire(scope, identifier, policy)
+        return result is not None and not result.allowed
 
 
 # Global rate limiter instance
@@ -82,17 +295,107 @@ def get_rate_limiter() -> RateLimiter:
     return _rate_limiter
 
 
-# Convenience functions
-def check_rate_limit(identifier: str) -> bool:
-    """Check if identifier is rate limited"""
-    return get_rate_limiter().is_rate_limited(identifier)
+# Per-route policies, keyed by client IP and by the identifier in the request body
+ROUTE_POLICIES: Dict[str, Dict[str, Optional[RateLimitPolicy]]] = {
+    "request_otp": {
+        "ip": RateLimitPolicy.parse(rate_limit_config.request_otp_ip),
+        "identifier": RateLimitPolicy.parse(rate_limit_config.request_otp_identifier),
+    },
+    "verify_otp": {
+        "ip": RateLimitPolicy.parse(rate_limit_config.verify_otp_ip),
+        "identifier": RateLimitPolicy.parse(rate_limit_config.verify_otp_identifier),
+    },
+    "refresh": {
+        # Refresh tokens are only trustworthy after verification, so key by IP alone
+        "ip": RateLimitPolicy.parse(rate_limit_config.refresh_ip),
+    },
+    "check_identifier": {
+        # Limits account enumeration through POST /auth/check
+        "ip": RateLimitPolicy.parse(rate_limit_config.check_identifier_ip),
+    },
+}
+
+
+def get_client_ip(request: Request) -> str:
+    """Client address, taken from X-Forwarded-For when running behind a trusted proxy"""
+    if rate_limit_config.trust_proxy:
+        forwarded = request.headers.get("x-forwarded-for")
+        if forwarded:
+            return forwarded.split(",")[0].strip()
+    return request.client.host if request.client else "unknown"
 
 
-def get_remaining_requests(identifier: str) -> int:
-    """Get remaining requests for identifier"""
-    return get_rate_limiter().get_remaining_requests(identifier)
+async def _get_body_identifier(request: Request) -> Optional[str]:
+    """Canonical identifier from the JSON body, if any (the body is cached for the route)"""
+    try:
+        body = await request.json()
+    except Exception:
+        return None
+    identifier = body.get("identifier") if isinstance(body, dict) else None
+    if not isinstance(identifier, str) or not identifier.strip():
+        return None
+    try:
+        return OTPHandler.canonical_identifier(identifier)
+    except ValueError:
+        # Malformed identifiers are rejected by request validation
+        return None
 
 
-def get_rate_limit_reset_time(identifier: str) -> Optional[int]:
-    """Get rate limit reset time for identifier"""
-    return get_rate_limiter().get_reset_time(identifier)
\ No newline at end of file
+def _hit_all(checks: List[Tuple[str, str, RateLimitPolicy]]) -> List[RateLimitResult]:
+    """Run every check, skipping those Redis could not answer"""
+    limiter = get_rate_limiter()
+    return [result for result in (limiter.acquire(*check) for check in checks) if result]
+
+
+def _rate_limit_headers(result: RateLimitResult) -> Dict[str, str]:
+    """Standard RateLimit-* headers (IETF draft) for the most restrictive policy"""
+    return {
+        "RateLimit-Limit": str(result.limit),
+        "RateLimit-Remaining": str(result.remaining),
+        "RateLimit-Reset": str(math.ceil(result.reset_after)),
+    }
+
+
+def rate_limit(route: str):
+    """
+    FastAPI dependency enforcing the policies of `route`
+
+    Raises:
+        HTTPException: 429 with Retry-After when any policy is exceeded
+    """
+    policies = ROUTE_POLICIES[route]
+
+    async def dependency(request: Request, response: Response) -> None:
+        if not rate_limit_config.enabled:
+            return
+
+        checks: List[Tuple[str, str, RateLimitPolicy]] = []
+        if policies.get("ip"):
+            checks.append((f"{route}:ip", get_client_ip(request), policies["ip"]))
+        if policies.get("identifier"):
+            identifier = await _get_body_identifier(request)
+            if identifier:
+                digest = hashlib.sha256(identifier.encode("utf-8")).hexdigest()[:32]
+                checks.append((f"{route}:identifier", digest, policies["identifier"]))
+
+        # Redis calls are blocking; keep them off the event loop
+        results = await run_in_threadpool(_hit_all, checks)
+        if not results:
+            return
+
+        denied = [result for result in results if not result.allowed]
+        if denied:
+            result = max(denied, key=lambda r: r.retry_after)
+            headers = _rate_limit_headers(result)
+            headers["Retry-After"] = str(max(1, math.ceil(result.retry_after)))
+            raise HTTPException(status_code=429, detail="Too many requests", headers=headers)
+
+        response.headers.update(_rate_limit_headers(min(results, key=lambda r: r.remaining)))
+
+    return dependency
+
+
+# Convenience functions
+def check_rate_limit(scope: str, identifier: str, policy: RateLimitPolicy) -> bool:
+    """Check if identifier is rate limited"""
+    return get_rate_limiter().is_rate_limited(scope, identifier, policy)
@@ -0,0 +1,289 @@
+import json
+import logging
+import time
+import uuid
+from datetime import datetime, timezone
+from types import SimpleNamespace
+from typing import List, Optional, Tuple
+from fastapi import HTTPException
+from sqlalchemy.orm import Session
+from app.core.config import jwt_config
+from app.models.refresh_token_family import RefreshTokenFamily
+from app.models.user import User
+from app.redis.cache import get_cache
+from app.redis.scripts import register_script
+from app.services.auth.blacklist import TokenBlacklist
+from app.services.auth.jwt_handler import create_access_token, create_refresh_token, get_access_token_claims
+from app.services.user_cache import load_user
+
+logger = logging.getLogger(__name__)
+
+# Validate the presented jti against the family's current one and rotate it.
+# Any other jti means an old token was replayed, so the whole family dies.
+ROTATE_SCRIPT = register_script("refresh_family_rotate", """
+-- KEYS[1]: family hash, KEYS[2]: cached access-token claims of the user,
+-- KEYS[3]: the user's session registry (sorted set of family ids by last use)
+-- ARGV[1]: presented jti, ARGV[2]: new jti, ARGV[3]: family TTL in seconds,
+-- ARGV[4]: family id, ARGV[5]: current Unix time
+local current = redis.call('HGET', KEYS[1], 'jti')
+if not current then
+    return {'missing'}
+end
+if current ~= ARGV[1] then
+    redis.call('DEL', KEYS[1])
+    redis.call('ZREM', KEYS[3], ARGV[4])
+    return {'reused'}
+end
+redis.call('HSET', KEYS[1], 'jti', ARGV[2], 'last_used_at', ARGV[5])
+redis.call('EXPIRE', KEYS[1], ARGV[3])
+redis.call('ZADD', KEYS[3], ARGV[5], ARGV[4])
+redis.call('EXPIRE', KEYS[3], ARGV[3])
+return {'rotated', redis.call('GET', KEYS[2])}
+""")
+
+
+def _family_key(family_id: str) -> str:
+    return f"refresh_family:{family_id}"
+
+
+def _claims_key(user_id: str) -> str:
+    return f"access_claims:{user_id}"
+
+
+def sessions_key(user_id: str) -> str:
+    """Sorted set of a user's live family ids, scored by last use"""
+    return f"sessions:{user_id}"
+
+
+def _family_ttl() -> int:
+    return jwt_config.refresh_token_expire_days * 24 * 3600
+
+
+class RefreshTokenFamilies:
+    """
+    Rotating refresh-token families.
+
+    Each login starts a family; Redis holds its current jti in a small hash
+    and every refresh swaps it in one atomic script call. Postgres keeps a
+    copy of the current jti, so a family Redis lost is restored only for the
+    last issued token and any older one still counts as reuse.
+    """
+
+    @staticmethod
+    def create(db: Session, user: User, user_agent: Optional[str] = None) -> Tuple[str, str]:
+        """
+        Start a new family (session) for a user
+
+        Returns:
+            (access_token, refresh_token) for the new session
+        """
+        jti = uuid.uuid4().hex
+        family = RefreshTokenFamily(user_id=user.id, current_jti=jti)
+        db.add(family)
+        db.commit()
+
+        now = int(time.time())
+        claims = get_access_token_claims(user)
+        client = get_cache().client
+        if client:
+            try:
+                pipe = client.pipeline(transaction=False)
+                pipe.hset(_family_key(family.id), mapping={
+                    "user_id": user.id,
+                    "jti": jti,
+                    "created_at": now,
+                    "last_used_at": now,
+                    "user_agent": (user_agent or "")[:200]
+                })
+                pipe.expire(_family_key(family.id), _family_ttl())
+                pipe.zadd(sessions_key(user.id), {family.id: now})
+                pipe.expire(sessions_key(user.id), _family_ttl())
+                pipe.set(_claims_key(user.id), json.dumps(claims), ex=_family_ttl())
+                pipe.execute()
+            except Exception as e:
+                # The first refresh restores the hash from Postgres
+                logger.error(f"Failed to store refresh family {family.id} in Redis: {e}")
+
+        access_token = create_access_token({**claims, "sid": family.id})
+        refresh_token = create_refresh_token({"user_id": user.id, "fid": family.id, "jti": jti})
+        return access_token, refresh_token
+
+    @staticmethod
+    def rotate(db: Session, payload: dict) -> Tuple[str, str]:
+        """
+        Exchange a verified family refresh token for a new token pair
+
+        Returns:
+            (access_token, refresh_token)
+
+        Raises:
+            HTTPException: 401 if the family is revoked or the token was reused,
+                503 if Redis is unavailable
+        """
+        family_id = payload["fid"]
+        user_id = payload["user_id"]
+        new_jti = uuid.uuid4().hex
+
+        status, claims = RefreshTokenFamilies._rotate_in_redis(family_id, user_id, payload["jti"], new_jti)
+        if status == "missing":
+            status = RefreshTokenFamilies._restore_from_db(db, family_id, user_id, payload["jti"])
+            if status == "restored":
+                status, claims = RefreshTokenFamilies._rotate_in_redis(family_id, user_id, payload["jti"], new_jti)
+
+        if status == "reused":
+            logger.warning(f"Refresh token reuse detected, revoking family {family_id}")
+            RefreshTokenFamilies.revoke(db, user_id, family_id)
+            raise HTTPException(status_code=401, detail="Refresh token reuse detected")
+        if status != "rotated":
+            raise HTTPException(status_code=401, detail="Token blacklisted")
+
+        # Durable copy for restoring the family; only the rotation that won in Redis gets here
+        db.query(RefreshTokenFamily).filter(
+            RefreshTokenFamily.id == family_id
+        ).update({"current_jti": new_jti}, synchronize_session=False)
+        db.commit()
+
+        if claims is None:
+            record = load_user(db, user_id)
+            if not record:
+                raise HTTPException(status_code=404, detail="User not found")
+            claims = RefreshTokenFamilies.cache_access_claims(SimpleNamespace(**record))
+
+        access_token = create_access_token({**claims, "sid": family_id})
+        refresh_token = create_refresh_token({"user_id": user_id, "fid": family_id, "jti": new_jti})
+        return access_token, refresh_token
+
+    @staticmethod
+    def _rotate_in_redis(family_id: str, user_id: str, jti: str, new_jti: str) -> Tuple[str, Optional[dict]]:
+        """Run the rotation script; returns (status, cached claims or None)"""
+        try:
+            result = ROTATE_SCRIPT(
+                keys=[_family_key(family_id), _claims_key(user_id), sessions_key(user_id)],
+                args=[jti, new_jti, _family_ttl(), family_id, int(time.time())]
+            )
+        except Exception as e:
+            logger.error(f"Refresh rotation failed for family {family_id}: {e}")
+            raise HTTPException(status_code=503, detail="Token service temporarily unavailable")
+
+        status = result[0]
+        claims = json.loads(result[1]) if len(result) > 1 and result[1] else None
+        return status, claims
+
+    @staticmethod
+    def _restore_from_db(db: Session, family_id: str, user_id: str, jti: str) -> str:
+        """
+        Re-seed a family Redis lost from its durable current jti
+
+        Returns:
+            "restored" if the presented jti is the current one, "reused" if the
+            family has since rotated past it, "missing" if the family is gone,
+            revoked, or predates current_jti
+
+        Raises:
+            HTTPException: 503 if Redis is unavailable
+        """
+        family = db.query(RefreshTokenFamily).filter_by(id=family_id, user_id=user_id).first()
+        if not family or family.revoked_at is not None or not family.current_jti:
+            return "missing"
+        if family.current_jti != jti:
+            return "reused"
+
+        client = get_cache().client
+        if not client:
+            raise HTTPException(status_code=503, detail="Token service temporarily unavailable")
+        try:
+            pipe = client.pipeline(transaction=False)
+            # HSETNX so a concurrent rotation of the restored family is not undone
+            pipe.hsetnx(_family_key(family_id), "jti", family.current_jti)
+            pipe.hset(_family_key(family_id), mapping={
+                "user_id": user_id,
+                "created_at": int(family.created_at.timestamp())
+            })
+            pipe.expire(_family_key(family_id), _family_ttl())
+            pipe.execute()
+        except Exception as e:
+            logger.error(f"Failed to restore refresh family {family_id}: {e}")
+            raise HTTPException(status_code=503, detail="Token service temporarily unavailable")
+        logger.info(f"Restored refresh family {family_id} from database")
+        return "restored"
+
+    @staticmethod
+    def revoke(db: Session, user_id: str, family_id: str) -> None:
+        """Revoke a family, and the access tokens minted from it, in Redis and Postgres"""
+        client = get_cache().client
+        try:
+            if client:
+                pipe = client.pipeline(transaction=False)
+                pipe.delete(_family_key(family_id))
+                pipe.zrem(sessions_key(user_id), family_id)
+                pipe.execute()
+        except Exception as e:
+            logger.error(f"Failed to delete refresh family {family_id} from Redis: {e}")
+        # Access tokens carry the family id as `sid`
+        TokenBlacklist.revoke_session(family_id)
+
+        db.query(RefreshTokenFamily).filter(
+            RefreshTokenFamily.id == family_id,
+            RefreshTokenFamily.user_id == user_id,
+            RefreshTokenFamily.revoked_at.is_(None)
+        ).update({"revoked_at": datetime.now(timezone.utc)}, synchronize_session=False)
+        db.commit()
+
+    @staticmethod
+    def revoke_all(db: Session, user_id: str) -> None:
+        """Revoke every family of a user with one Redis pipeline and one UPDATE"""
+        client = get_cache().client
+        try:
+            if client:
+                family_ids: List[str] = client.zrange(sessions_key(user_id), 0, -1)
+                pipe = client.pipeline(transaction=False)
+                for family_id in family_ids:
+                    pipe.delete(_family_key(family_id))
+                pipe.delete(sessions_key(user_id), _claims_key(user_id))
+                pipe.execute()
+        except Exception as e:
+            logger.error(f"Failed to delete refresh families of user {user_id} from Redis: {e}")
+
+        db.query(RefreshTokenFamily).filter(
+            RefreshTokenFamily.user_id == user_id,
+            RefreshTokenFamily.revoked_at.is_(None)
+        ).update({"revoked_at": datetime.now(timezone.utc)}, synchronize_session=False)
+        db.commit()
+
+    @staticmethod
+    def cache_access_claims(user: User) -> dict:
+        """Write through the access-token claims used on refresh"""
+        claims = get_access_token_claims(user)
+        client = get_cache().client
+        try:
+            if client:
+                client.set(_claims_key(user.id), json.dumps(claims), ex=_family_ttl())
+        except Exception as e:
+            logger.error(f"Failed to cache access claims for user {user.id}: {e}")
+        return claims
+
+
+# Convenience functions for direct use
+def create_refresh_family(db: Session, user: User, user_agent: Optional[str] = None) -> Tuple[str, str]:
+    """Start a refresh-token family and return its first token pair"""
+    return RefreshTokenFamilies.create(db, user, user_agent)
+
+
+def rotate_refresh_token(db: Session, payload: dict) -> Tuple[str, str]:
+    """Rotate a family refresh token into a new token pair"""
+    return RefreshTokenFamilies.rotate(db, payload)
+
+
+def revoke_refresh_family(db: Session, user_id: str, family_id: str) -> None:
+    """Revoke every token of a family"""
+    RefreshTokenFamilies.revoke(db, user_id, family_id)
+
+
+def revoke_all_refresh_families(db: Session, user_id: str) -> None:
+    """Revoke every family of a user"""
+    RefreshTokenFamilies.revoke_all(db, user_id)
+
+
+def cache_access_claims(user: User) -> dict:
+    """Refresh the cached access-token claims of a user"""
+    return RefreshTokenFamilies.cache_access_claims(user)
@@ -0,0 +1,122 @@
+import logging
+from typing import Any, Dict, List, Optional
+from fastapi import HTTPException
+from sqlalchemy.orm import Session
+from app.models.user import User
+from app.redis.cache import get_cache
+from app.services.auth.blacklist import TokenBlacklist, clear_local_revocation_cache, session_version_key
+from app.services.auth.refresh_families import RefreshTokenFamilies, sessions_key
+from app.services.user_cache import cache_user
+
+logger = logging.getLogger(__name__)
+
+
+class UserSessions:
+    """Session registry and "log out everywhere" built on refresh-token families"""
+
+    @staticmethod
+    def list(user_id: str, current_session_id: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        List a user's live sessions, most recently used first
+
+        Args:
+            user_id: Owner of the sessions
+            current_session_id: `sid` of the calling access token, flagged as current
+
+        Returns:
+            One dict per session with its id, timestamps and user agent
+        """
+        client = get_cache().client
+        if not client:
+            return []
+
+        family_ids = client.zrevrange(sessions_key(user_id), 0, -1)
+        pipe = client.pipeline(transaction=False)
+        for family_id in family_ids:
+            pipe.hgetall(f"refresh_family:{family_id}")
+        families = pipe.execute()
+
+        sessions = []
+        expired = []
+        for family_id, family in zip(family_ids, families):
+            if not family:
+                # Family hash expired on its own; drop it from the registry
+                expired.append(family_id)
+                continue
+            sessions.append({
+                "session_id": family_id,
+                "created_at": int(family.get("created_at") or 0),
+                "last_used_at": int(family.get("last_used_at") or family.get("created_at") or 0),
+                "user_agent": family.get("user_agent") or None,
+                "current": family_id == current_session_id
+            })
+
+        if expired:
+            client.zrem(sessions_key(user_id), *expired)
+        return sessions
+
+    @staticmethod
+    def revoke(db: Session, user_id: str, session_id: str) -> bool:
+        """
+        Revoke one of the user's sessions
+
+        Returns:
+            True if the session belonged to the user and was revoked
+        """
+        client = get_cache().client
+        if not client or client.zscore(sessions_key(user_id), session_id) is None:
+            return False
+
+        RefreshTokenFamilies.revoke(db, user_id, session_id)
+        return True
+
+    @staticmethod
+    def revoke_all(db: Session, user_id: str) -> int:
+        """
+        Invalidate every token the user holds: bump the session version with
+        a single INCR and drop all refresh-token families
+
+        Returns:
+            The new session version
+
+        Raises:
+            HTTPException: 503 if Redis is unavailable
+        """
+        client = get_cache().client
+        if not client:
+            raise HTTPException(status_code=503, detail="Token service temporarily unavailable")
+        if client.get(session_version_key(user_id)) is None:
+            TokenBlacklist.restore_session_version(user_id)
+        new_version = client.incr(session_version_key(user_id))
+
+        # Durable copy so the version survives a Redis restart; never move it backwards
+        db.query(User).filter(
+            User.id == user_id,
+            User.session_version < new_version
+        ).update({"session_version": new_version}, synchronize_session=False)
+        db.commit()
+
+        RefreshTokenFamilies.revoke_all(db, user_id)
+        # Write the new session version through; a reader that loaded the old row loses to it
+        user = db.query(User).filter_by(id=user_id).first()
+        if user:
+            cache_user(user)
+        clear_local_revocation_cache()
+        logger.info(f"Revoked all sessions of user {user_id} (session version {new_version})")
+        return new_version
+
+
+# Convenience functions for direct use
+def list_sessions(user_id: str, current_session_id: Optional[str] = None) -> List[Dict[str, Any]]:
+    """List a user's live sessions"""
+    return UserSessions.list(user_id, current_session_id)
+
+
+def revoke_session(db: Session, user_id: str, session_id: str) -> bool:
+    """Revoke one session of a user"""
+    return UserSessions.revoke(db, user_id, session_id)
+
+
+def revoke_all_sessions(db: Session, user_id: str) -> int:
+    """Log a user out everywhere"""
+    return UserSessions.revoke_all(db, user_id)
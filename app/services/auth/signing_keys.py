@@ -0,0 +1,116 @@
+import logging
+from typing import Any, Dict, Optional, Tuple
+from jwt.algorithms import get_default_algorithms
+from app.core.config import jwt_config
+
+logger = logging.getLogger(__name__)
+
+
+def is_asymmetric(algorithm: str) -> bool:
+    """True for public-key algorithms (RS*, PS*, ES*, EdDSA)"""
+    return not algorithm.upper().startswith("HS")
+
+
+def _parse_key_paths(value: Optional[str]) -> Dict[str, str]:
+    """Parse "kid1=/path/a.pem,kid2=/path/b.pem" into {kid: path}"""
+    paths = {}
+    for entry in (value or "").split(","):
+        if not entry.strip():
+            continue
+        kid, _, path = entry.partition("=")
+        paths[kid.strip()] = path.strip()
+    return paths
+
+
+class SigningKeyRing:
+    """
+    Access-token signing keys for asymmetric algorithms, addressed by `kid`.
+
+    Rotation: add the new key to JWT_PRIVATE_KEYS, switch JWT_ACTIVE_KID to it,
+    and keep the old key (private or public only via JWT_PUBLIC_KEYS) until
+    every token it signed has expired. All keys are published in the JWKS.
+    """
+
+    def __init__(self, algorithm: str, private_keys: Dict[str, str], public_keys: Dict[str, str], active_kid: Optional[str]):
+        self.algorithm = algorithm
+        self._algorithm_impl = get_default_algorithms()[algorithm]
+        self._private_keys: Dict[str, Any] = {}
+        self._public_keys: Dict[str, Any] = {}
+
+        for kid, path in private_keys.items():
+            with open(path, "rb") as f:
+                private_key = self._algorithm_impl.prepare_key(f.read())
+            self._private_keys[kid] = private_key
+            self._public_keys[kid] = private_key.public_key()
+
+        for kid, path in public_keys.items():
+            with open(path, "rb") as f:
+                self._public_keys[kid] = self._algorithm_impl.prepare_key(f.read())
+
+        self.active_kid = active_kid or next(iter(self._private_keys), None)
+        if self.active_kid not in self._private_keys:
+            raise ValueError(f"No private key configured for active kid '{self.active_kid}'")
+
+        self._jwks = {"keys": [self._to_jwk(kid, key) for kid, key in self._public_keys.items()]}
+        logger.info(f"Loaded {len(self._public_keys)} {algorithm} key(s), signing with kid '{self.active_kid}'")
+
+    def _to_jwk(self, kid: str, public_key: Any) -> Dict[str, Any]:
+        jwk = self._algorithm_impl.to_jwk(public_key, as_dict=True)
+        jwk.update({"kid": kid, "alg": self.algorithm, "use": "sig"})
+        return jwk
+
+    def signing_key(self) -> Tuple[str, Any]:
+        """Return (kid, private key) used to sign new tokens"""
+        return self.active_kid, self._private_keys[self.active_kid]
+
+    def verification_key(self, kid: Optional[str]) -> Optional[Any]:
+        """Return the public key for a `kid`, or None if unknown"""
+        return self._public_keys.get(kid)
+
+    def jwks(self) -> Dict[str, Any]:
+        """Public keys as a JWK Set"""
+        return self._jwks
+
+
+# Global key ring instance
+_key_ring: Optional[SigningKeyRing] = None
+
+
+def get_key_ring() -> SigningKeyRing:
+    """Get or load the signing key ring"""
+    global _key_ring
+    if _key_ring is None:
+        _key_ring = SigningKeyRing(
+            algorithm=jwt_config.algorithm,
+            private_keys=_parse_key_paths(jwt_config.private_keys),
+            public_keys=_parse_key_paths(jwt_config.public_keys),
+            active_kid=jwt_config.active_kid,
+        )
+    return _key_ring
+
+
+def init_key_ring() -> bool:
+    """
+    Load the signing keys at startup, so a bad key stops the boot instead of
+    failing the first login or JWKS request
+
+    Returns:
+        True if keys were loaded, False for HMAC algorithms (no key ring)
+
+    Raises:
+        RuntimeError: if a key file is missing or invalid, or the active kid has no private key
+    """
+    if not is_asymmetric(jwt_config.algorithm):
+        return False
+    try:
+        get_key_ring()
+    except Exception as e:
+        raise RuntimeError(f"Failed to load {jwt_config.algorithm} signing keys: {e}") from e
+    return True
+
+
+def get_jwks() -> Dict[str, Any]:
+    """JWK Set for access-token verification (empty for HMAC algorithms)"""
+    if not is_asymmetric(jwt_config.algorithm):
+        return {"keys": []}
+    return get_key_ring().jwks()
@@ -0,0 +1,202 @@
+import asyncio
+import base64
+import hashlib
+import json
+import logging
+import uuid
+from typing import Dict, List, Optional, Tuple
+from anyio import to_thread
+from app.core.config import app_config
+from app.redis.cache import get_cache
+from app.utils.single_flight import RELEASE_SCRIPT
+
+logger = logging.getLogger(__name__)
+
+# Mutating endpoints whose retries replay the first response
+IDEMPOTENT_ROUTES = {
+    ("POST", "/auth/request-otp"),
+    ("POST", "/auth/logout"),
+    ("PATCH", "/users/profile"),
+}
+
+IDEMPOTENCY_HEADER = b"idempotency-key"
+MAX_KEY_LENGTH = 255
+# Not stored, so the client can simply retry later
+_RETRYABLE_STATUSES = {409, 429}
+
+
+class IdempotencyMiddleware:
+    """
+    ASGI middleware implementing the Idempotency-Key header.
+
+    The first request with a key runs normally and its response is stored in
+    Redis together with a hash of the request; retries with the same key get
+    the stored response back without touching the route. Concurrent
+    duplicates are serialised with a short SET NX lock holding a random
+    owner token, and wait for the first one to finish; the lock is released
+    only by its owner. Reusing a key for a different request is a 422.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or (scope["method"], scope["path"]) not in IDEMPOTENT_ROUTES:
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope["headers"])
+        idempotency_key = headers.get(IDEMPOTENCY_HEADER, b"").decode("latin-1").strip()
+        client = get_cache().client
+        if not idempotency_key or not client:
+            await self.app(scope, receive, send)
+            return
+        if len(idempotency_key) > MAX_KEY_LENGTH:
+            await _send_json(send, 400, {"detail": "Idempotency-Key is too long"})
+            return
+
+        body = await _read_body(receive)
+        request_hash = hashlib.sha256(
+            scope["method"].encode() + b" " + scope["path"].encode() + b"\n" + body
+        ).hexdigest()
+        # Scope keys to the caller so one user's key can never replay another's response
+        caller = hashlib.sha256(headers.get(b"authorization", b"")).hexdigest()[:16]
+        key = f"idempotency:{scope['method']}:{scope['path']}:{caller}:{idempotency_key}"
+
+        lock_token = None
+        try:
+            stored = await to_thread.run_sync(client.get, key)
+            if stored is None:
+                stored, lock_token = await _lock_or_wait(client, key)
+                if stored is None and not lock_token:
+                    await _send_json(send, 409, {"detail": "A request with this Idempotency-Key is in progress"})
+                    return
+        except Exception as e:
+            logger.error(f"Idempotency check failed, processing request normally: {e}")
+            await self.app(scope, _replay_receive(body, receive), send)
+            return
+
+        if stored is not None:
+            await _replay(send, json.loads(stored), request_hash)
+            return
+
+        try:
+            response = await self._run(scope, _replay_receive(body, receive), send)
+            if response["status"] < 500 and response["status"] not in _RETRYABLE_STATUSES:
+                response["request_hash"] = request_hash
+                try:
+                    await to_thread.run_sync(
+                        lambda: client.set(key, json.dumps(response), ex=app_config.idempotency_ttl_seconds)
+                    )
+                except Exception as e:
+                    logger.error(f"Failed to store idempotent response: {e}")
+        finally:
+            try:
+                # A lock that expired mid-request may belong to a duplicate by now
+                await to_thread.run_sync(
+                    lambda: RELEASE_SCRIPT(keys=[f"{key}:lock"], args=[lock_token], client=client)
+                )
+            except Exception as e:
+                logger.error(f"Failed to release idempotency lock: {e}")
+
+    async def _run(self, scope, receive, send) -> Dict:
+        """Run the app, forwarding its response while capturing a copy"""
+        response = {"status": 500, "headers": [], "body": ""}
+        chunks: List[bytes] = []
+
+        async def capture(message):
+            if message["type"] == "http.response.start":
+                response["status"] = message["status"]
+                response["headers"] = [
+                    [name.decode("latin-1"), value.decode("latin-1")] for name, value in message.get("headers", [])
+                ]
+            elif message["type"] == "http.response.body":
+                chunks.append(message.get("body", b""))
+            await send(message)
+
+        await self.app(scope, receive, capture)
+        response["body"] = base64.b64encode(b"".join(chunks)).decode("ascii")
+        return response
+
+
+async def _read_body(receive) -> bytes:
+    chunks = []
+    while True:
+        message = await receive()
+        if message["type"] != "http.request":
+            break
+        chunks.append(message.get("body", b""))
+        if not message.get("more_body", False):
+            break
+    return b"".join(chunks)
+
+
+def _replay_receive(body: bytes, receive):
+    """Hand the buffered body to the app, then defer to the real channel"""
+    sent = False
+
+    async def replay():
+        nonlocal sent
+        if not sent:
+            sent = True
+            return {"type": "http.request", "body": body, "more_body": False}
+        return await receive()
+
+    return replay
+
+
+async def _lock_or_wait(client, key: str) -> Tuple[Optional[str], Optional[str]]:
+    """
+    Take the key's lock, or wait for the duplicate holding it to finish. If
+    it releases the lock without storing a response (a 5xx or retryable
+    status), take the lock and process this request instead.
+
+    Returns:
+        (stored response, owner token if this request now holds the lock)
+    """
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + app_config.idempotency_lock_seconds
+    token = uuid.uuid4().hex
+    while True:
+        locked = await to_thread.run_sync(
+            lambda: client.set(f"{key}:lock", token, nx=True, ex=app_config.idempotency_lock_seconds)
+        )
+        if locked:
+            return None, token
+        stored = await _wait_for_response(client, key, deadline)
+        if stored is not None or loop.time() >= deadline:
+            return stored, None
+
+
+async def _wait_for_response(client, key: str, deadline: float) -> Optional[str]:
+    """Poll for the response of a concurrent duplicate while it holds the lock"""
+    loop = asyncio.get_running_loop()
+    while loop.time() < deadline:
+        await asyncio.sleep(0.05)
+        stored, locked = await to_thread.run_sync(lambda: (client.get(key), client.exists(f"{key}:lock")))
+        if stored is not None or not locked:
+            return stored
+    return None
+
+
+async def _replay(send, stored: Dict, request_hash: str) -> None:
+    if stored.get("request_hash") != request_hash:
+        await _send_json(send, 422, {"detail": "Idempotency-Key was already used for a different request"})
+        return
+
+    headers: List[Tuple[bytes, bytes]] = [
+        (name.encode("latin-1"), value.encode("latin-1")) for name, value in stored["headers"]
+    ]
+    headers.append((b"idempotent-replayed", b"true"))
+    await send({"type": "http.response.start", "status": stored["status"], "headers": headers})
+    await send({"type": "http.response.body", "body": base64.b64decode(stored["body"])})
+
+
+async def _send_json(send, status: int, content: Dict) -> None:
+    body = json.dumps(content).encode("utf-8")
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())],
+    })
+    await send({"type": "http.response.body", "body": body})
@@ -0,0 +1,155 @@
+import logging
+import threading
+import time
+from typing import Optional
+from sqlalchemy import func
+from app.core.config import app_config
+from app.db.database import SessionLocal
+from app.models.user import User
+from app.redis.cache import get_cache
+from app.utils.bloom_filter import BloomFilter
+
+logger = logging.getLogger(__name__)
+
+# Identifiers added by any worker, tailed by every worker to keep its filter current
+STREAM_KEY = "identifier_filter:stream"
+STREAM_MAX_LENGTH = 100000
+
+
+class IdentifierFilter:
+    """
+    Per-worker bloom filter of canonical emails and phone numbers.
+
+    A negative answer is definitive, so most "does this identifier exist"
+    probes (new users typing their email) never reach Postgres; a possible
+    positive is confirmed with one indexed query. New identifiers are added
+    locally and appended to a Redis stream that every worker tails. If Redis
+    misses an update the filter can answer a false "not registered"; the
+    OTP flow still logs such a user into their existing account.
+    """
+
+    def __init__(self):
+        self._filter: Optional[BloomFilter] = None
+        self._last_id = "0-0"
+        self._tail_thread: Optional[threading.Thread] = None
+        self._stopping = False
+
+    @property
+    def ready(self) -> bool:
+        return self._filter is not None
+
+    def build(self) -> int:
+        """
+        Stream every identifier from the users table into a fresh filter
+
+        Returns:
+            Number of identifiers added
+        """
+        client = get_cache().client
+        # Entries appended after this point are replayed by the tail thread
+        last_id = "0-0"
+        if client:
+            try:
+                latest = client.xrevrange(STREAM_KEY, count=1)
+                last_id = latest[0][0] if latest else "0-0"
+            except Exception as e:
+                logger.error(f"Failed to read identifier stream position: {e}")
+
+        with SessionLocal() as db:
+            total = db.query(func.count(User.id)).scalar() or 0
+            bloom = BloomFilter(
+                capacity=max(app_config.identifier_filter_capacity, total * 2),
+                error_rate=app_config.identifier_filter_error_rate
+            )
+            rows = db.query(User.email, User.phone_number).yield_per(5000)
+            for email, phone_number in rows:
+                if email:
+                    bloom.add(email)
+                if phone_number:
+                    bloom.add(phone_number)
+
+        self._filter = bloom
+        self._last_id = last_id
+        logger.info(f"Built identifier filter with {bloom.count} identifiers ({bloom.size} bits)")
+        return bloom.count
+
+    def might_exist(self, identifier: str) -> bool:
+        """False only if the canonical identifier is certainly not registered"""
+        return self._filter is None or identifier in self._filter
+
+    def register(self, *identifiers: Optional[str]) -> None:
+        """Add new canonical identifiers here and announce them to other workers"""
+        identifiers = [identifier for identifier in identifiers if identifier]
+        if not identifiers:
+            return
+        if self._filter is not None:
+            for identifier in identifiers:
+                self._filter.add(identifier)
+
+        client = get_cache().client
+        if not client:
+            return
+        try:
+            pipe = client.pipeline(transaction=False)
+            for identifier in identifiers:
+                pipe.xadd(STREAM_KEY, {"identifier": identifier}, maxlen=STREAM_MAX_LENGTH, approximate=True)
+            pipe.execute()
+        except Exception as e:
+            logger.error(f"Failed to publish new identifiers: {e}")
+
+    def start_tailing(self) -> None:
+        """Follow identifiers registered by other workers (idempotent)"""
+        if self._tail_thread and self._tail_thread.is_alive():
+            return
+        self._stopping = False
+        self._tail_thread = threading.Thread(target=self._tail, name="identifier-filter-tail", daemon=True)
+        self._tail_thread.start()
+
+    def stop_tailing(self) -> None:
+        self._stopping = True
+
+    def _tail(self) -> None:
+        while not self._stopping:
+            client = get_cache().client
+            if not client or self._filter is None:
+                time.sleep(5)
+                continue
+            try:
+                # Block below the client's socket timeout
+                response = client.xread({STREAM_KEY: self._last_id}, count=1000, block=2000)
+                for _, entries in response or []:
+                    for entry_id, fields in entries:
+                        self._filter.add(fields["identifier"])
+                        self._last_id = entry_id
+            except Exception as e:
+                logger.error(f"Identifier stream read failed: {e}")
+                time.sleep(1)
+
+
+# Global identifier filter instance
+_identifier_filter: Optional[IdentifierFilter] = None
+
+
+def get_identifier_filter() -> IdentifierFilter:
+    """Get or create the identifier filter instance"""
+    global _identifier_filter
+    if _identifier_filter is None:
+        _identifier_filter = IdentifierFilter()
+    return _identifier_filter
+
+
+def init_identifier_filter() -> bool:
+    """Build the filter and start following other workers' updates"""
+    identifier_filter = get_identifier_filter()
+    try:
+        identifier_filter.build()
+    except Exception as e:
+        logger.error(f"Failed to build identifier filter: {e}")
+        return False
+    identifier_filter.start_tailing()
+    return True
+
+
+def register_identifiers(*identifiers: Optional[str]) -> None:
+    """Record identifiers of a created or updated user"""
+    get_identifier_filter().register(*identifiers)
@@ -4,7 +4,7 @@ Ultra-clean message processing with advanced design patterns
 import logging
 from abc import ABC, abstractmethod
 from dataclasses import dataclass
-from typing import Dict, Any, Optional, Callable
+from typing import Dict, Any, List, Optional, Callable, Tuple
 from functools import wraps
 
 logger = logging.getLogger(__name__)
@@ -17,15 +17,60 @@ class MessageContext:
     phone_or_email: str
     group_slug: str
     timestamp: str
+    
+    @classmethod
+    def from_message(cls, data: Dict[str, Any]) -> "MessageContext":
+        def string(key: str) -> str:
+            # Peers may send null or numbers; anything that isn't a valid identifier is "not found"
+            value = data.get(key)
+            return "" if value is None else value if isinstance(value, str) else str(value)
+        
+        return cls(**{k: string(k) for k in ["request_id", "phone_or_email", "group_slug", "timestamp"]})
+
+
+@dataclass(frozen=True)
+class BulkMessageContext:
+    """Immutable context of a bulk lookup: any mix of emails, phone numbers and user ids"""
+    request_id: str
+    identifiers: Tuple[str, ...]
+    user_ids: Tuple[str, ...]
+    group_slug: str
+    timestamp: str
+    
+    @classmethod
+    def from_message(cls, data: Dict[str, Any]) -> "BulkMessageContext":
+        def strings(key: str) -> Tuple[str, ...]:
+            values = data.get(key) or []
+            return tuple(str(value) for value in values) if isinstance(values, list) else ()
+        
+        return cls(
+            request_id=data.get("request_id", ""),
+            identifiers=strings("identifiers"),
+            user_ids=strings("user_ids"),
+            group_slug=data.get("group_slug", ""),
+            timestamp=data.get("timestamp", "")
+        )
 
 
 class MessageHandler(ABC):
     """Abstract message handler"""
     
+    # Context the handler expects, built from the decoded message
+    context_type = MessageContext
+    
     @abstractmethod
     def handle(self, context: MessageContext) -> Dict[str, Any]:
         """Handle message and return response"""
         pass
+    
+    def handle_batch(self, contexts: List[Any]) -> List[Dict[str, Any]]:
+        """Handle several messages; override to share work between them"""
+        return [self.handle(context) for context in contexts]
+    
+    @staticmethod
+    def _now() -> str:
+        from datetime import datetime
+        return datetime.utcnow().isoformat()
 
 
 class UserLookupHandler(MessageHandler):
@@ -38,7 +83,14 @@ class UserLookupHandler(MessageHandler):
     def handle(self, context: MessageContext) -> Dict[str, Any]:
         """Handle user lookup"""
         user_data = self.user_service(context.phone_or_email)
-        
+        return self._response(context, user_data)
+    
+    def handle_batch(self, contexts: List[MessageContext]) -> List[Dict[str, Any]]:
+        """Handle many lookups with a single batched query"""
+        users = self.user_service.lookup_users([context.phone_or_email for context in contexts])
+        return [self._response(context, users.get(context.phone_or_email)) for context in contexts]
+    
+    def _response(self, context: MessageContext, user_data: Optional[Dict[str, Any]]) -> Dict[str, Any]:
         return {
             "request_id": context.request_id,
             "success": bool(user_data),
@@ -46,11 +98,54 @@ class UserLookupHandler(MessageHandler):
             "error_message": None if user_data else f"User not found: {context.phone_or_email}",
             "timestamp": self._now()
         }
+
+
+class BulkUserLookupHandler(MessageHandler):
+    """Handles bulk user lookup messages: one reply with a result map per message"""
+    
+    context_type = BulkMessageContext
+    
+    def __init__(self, user_service: Callable, max_items: int):
+        self.user_service = user_service
+        self.max_items = max_items
+    
+    def handle(self, context: BulkMessageContext) -> Dict[str, Any]:
+        """Handle bulk lookup"""
+        return self.handle_batch([context])[0]
+    
+    def handle_batch(self, contexts: List[BulkMessageContext]) -> List[Dict[str, Any]]:
+        """Resolve every identifier and user id of all messages with a single query"""
+        accepted = [context for context in contexts if self._size(context) <= self.max_items]
+        users = self.user_service.lookup_users(
+            [identifier for context in accepted for identifier in context.identifiers],
+            [user_id for context in accepted for user_id in context.user_ids]
+        ) if accepted else {}
+        return [self._response(context, users) for context in contexts]
     
     @staticmethod
-    def _now() -> str:
-        from datetime import datetime
-        return datetime.utcnow().isoformat()
+    def _size(context: BulkMessageContext) -> int:
+        return len(context.identifiers) + len(context.user_ids)
+    
+    def _response(self, context: BulkMessageContext, users: Dict[str, Optional[Dict[str, Any]]]) -> Dict[str, Any]:
+        if self._size(context) > self.max_items:
+            return {
+                "request_id": context.request_id,
+                "success": False,
+                "results": {},
+                "not_found": [],
+                "error_message": f"Too many items: {self._size(context)} > {self.max_items}",
+                "timestamp": self._now()
+            }
+        
+        results = {key: users.get(key) for key in context.identifiers + context.user_ids}
+        return {
+            "request_id": context.request_id,
+            "success": True,
+            "results": results,
+            "not_found": [key for key, user_data in results.items() if user_data is None],
+            "error_message": None,
+            "timestamp": self._now()
+        }
 
 
 class HandlerRegistry:
@@ -0,0 +1,213 @@
+import enum
+import json
+import logging
+from datetime import datetime
+from typing import Any, Dict, Iterable, Optional
+from sqlalchemy.orm import Session
+from app.core.config import app_config
+from app.models.user import User
+from app.redis.cache import get_cache
+from app.redis.scripts import register_script
+from app.utils.single_flight import SingleFlight
+from app.utils.validators import parse_identifier
+
+logger = logging.getLogger(__name__)
+
+# Store a user snapshot unless a newer profile or session version is already
+# cached, so a slow reader can't overwrite the write-through of a concurrent
+# update or "log out everywhere" (both versions only ever grow)
+STORE_SCRIPT = register_script("user_cache_store", """
+-- KEYS[1]: user hash, KEYS[2..n]: identifier keys of the user
+-- ARGV[1]: record JSON, ARGV[2]: profile version, ARGV[3]: TTL in seconds, ARGV[4]: user id,
+-- ARGV[5]: session version
+local cached = redis.call('HMGET', KEYS[1], 'v', 's')
+local cached_profile, cached_session = tonumber(cached[1]), tonumber(cached[2])
+if (cached_profile and cached_profile > tonumber(ARGV[2])) or (cached_session and cached_session > tonumber(ARGV[5])) then
+    return 0
+end
+redis.call('HSET', KEYS[1], 'data', ARGV[1], 'v', ARGV[2], 's', ARGV[5])
+redis.call('EXPIRE', KEYS[1], ARGV[3])
+for i = 2, #KEYS do
+    redis.call('SET', KEYS[i], ARGV[4], 'EX', ARGV[3])
+end
+return 1
+""")
+
+
+# One database fetch per missing user, shared by concurrent requests
+_user_flight = SingleFlight(
+    "user",
+    redis_lock_ms=app_config.single_flight_lock_ms if app_config.single_flight_redis_lock else 0
+)
+
+
+def _user_key(user_id: str) -> str:
+    return f"user:{user_id}"
+
+
+def _identifier_key(identifier: str) -> str:
+    """Canonical email or phone number to user id"""
+    return f"user_id:{identifier}"
+
+
+def user_record(user: User) -> Dict[str, Any]:
+    """JSON-safe snapshot of every column of a user"""
+    record = {}
+    for column in User.__table__.columns:
+        value = getattr(user, column.key)
+        if isinstance(value, enum.Enum):
+            value = value.value
+        elif isinstance(value, datetime):
+            value = value.isoformat()
+        record[column.key] = value
+    return record
+
+
+def _owns(record: Dict[str, Any], identifier: str) -> bool:
+    # An identifier key can outlive a change of email or phone number
+    return identifier in (record.get("email"), record.get("phone_number"))
+
+
+class UserCache:
+    """
+    Read-through cache of user rows.
+
+    Redis holds a JSON snapshot per user id, stamped with its profile and
+    session versions, plus a key per canonical email and phone number
+    pointing at the id. Updates write the new snapshot through after commit;
+    stores carrying an older version of either are ignored.
+    """
+
+    @staticmethod
+    def get(user_id: str) -> Optional[Dict[str, Any]]:
+        client = get_cache().client
+        if not client:
+            return None
+        try:
+            data = client.hget(_user_key(user_id), "data")
+            return json.loads(data) if data else None
+        except Exception as e:
+            logger.error(f"Failed to read cached user {user_id}: {e}")
+            return None
+
+    @staticmethod
+    def get_many(user_ids: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+        """Cached records of user ids, in one pipelined round trip"""
+        user_ids = list(user_ids)
+        client = get_cache().client
+        if not client or not user_ids:
+            return {}
+        try:
+            pipe = client.pipeline(transaction=False)
+            for user_id in user_ids:
+                pipe.hget(_user_key(user_id), "data")
+            return {user_id: json.loads(data) for user_id, data in zip(user_ids, pipe.execute()) if data}
+        except Exception as e:
+            logger.error(f"Failed to read cached users: {e}")
+            return {}
+
+    @staticmethod
+    def get_many_by_identifier(identifiers: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+        """Cached records of canonical identifiers, in two pipelined round trips"""
+        identifiers = list(identifiers)
+        client = get_cache().client
+        if not client or not identifiers:
+            return {}
+        try:
+            pipe = client.pipeline(transaction=False)
+            for identifier in identifiers:
+                pipe.get(_identifier_key(identifier))
+            user_ids = {identifier: user_id for identifier, user_id in zip(identifiers, pipe.execute()) if user_id}
+        except Exception as e:
+            logger.error(f"Failed to read cached users: {e}")
+            return {}
+
+        records = UserCache.get_many(set(user_ids.values()))
+        return {
+            identifier: records[user_id] for identifier, user_id in user_ids.items()
+            if user_id in records and _owns(records[user_id], identifier)
+        }
+
+    @staticmethod
+    def store(user: User) -> Dict[str, Any]:
+        """Write a committed user through to the cache"""
+        record = user_record(user)
+        client = get_cache().client
+        if client:
+            identifiers = [identifier for identifier in (user.email, user.phone_number) if identifier]
+            try:
+                STORE_SCRIPT(
+                    keys=[_user_key(user.id)] + [_identifier_key(identifier) for identifier in identifiers],
+                    args=[
+                        json.dumps(record), user.profile_version or 1, app_config.user_cache_ttl_seconds, user.id,
+                        user.session_version or 0
+                    ]
+                )
+            except Exception as e:
+                logger.error(f"Failed to cache user {user.id}: {e}")
+        return record
+
+    @staticmethod
+    def invalidate(user_id: str, *identifiers: Optional[str]) -> None:
+        """Drop a user and any of its (old) identifier keys"""
+        client = get_cache().client
+        if not client:
+            return
+        try:
+            client.delete(_user_key(user_id), *[_identifier_key(identifier) for identifier in identifiers if identifier])
+        except Exception as e:
+            logger.error(f"Failed to invalidate cached user {user_id}: {e}")
+
+    @staticmethod
+    def load(db: Session, user_id: str) -> Optional[Dict[str, Any]]:
+        """User record by id, from the cache or else Postgres"""
+        record = UserCache.get(user_id)
+        if record is not None:
+            return record
+
+        def fetch() -> Optional[Dict[str, Any]]:
+            user = db.query(User).filter_by(id=user_id).first()
+            return UserCache.store(user) if user else None
+
+        return _user_flight.do(user_id, fetch, recheck=lambda: UserCache.get(user_id))
+
+    @staticmethod
+    def load_by_identifier(db: Session, identifier: str) -> Optional[Dict[str, Any]]:
+        """User record by email or phone number, from the cache or else Postgres"""
+        try:
+            identifier_type, value = parse_identifier(identifier)
+        except ValueError:
+            return None
+        record = UserCache.get_many_by_identifier([value]).get(value)
+        if record is not None:
+            return record
+
+        def fetch() -> Optional[Dict[str, Any]]:
+            column = User.email if identifier_type == "email" else User.phone_number
+            user = db.query(User).filter(column == value).first()
+            return UserCache.store(user) if user else None
+
+        return _user_flight.do(
+            value, fetch, recheck=lambda: UserCache.get_many_by_identifier([value]).get(value)
+        )
+
+
+# Convenience functions for direct use
+def load_user(db: Session, user_id: str) -> Optional[Dict[str, Any]]:
+    """Read-through user record by id"""
+    return UserCache.load(db, user_id)
+
+
+def load_user_by_identifier(db: Session, identifier: str) -> Optional[Dict[str, Any]]:
+    """Read-through user record by email or phone number"""
+    return UserCache.load_by_identifier(db, identifier)
+
+
+def cache_user(user: User) -> Dict[str, Any]:
+    """Write a committed user through to the cache"""
+    return UserCache.store(user)
+
+
+def invalidate_user(user_id: str, *identifiers: Optional[str]) -> None:
+    """Drop a cached user"""
+    UserCache.invalidate(user_id, *identifiers)
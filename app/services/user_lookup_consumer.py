@@ -1,29 +1,82 @@
 """
 Ultra-clean consumer manager
 """
+import asyncio
 import logging
 import threading
-from typing import Optional
-from app.rabbitmq.consumer import get_rabbitmq_consumer, create_user_lookup_callback
+from concurrent.futures import ThreadPoolExecutor
+from collections import defaultdict
+from typing import List, Optional, Set, Tuple
+from aio_pika.abc import AbstractIncomingMessage
+from app.rabbitmq.async_transport import AsyncRabbitMQTransport, get_async_transport, close_async_transport
+from app.rabbitmq.batcher import MessageBatcher
+from app.rabbitmq.codecs import get_codec
+from app.rabbitmq.consumer import Delivery, get_rabbitmq_consumer, create_user_lookup_callback
 from app.rabbitmq.config import rabbitmq_config
+from app.rabbitmq.producer import get_rabbitmq_producer
 from app.services.user_lookup_service import get_service
-from app.services.message_processors import MessageContext, UserLookupHandler, HandlerRegistry
+from app.services.message_processors import UserLookupHandler, BulkUserLookupHandler, HandlerRegistry
 
 logger = logging.getLogger(__name__)
 
 
-class ConsumerManager:
-    """Ultra-clean consumer manager"""
+class LookupDispatcher:
+    """Handler registry and batch resolution shared by the blocking and async consumers"""
     
     def __init__(self):
-        self.consumer = get_rabbitmq_consumer()
         self.service = get_service()
         self.registry = HandlerRegistry()
-        self.thread: Optional[threading.Thread] = None
-        self.running = False
         
         # Register handlers
         self.registry.register("user_lookup", UserLookupHandler(self.service, self.service))
+        self.registry.register(
+            "user_lookup_bulk", BulkUserLookupHandler(self.service, rabbitmq_config.user_lookup_bulk_max_items)
+        )
+    
+    def respond(self, messages: List[dict]) -> List[dict]:
+        """One response per message, resolved with one query per message type"""
+        by_type = defaultdict(list)
+        for index, data in enumerate(messages):
+            # Messages without a type predate bulk lookups
+            message_type = data.get("type") or "user_lookup"
+            by_type[message_type if isinstance(message_type, str) else str(message_type)].append(index)
+        
+        responses = [None] * len(messages)
+        for message_type, indexes in by_type.items():
+            handler = self.registry.get_handler(message_type)
+            if handler is None:
+                logger.error(f"❌ Unknown message type: {message_type}")
+                handled = [self._unsupported(messages[index], message_type) for index in indexes]
+            else:
+                contexts = [handler.context_type.from_message(messages[index]) for index in indexes]
+                handled = handler.handle_batch(contexts)
+            for index, response in zip(indexes, handled):
+                responses[index] = response
+        return responses
+    
+    @staticmethod
+    def _unsupported(data: dict, message_type: str) -> dict:
+        # Reply instead of nacking so the message isn't redelivered forever
+        return {
+            "request_id": data.get("request_id", ""),
+            "success": False,
+            "error_message": f"Unsupported message type: {message_type}",
+            "timestamp": UserLookupHandler._now()
+        }
+
+
+class ConsumerManager(LookupDispatcher):
+    """Ultra-clean consumer manager"""
+    
+    def __init__(self):
+        super().__init__()
+        self.consumer = get_rabbitmq_consumer()
+        # Replies go through the blocking producer; connecting now reports a broker outage at startup
+        get_rabbitmq_producer()
+        self.thread: Optional[threading.Thread] = None
+        self.executor: Optional[ThreadPoolExecutor] = None
+        self.batcher: Optional[MessageBatcher] = None
+        self.running = False
     
     def start(self):
         """Start consumer"""
@@ -31,6 +84,18 @@ class ConsumerManager:
             return
         
         self.running = True
+        # Lookups run in parallel; the consumer thread only receives and acks
+        self.executor = ThreadPoolExecutor(
+            max_workers=rabbitmq_config.consumer_workers, thread_name_prefix="LookupWorker"
+        )
+        # Lookups arriving together are resolved with one query
+        self.batcher = MessageBatcher(
+            self._handle_batch,
+            self.executor,
+            max_size=rabbitmq_config.consumer_batch_size,
+            max_wait_ms=rabbitmq_config.consumer_batch_linger_ms
+        )
+        self.batcher.start()
         self.thread = threading.Thread(target=self._run, daemon=True, name="Consumer")
         self.thread.start()
         logger.info("🚀 Consumer started")
@@ -41,7 +106,10 @@ class ConsumerManager:
             return
         
         self.running = False
-        self.consumer.stop_consuming()
+        # Finish in-flight lookups while the connection thread can still ack them
+        self.batcher.close()
+        self.executor.shutdown(wait=True)
+        self.consumer.stop_consuming_threadsafe()
         
         if self.thread and self.thread.is_alive():
             self.thread.join(timeout=5)
@@ -52,7 +120,7 @@ class ConsumerManager:
     def _run(self):
         """Run consumer loop"""
         try:
-            callback = create_user_lookup_callback(self._handle)
+            callback = create_user_lookup_callback(batcher=self.batcher)
             self.consumer.setup_consumer(rabbitmq_config.user_lookup_request_queue, callback)
             
             while self.running:
@@ -68,16 +136,122 @@ class ConsumerManager:
         finally:
             self.running = False
     
-    def _handle(self, data: dict) -> bool:
-        """Handle message"""
+    def _handle_batch(self, deliveries: List[Delivery]) -> List[bool]:
+        """Resolve a batch with one query per message type and reply to each message"""
+        responses = self.respond([delivery.data for delivery in deliveries])
+        # Peers get replies in the encoding they used
+        return [
+            self.service.publish(response, delivery.content_type)
+            for delivery, response in zip(deliveries, responses)
+        ]
+
+
+class AsyncConsumerManager(LookupDispatcher):
+    """
+    Lookup consumer on the application's event loop.
+    
+    Deliveries are batched with a loop timer, each batch is resolved with
+    one thread hop (the database session is synchronous), and the replies
+    are published and confirmed concurrently before their requests are acked.
+    """
+    
+    def __init__(self):
+        super().__init__()
+        self.transport: Optional[AsyncRabbitMQTransport] = None
+        self.running = False
+        self._pending: List[Tuple[Delivery, AbstractIncomingMessage]] = []
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+        self._tasks: Set[asyncio.Task] = set()
+    
+    async def start(self):
+        """Start consumer"""
+        if self.running:
+            return
+        
+        self.transport = await get_async_transport()
+        await self.transport.consume(rabbitmq_config.user_lookup_request_queue, self._on_message)
+        self.running = True
+        logger.info("🚀 Async consumer started")
+    
+    async def stop(self):
+        """Stop consumer, finishing in-flight batches first"""
+        if not self.running:
+            return
+        
+        self.running = False
+        await self.transport.stop_consuming()
+        self._flush()
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+        await close_async_transport()
+        logger.info("🛑 Async consumer stopped")
+    
+    async def _on_message(self, message: AbstractIncomingMessage):
+        try:
+            codec = get_codec(message.content_type)
+            data = codec.decode(message.body)
+            if not isinstance(data, dict):
+                raise ValueError(f"Expected an object, got {type(data).__name__}")
+        except Exception as e:
+            logger.error(f"❌ Decode: {e}")
+            await message.reject(requeue=False)
+            return
+        
+        logger.info(f"📨 {data.get('request_id', 'UNKNOWN')}")
+        self._pending.append((Delivery(data, codec.content_type), message))
+        if len(self._pending) >= rabbitmq_config.consumer_batch_size:
+            self._flush()
+        elif self._flush_handle is None:
+            self._flush_handle = asyncio.get_running_loop().call_later(
+                rabbitmq_config.consumer_batch_linger_ms / 1000, self._flush
+            )
+    
+    def _flush(self):
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        if not self._pending:
+            return
+        
+        batch, self._pending = self._pending, []
+        task = asyncio.get_running_loop().create_task(self._process(batch))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+    
+    async def _process(self, batch: List[Tuple[Delivery, AbstractIncomingMessage]]):
         try:
-            context = MessageContext(**{k: data.get(k, "") for k in ["request_id", "phone_or_email", "group_slug", "timestamp"]})
-            handler = self.registry.get_handler("user_lookup")
-            response = handler.handle(context)
-            return self.service.publish(response)
+            responses = await asyncio.to_thread(self.respond, [delivery.data for delivery, _ in batch])
         except Exception as e:
-            logger.error(f"Handle error: {e}")
-            return False
+            logger.error(f"💥 Batch of {len(batch)} failed: {e}")
+            responses = None
+        
+        if responses is None:
+            published = [False] * len(batch)
+        else:
+            # Peers get replies in the encoding they used
+            published = await asyncio.gather(*(
+                self.transport.publish_message(
+                    exchange=rabbitmq_config.user_lookup_exchange,
+                    routing_key=rabbitmq_config.user_lookup_response_key,
+                    message=response,
+                    correlation_id=response.get("request_id"),
+                    content_type=delivery.content_type
+                )
+                for (delivery, _), response in zip(batch, responses)
+            ))
+        
+        for (delivery, message), success in zip(batch, published):
+            request_id = delivery.data.get('request_id', 'UNKNOWN')
+            try:
+                if success:
+                    await message.ack()
+                    logger.info(f"✅ {request_id}")
+                else:
+                    await message.nack(requeue=True)
+                    logger.warning(f"⚠️ {request_id}")
+            except Exception as e:
+                # Channel was lost; the broker redelivers unacked messages
+                logger.error(f"💥 Ack failed: {e}")
 
 
 # Singleton
@@ -94,4 +268,20 @@ def start_consumer():
 
 def stop_consumer():
     """Stop consumer"""
-    get_manager().stop()
\ No newline at end of file
+    get_manager().stop()
+
+
+_async_manager = None
+
+def get_async_manager() -> AsyncConsumerManager:
+    """Get singleton async manager"""
+    global _async_manager
+    return _async_manager or (_async_manager := AsyncConsumerManager())
+
+async def start_async_consumer():
+    """Start consumer on the running event loop"""
+    await get_async_manager().start()
+
+async def stop_async_consumer():
+    """Stop the event-loop consumer"""
+    await get_async_manager().stop()
\ No newline at end of file
@@ -2,15 +2,14 @@
 Ultra-clean user lookup service
 """
 import logging
-import re
-from typing import Dict, Any, Optional
-from sqlalchemy.orm import Session
+from typing import Dict, Any, Iterable, List, Optional, Tuple
 from sqlalchemy import or_
 from app.db.database import SessionLocal
 from app.models.user import User
 from app.rabbitmq.producer import get_rabbitmq_producer
 from app.rabbitmq.config import rabbitmq_config
-from app.utils.validators import normalize_phone_number
+from app.services.user_cache import UserCache, cache_user, load_user_by_identifier
+from app.utils.validators import parse_identifier
 
 logger = logging.getLogger(__name__)
 
@@ -18,8 +17,10 @@ logger = logging.getLogger(__name__)
 class UserLookupService:
     """Ultra-clean user lookup service"""
     
-    def __init__(self):
-        self.producer = get_rabbitmq_producer()
+    @property
+    def producer(self):
+        # Connected on first publish; the async transport never needs it
+        return get_rabbitmq_producer()
     
     def __call__(self, phone_or_email: str) -> Optional[Dict[str, Any]]:
         """Make service callable for cleaner usage"""
@@ -29,54 +30,91 @@ class UserLookupService:
         """Look up user by phone or email"""
         try:
             with SessionLocal() as db:
-                user = self._find_user(db, phone_or_email)
-                return self._to_dict(user) if user else None
+                record = load_user_by_identifier(db, phone_or_email)
+                return self._to_dict(record) if record else None
         except Exception as e:
             logger.error(f"Lookup failed for {phone_or_email}: {e}")
             return None
     
-    def _find_user(self, db: Session, phone_or_email: str) -> Optional[User]:
-        """Find user in database"""
-        # Check if it's an email or phone
-        email_pattern = r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$'
-        is_email = re.match(email_pattern, phone_or_email) is not None
+    def lookup_users(self, identifiers: List[str], user_ids: Iterable[str] = ()) -> Dict[str, Optional[Dict[str, Any]]]:
+        """
+        Look up many users by email, phone number or id from the cache,
+        then one query for the misses
         
-        if is_email:
-            return db.query(User).filter(User.email == phone_or_email).first()
-        else:
-            # Normalize phone number before querying
-            # Check both normalized and original to handle existing data with '+'
-            normalized_phone = normalize_phone_number(phone_or_email)
-            return db.query(User).filter(
-                or_(
-                    User.phone_number == normalized_phone,
-                    User.phone_number == phone_or_email
-                )
-            ).first()
+        Returns:
+            Mapping of each identifier (as given) and user id to its user or None
+        
+        Raises:
+            Exception: if the query fails, so the whole batch can be retried
+        """
+        canonical: Dict[str, Optional[Tuple[str, str]]] = {}
+        for identifier in identifiers:
+            if not isinstance(identifier, str) or not identifier.strip():
+                canonical[identifier] = None
+                continue
+            try:
+                canonical[identifier] = parse_identifier(identifier)
+            except ValueError:
+                canonical[identifier] = None
+        
+        parsed = {key for key in canonical.values() if key}
+        user_ids = set(user_ids)
+        found = UserCache.get_many_by_identifier(value for _, value in parsed)
+        found.update(UserCache.get_many(user_ids))
+        missing = [key for key in parsed if key[1] not in found]
+        emails = {value for identifier_type, value in missing if identifier_type == "email"}
+        phones = {value for identifier_type, value in missing if identifier_type == "phone_number"}
+        missing_ids = user_ids - found.keys()
+        if emails or phones or missing_ids:
+            conditions = []
+            if emails:
+                conditions.append(User.email.in_(emails))
+            if phones:
+                conditions.append(User.phone_number.in_(phones))
+            if missing_ids:
+                conditions.append(User.id.in_(missing_ids))
+            try:
+                with SessionLocal() as db:
+                    for user in db.query(User).filter(or_(*conditions)):
+                        record = cache_user(user)
+                        for value in (user.id, user.email, user.phone_number):
+                            if value:
+                                found[value] = record
+            except Exception as e:
+                logger.error(f"Batch lookup of {len(identifiers)} identifiers failed: {e}")
+                raise
+        
+        results = {
+            identifier: self._to_dict(found[key[1]]) if key and key[1] in found else None
+            for identifier, key in canonical.items()
+        }
+        results.update({user_id: self._to_dict(found[user_id]) if user_id in found else None for user_id in user_ids})
+        return results
     
-    def _to_dict(self, user: User) -> Dict[str, Any]:
-        """Convert user to dictionary"""
+    def _to_dict(self, record: Dict[str, Any]) -> Dict[str, Any]:
+        """Convert a cached user record to the lookup response shape"""
         return {
-            "user_id": user.id,
-            "name": user.name,
-            "phone_number": user.phone_number,
-            "email": user.email,
-            "role": user.role.value,
-            "avatar_url": user.avatar_url,
-            "card_number": user.card_number,
-            "card_holder_name": user.card_holder_name,
-            "created_at": user.created_at.isoformat() if user.created_at else None,
-            "updated_at": user.updated_at.isoformat() if user.updated_at else None
+            "user_id": record["id"],
+            "name": record["name"],
+            "phone_number": record["phone_number"],
+            "email": record["email"],
+            "role": record["role"],
+            "avatar_url": record["avatar_url"],
+            "card_number": record["card_number"],
+            "card_holder_name": record["card_holder_name"],
+            "created_at": record["created_at"],
+            "updated_at": record["updated_at"]
         }
     
-    def publish(self, data: Dict[str, Any]) -> bool:
-        """Publish response"""
+    def publish(self, data: Dict[str, Any], content_type: Optional[str] = None) -> bool:
+        """Publish response, encoded like the request it answers when given"""
         try:
             return self.producer.publish_message(
                 exchange=rabbitmq_config.user_lookup_exchange,
                 routing_key=rabbitmq_config.user_lookup_response_key,
                 message=data,
-                correlation_id=data.get("request_id")
+                correlation_id=data.get("request_id"),
+                content_type=content_type
             )
         except Exception as e:
             logger.error(f"Publish failed: {e}")
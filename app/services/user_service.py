@@ -1,39 +1,86 @@
 import re
+import uuid
+from typing import Tuple
 from fastapi import HTTPException
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
-from sqlalchemy import or_
-from app.models.user import User
+from app.models.user import User, UserRole
 from app.schemas.user_schema import UserUpdate
-from app.utils.validators import FIELD_VALIDATORS, normalize_phone_number
+from app.services.identifier_filter import register_identifiers
+from app.services.user_cache import cache_user
+from app.utils.validators import FIELD_VALIDATORS, MissingCountryCodeError, normalize_email, normalize_phone_number, parse_identifier
 
 def validate_and_update_user(user: User, update: UserUpdate, db: Session):
     updates = update.model_dump(exclude_unset=True)
+    changed = False
     for field, value in updates.items():
-        if value is None or value == "" or getattr(user, field) == value:
+        if value is None or value == "":
             continue
         # Validate using strategy pattern
         validator = FIELD_VALIDATORS.get(field)
         if validator:
             validator(value)
+        # Identifiers are stored in canonical form so lookups are single equality probes
+        if field == "phone_number":
+            try:
+                value = normalize_phone_number(value)
+            except MissingCountryCodeError as e:
+                raise HTTPException(status_code=400, detail=str(e))
+            except ValueError:
+                raise HTTPException(status_code=400, detail="Invalid phone number format")
+        elif field == "email":
+            value = normalize_email(value)
+        if getattr(user, field) == value:
+            continue
         # Uniqueness checks
         if field == "phone_number":
-            # Normalize phone number before checking uniqueness and storing
-            normalized_phone = normalize_phone_number(value)
-            # Check both normalized and original for uniqueness (handle existing data with '+')
-            existing_user = db.query(User).filter(
-                or_(
-                    User.phone_number == normalized_phone,
-                    User.phone_number == value
-                ),
-                User.id != user.id
-            ).first()
-            if existing_user:
+            if db.query(User.id).filter(User.phone_number == value, User.id != user.id).first():
                 raise HTTPException(status_code=400, detail="Phone number already registered")
-            setattr(user, field, normalized_phone)
         elif field == "email":
-            if db.query(User).filter(User.email == value, User.id != user.id).first():
+            if db.query(User.id).filter(User.email == value, User.id != user.id).first():
                 raise HTTPException(status_code=400, detail="Email already registered")
-            setattr(user, field, value)
+        setattr(user, field, value)
+        changed = True
+    if changed:
+        # Invalidates profile claims embedded in previously issued access tokens
+        user.profile_version = (user.profile_version or 1) + 1
+    # Callers refresh the cache after commit, so no reader can re-cache the old row
+    return user
+
+
+def get_or_create_user_by_identifier(db: Session, identifier: str) -> Tuple[User, bool]:
+    """
+    Create the user for a verified email or phone number unless it already exists,
+    using INSERT ... ON CONFLICT DO NOTHING so concurrent first logins can't race.
+
+    Returns:
+        (user, created)
+    """
+    identifier_type, value = parse_identifier(identifier)
+    column = User.email if identifier_type == "email" else User.phone_number
+    # Empty name marks a user who hasn't completed their profile yet
+    values = {"id": str(uuid.uuid4()), column.key: value, "name": "", "role": UserRole.user}
+
+    dialect = db.get_bind().dialect.name
+    if dialect in ("postgresql", "sqlite"):
+        if dialect == "postgresql":
+            from sqlalchemy.dialects.postgresql import insert
         else:
-            setattr(user, field, value)
-    return user 
\ No newline at end of file
+            from sqlalchemy.dialects.sqlite import insert
+        result = db.execute(insert(User).values(**values).on_conflict_do_nothing(index_elements=[column.key]))
+        db.commit()
+        created = result.rowcount == 1
+    else:
+        try:
+            db.add(User(**values))
+            db.commit()
+            created = True
+        except IntegrityError:
+            db.rollback()
+            created = False
+
+    user = db.query(User).filter(column == value).one()
+    if created:
+        register_identifiers(value)
+        cache_user(user)
+    return user, created
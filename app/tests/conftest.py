@@ -0,0 +1,62 @@
+import os
+import tempfile
+
+# Settings are read from the environment when app modules are imported
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{tempfile.mkdtemp()}/user_service_test.db")
+os.environ.setdefault("POSTGRES_DB", "user_service")
+os.environ.setdefault("POSTGRES_USER", "user_service")
+os.environ.setdefault("POSTGRES_PASSWORD", "user_service")
+os.environ.setdefault("REDIS_PASSWORD", "")
+os.environ.setdefault("SECRET_KEY", "test-secret-key")
+os.environ.setdefault("REFRESH_SECRET_KEY", "test-refresh-secret-key")
+os.environ.setdefault("RABBITMQ_HOST", "localhost")
+os.environ.setdefault("RABBITMQ_PORT", "5672")
+os.environ.setdefault("RABBITMQ_USERNAME", "guest")
+os.environ.setdefault("RABBITMQ_PASSWORD", "guest")
+os.environ.setdefault("RABBITMQ_VHOST", "/")
+os.environ.setdefault("PHONE_DEFAULT_COUNTRY_CODE", "98")
+
+import fakeredis
+import pytest
+from app.db.database import Base, SessionLocal, engine
+from app.models import user, otp_code, blacklisted_token, refresh_token_family  # noqa: F401
+from app.redis import cache as redis_cache
+
+
+@pytest.fixture
+def redis_client(monkeypatch):
+    """In-memory Redis (with Lua scripting) behind get_cache()"""
+    client = fakeredis.FakeRedis(decode_responses=True)
+    cache = redis_cache.RedisCache.__new__(redis_cache.RedisCache)
+    cache.client = client
+    monkeypatch.setattr(redis_cache, "_cache_instance", cache)
+    yield client
+    client.flushall()
+
+
+@pytest.fixture
+def redis_down(monkeypatch):
+    """get_cache() with no Redis connection"""
+    cache = redis_cache.RedisCache.__new__(redis_cache.RedisCache)
+    cache.client = None
+    monkeypatch.setattr(redis_cache, "_cache_instance", cache)
+
+
+@pytest.fixture
+def db():
+    """Fresh SQLite schema per test"""
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    session = SessionLocal()
+    yield session
+    session.close()
+
+
+@pytest.fixture(autouse=True)
+def _clear_process_caches():
+    """Process-local caches must not leak decisions between tests"""
+    from app.services.auth.blacklist import clear_local_revocation_cache
+
+    clear_local_revocation_cache()
+    yield
+    clear_local_revocation_cache()
@@ -1 +1,149 @@
- 
\ No newline at end of file
+import time
+import jwt
+import pytest
+from app.core.config import jwt_config
+from app.services.auth import jwt_handler
+from app.utils import expiring_cache
+from app.utils.expiring_cache import ExpiringLRUCache
+
+
+class _Clock:
+    def __init__(self):
+        self.now = time.time()
+
+    def time(self):
+        return self.now
+
+
+@pytest.fixture
+def decode_cache(monkeypatch):
+    """Enabled verified-token cache with a controllable clock, counting real verifications"""
+    clock = _Clock()
+    monkeypatch.setattr(expiring_cache, "time", clock)
+    monkeypatch.setattr(jwt_handler, "_decode_cache", ExpiringLRUCache(maxsize=100))
+
+    verified = []
+    decode = jwt_handler._decode
+
+    def counting_decode(token, key, algorithm):
+        verified.append(token)
+        return decode(token, key, algorithm)
+
+    monkeypatch.setattr(jwt_handler, "_decode", counting_decode)
+    return clock, verified
+
+
+def _token(expires_in: int) -> str:
+    return jwt.encode(
+        {"user_id": "u1", "jti": "j1", "exp": int(time.time()) + expires_in},
+        jwt_config.secret_key,
+        algorithm=jwt_config.algorithm
+    )
+
+
+def test_identical_token_is_verified_once(decode_cache):
+    _, verified = decode_cache
+    token = _token(60)
+
+    first = jwt_handler.decode_access_token(token)
+    second = jwt_handler.decode_access_token(token)
+    assert first == second and first["user_id"] == "u1"
+    assert len(verified) == 1
+
+
+def test_cached_payload_is_evicted_at_exp(decode_cache):
+    clock, verified = decode_cache
+    token = _token(60)
+    jwt_handler.decode_access_token(token)
+
+    clock.now += 59
+    jwt_handler.decode_access_token(token)
+    assert len(verified) == 1
+
+    clock.now += 2
+    jwt_handler.decode_access_token(token)
+    assert len(verified) == 2
+
+
+def test_expired_token_is_never_cached(decode_cache):
+    _, verified = decode_cache
+    token = _token(-1)
+
+    assert jwt_handler.decode_access_token(token) is None
+    assert jwt_handler.decode_access_token(token) is None
+    assert len(verified) == 2
+
+
+def test_callers_cannot_mutate_the_cached_payload(decode_cache):
+    token = _token(60)
+    jwt_handler.decode_access_token(token)["user_id"] = "someone-else"
+    assert jwt_handler.decode_access_token(token)["user_id"] == "u1"
+
+
+def test_access_payload_is_not_served_as_refresh(decode_cache):
+    token = _token(60)
+    assert jwt_handler.decode_access_token(token) is not None
+    # Signed with the access secret, so refresh verification must fail despite the cache
+    assert jwt_handler.decode_refresh_token(token) is None
+
+
+def test_cache_is_bounded_lru():
+    cache = ExpiringLRUCache(maxsize=2)
+    expires_at = time.time() + 60
+    cache.set("a", 1, expires_at)
+    cache.set("b", 2, expires_at)
+    cache.get("a")
+    cache.set("c", 3, expires_at)
+    assert cache.get("a") == 1
+    assert cache.get("b") is None
+    assert cache.get("c") == 3
+
+
+@pytest.fixture
+def eddsa_config(monkeypatch, tmp_path):
+    """ALGORITHM=EdDSA with a fresh key on disk and no loaded key ring"""
+    from cryptography.hazmat.primitives import serialization
+    from cryptography.hazmat.primitives.asymmetric.ed25519 import Ed25519PrivateKey
+    from app.services.auth import signing_keys
+
+    key_path = tmp_path / "k1.pem"
+    key_path.write_bytes(Ed25519PrivateKey.generate().private_bytes(
+        serialization.Encoding.PEM,
+        serialization.PrivateFormat.PKCS8,
+        serialization.NoEncryption()
+    ))
+    monkeypatch.setattr(jwt_config, "algorithm", "EdDSA")
+    monkeypatch.setattr(jwt_config, "private_keys", f"k1={key_path}")
+    monkeypatch.setattr(jwt_config, "active_kid", "k1")
+    monkeypatch.setattr(signing_keys, "_key_ring", None)
+    return key_path
+
+
+def test_hmac_needs_no_key_ring():
+    from app.services.auth.signing_keys import init_key_ring
+
+    assert jwt_config.algorithm.startswith("HS")
+    assert init_key_ring() is False
+
+
+def test_key_ring_loads_at_startup(eddsa_config):
+    from app.services.auth.signing_keys import get_jwks, init_key_ring
+
+    assert init_key_ring() is True
+    assert [key["kid"] for key in get_jwks()["keys"]] == ["k1"]
+
+
+def test_missing_key_file_fails_startup(eddsa_config, monkeypatch, tmp_path):
+    from app.services.auth.signing_keys import init_key_ring
+
+    monkeypatch.setattr(jwt_config, "private_keys", f"k1={tmp_path / 'missing.pem'}")
+    with pytest.raises(RuntimeError):
+        init_key_ring()
+
+
+def test_invalid_key_file_fails_startup(eddsa_config):
+    from app.services.auth.signing_keys import init_key_ring
+
+    eddsa_config.write_bytes(b"not a key")
+    with pytest.raises(RuntimeError):
+        init_key_ring()
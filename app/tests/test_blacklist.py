@@ -0,0 +1,112 @@
+from datetime import datetime, timedelta, timezone
+import pytest
+from app.core.config import jwt_config
+from app.models.blacklisted_token import BlacklistedToken
+from app.models.user import User
+from app.redis import cache as redis_cache
+from app.services.auth import blacklist
+from app.services.auth.blacklist import (
+    SYNC_MARKER_KEY,
+    clear_local_revocation_cache,
+    is_token_revoked,
+    rebuild_blacklist_cache,
+    revoke_token,
+    session_version_key,
+)
+from app.services.auth.jwt_handler import create_access_token, decode_access_token, get_access_token_claims
+
+
+@pytest.fixture
+def user(db):
+    user = User(name="Test User", email="test@example.com")
+    db.add(user)
+    db.commit()
+    db.refresh(user)
+    return user
+
+
+def _issue(user):
+    token = create_access_token(get_access_token_claims(user))
+    return token, decode_access_token(token)
+
+
+def _wait_for_rebuild():
+    if blacklist._rebuild_thread:
+        blacklist._rebuild_thread.join(timeout=5)
+
+
+def test_revoked_token_is_rejected(db, redis_client, user):
+    assert rebuild_blacklist_cache()
+    token, payload = _issue(user)
+    assert not is_token_revoked(token, payload)
+
+    revoke_token(db, user.id, token, payload)
+    assert is_token_revoked(token, payload)
+    assert redis_client.ttl(f"blacklist:{payload['jti']}") > 0
+    assert db.query(BlacklistedToken).filter_by(jti=payload["jti"]).count() == 1
+
+
+def test_not_revoked_answer_is_cached_locally(db, redis_client, user):
+    assert rebuild_blacklist_cache()
+    token, payload = _issue(user)
+    assert not is_token_revoked(token, payload)
+
+    # Written behind the local tier's back: only seen once the local entry is gone
+    redis_client.set(f"blacklist:{payload['jti']}", "blacklisted")
+    assert not is_token_revoked(token, payload)
+    clear_local_revocation_cache()
+    assert is_token_revoked(token, payload)
+
+
+def test_falls_back_to_database_when_redis_is_down(db, redis_client, user, monkeypatch):
+    assert rebuild_blacklist_cache()
+    token, payload = _issue(user)
+    revoke_token(db, user.id, token, payload)
+    clear_local_revocation_cache()
+
+    monkeypatch.setattr(redis_cache.get_cache(), "client", None)
+    assert is_token_revoked(token, payload)
+
+
+def test_missing_marker_checks_database_and_rebuilds_in_background(db, redis_client, user):
+    token, payload = _issue(user)
+    db.add(BlacklistedToken(
+        user_id=user.id,
+        jti=payload["jti"],
+        expires_at=datetime.now(timezone.utc) + timedelta(minutes=5)
+    ))
+    db.commit()
+
+    # Redis has neither the entry nor the marker: Postgres answers
+    assert is_token_revoked(token, payload)
+    _wait_for_rebuild()
+    assert redis_client.exists(f"blacklist:{payload['jti']}")
+    assert 0 < redis_client.ttl(SYNC_MARKER_KEY) <= jwt_config.revocation_sync_ttl_seconds
+
+
+def test_sync_marker_expires(db, redis_client):
+    assert rebuild_blacklist_cache()
+    assert 0 < redis_client.ttl(SYNC_MARKER_KEY) <= jwt_config.revocation_sync_ttl_seconds
+
+
+def test_evicted_entry_is_caught_once_marker_expires(db, redis_client, user):
+    assert rebuild_blacklist_cache()
+    token, payload = _issue(user)
+    revoke_token(db, user.id, token, payload)
+    clear_local_revocation_cache()
+
+    # Eviction drops the entry; the marker lapses within its TTL
+    redis_client.delete(f"blacklist:{payload['jti']}", SYNC_MARKER_KEY)
+    assert is_token_revoked(token, payload)
+    _wait_for_rebuild()
+    assert redis_client.exists(f"blacklist:{payload['jti']}")
+
+
+def test_session_version_bump_revokes_older_tokens(db, redis_client, user):
+    assert rebuild_blacklist_cache()
+    token, payload = _issue(user)
+    assert not is_token_revoked(token, payload)
+
+    redis_client.incr(session_version_key(user.id))
+    clear_local_revocation_cache()
+    assert is_token_revoked(token, payload)
@@ -0,0 +1,87 @@
+import asyncio
+import httpx
+import pytest
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+from app.services.idempotency import IdempotencyMiddleware
+
+
+@pytest.fixture
+def app(redis_client):
+    """Middleware in front of an idempotent route that counts its runs"""
+    app = FastAPI()
+    app.add_middleware(IdempotencyMiddleware)
+    app.state.runs = 0
+    app.state.status = 200
+    app.state.on_run = None
+
+    @app.post("/auth/logout")
+    async def logout(request: Request):
+        app.state.runs += 1
+        run = app.state.runs
+        if app.state.on_run:
+            await app.state.on_run()
+        return JSONResponse({"run": run}, status_code=app.state.status)
+
+    return app
+
+
+def _post(app, *bodies, key="key-1"):
+    async def send_all():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await asyncio.gather(*[
+                client.post("/auth/logout", json=body, headers={"Idempotency-Key": key})
+                for body in bodies
+            ])
+
+    return asyncio.run(send_all())
+
+
+def test_retry_replays_the_first_response(app):
+    first, = _post(app, {"a": 1})
+    retry, = _post(app, {"a": 1})
+    assert app.state.runs == 1
+    assert retry.status_code == 200 and retry.json() == first.json() == {"run": 1}
+    assert retry.headers["idempotent-replayed"] == "true"
+    assert "idempotent-replayed" not in first.headers
+
+
+def test_key_reused_for_another_request_is_rejected(app):
+    _post(app, {"a": 1})
+    other, = _post(app, {"a": 2})
+    assert other.status_code == 422
+    assert app.state.runs == 1
+
+
+def test_server_errors_are_not_stored(app, redis_client):
+    app.state.status = 500
+    _post(app, {"a": 1})
+    app.state.status = 200
+    retry, = _post(app, {"a": 1})
+    assert retry.json() == {"run": 2}
+    assert not redis_client.keys("*:lock")
+
+
+def test_concurrent_duplicates_run_once(app):
+    app.state.on_run = lambda: asyncio.sleep(0.2)
+    responses = _post(app, {"a": 1}, {"a": 1}, {"a": 1})
+    assert app.state.runs == 1
+    assert [r.json() for r in responses] == [{"run": 1}] * 3
+    assert sum("idempotent-replayed" in r.headers for r in responses) == 2
+
+
+def test_expired_lock_taken_by_a_duplicate_is_not_released(app, redis_client):
+    async def lock_expires_and_is_taken():
+        lock_key, = redis_client.keys("*:lock")
+        redis_client.set(lock_key, "other-owner")
+
+    app.state.on_run = lock_expires_and_is_taken
+    _post(app, {"a": 1})
+    lock_key, = redis_client.keys("*:lock")
+    assert redis_client.get(lock_key) == "other-owner"
+
+
+def test_lock_is_released_by_its_owner(app, redis_client):
+    _post(app, {"a": 1})
+    assert not redis_client.keys("*:lock")
@@ -0,0 +1,78 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from app.services.auth.otp_handler import (
+    OTP_EXPIRE_SECONDS,
+    OTP_MAX_ATTEMPTS,
+    OTP_RESEND_COOLDOWN_SECONDS,
+    OTPHandler,
+)
+
+IDENTIFIER = "User@Example.com"
+KEY = "otp:user@example.com"
+
+
+def test_issue_stores_code_with_ttl(redis_client):
+    otp = OTPHandler.create_otp(IDENTIFIER)
+    assert otp["issued"] and otp["send_count"] == 1
+    assert otp["retry_after"] == OTP_RESEND_COOLDOWN_SECONDS
+    assert redis_client.hget(KEY, "code") == otp["code"]
+    assert 0 < redis_client.ttl(KEY) <= OTP_EXPIRE_SECONDS
+
+
+def test_request_within_cooldown_reuses_live_code(redis_client):
+    first = OTPHandler.create_otp(IDENTIFIER)
+    second = OTPHandler.create_otp(IDENTIFIER)
+    assert not second["issued"]
+    assert second["code"] == first["code"]
+    assert 0 < second["retry_after"] <= OTP_RESEND_COOLDOWN_SECONDS
+    assert second["send_count"] == 1
+
+
+def test_request_after_cooldown_issues_new_code(redis_client):
+    OTPHandler.create_otp(IDENTIFIER)
+    redis_client.hset(KEY, "sent_at", int(time.time()) - OTP_RESEND_COOLDOWN_SECONDS - 1)
+    otp = OTPHandler.create_otp(IDENTIFIER)
+    assert otp["issued"] and otp["send_count"] == 2
+    assert redis_client.hget(KEY, "code") == otp["code"]
+
+
+def test_code_is_consumed_once(redis_client):
+    otp = OTPHandler.create_otp(IDENTIFIER)
+    assert OTPHandler.validate_otp(IDENTIFIER, otp["code"])
+    assert not OTPHandler.validate_otp(IDENTIFIER, otp["code"])
+
+
+def test_concurrent_verifies_consume_code_once(redis_client):
+    otp = OTPHandler.create_otp(IDENTIFIER)
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        results = list(pool.map(lambda _: OTPHandler.validate_otp(IDENTIFIER, otp["code"]), range(8)))
+    assert results.count(True) == 1
+
+
+def test_wrong_codes_burn_the_otp(redis_client):
+    otp = OTPHandler.create_otp(IDENTIFIER)
+    wrong = "x" * len(otp["code"])
+    for attempt in range(1, OTP_MAX_ATTEMPTS):
+        assert not OTPHandler.validate_otp(IDENTIFIER, wrong)
+        assert redis_client.hget(KEY, "attempts") == str(attempt)
+
+    assert not OTPHandler.validate_otp(IDENTIFIER, wrong)
+    assert not redis_client.exists(KEY)
+    # Even the right code is useless once the attempts are spent
+    assert not OTPHandler.validate_otp(IDENTIFIER, otp["code"])
+
+
+def test_verify_without_redis_fails_closed(redis_down):
+    assert not OTPHandler.validate_otp(IDENTIFIER, "12345")
+
+
+def test_discard_keeps_send_count(redis_client):
+    OTPHandler.create_otp(IDENTIFIER)
+    assert OTPHandler.discard_otp(IDENTIFIER)
+    assert redis_client.hget(KEY, "code") is None
+    assert redis_client.hget(KEY, "send_count") == "1"
+    assert redis_client.ttl(KEY) > 0
+
+    # No cooldown after a failed send, but the counter carries on
+    otp = OTPHandler.create_otp(IDENTIFIER)
+    assert otp["issued"] and otp["send_count"] == 2
@@ -0,0 +1,200 @@
+import json
+import os
+import stat
+import time
+import pytest
+from app.rabbitmq.spool import PublishSpool, _HEADER, _RECORD
+
+
+@pytest.fixture
+def spool_path(tmp_path):
+    return str(tmp_path / "spool" / "publish.spool")
+
+
+def test_append_read_commit(spool_path):
+    spool = PublishSpool(spool_path, 4096)
+    assert spool.is_empty()
+    assert spool.append(b"one") and spool.append(b"two") and spool.append(b"three")
+
+    payloads, offset = spool.read(limit=2)
+    assert payloads == [b"one", b"two"]
+    # Reading does not consume
+    assert spool.read(limit=2)[0] == [b"one", b"two"]
+
+    spool.commit(offset)
+    payloads, offset = spool.read()
+    assert payloads == [b"three"]
+    spool.commit(offset)
+    assert spool.is_empty()
+    spool.close()
+
+
+def test_read_from_offset_continues_past_uncommitted(spool_path):
+    spool = PublishSpool(spool_path, 4096)
+    for payload in (b"a", b"b", b"c"):
+        spool.append(payload)
+
+    first, offset = spool.read(limit=1)
+    second, _ = spool.read(offset=offset)
+    assert first == [b"a"]
+    assert second == [b"b", b"c"]
+    spool.close()
+
+
+def test_full_spool_rejects_append(spool_path):
+    size = _HEADER.size + 2 * (_RECORD.size + 10)
+    spool = PublishSpool(spool_path, size)
+    assert spool.append(b"x" * 10)
+    assert spool.append(b"y" * 10)
+    assert not spool.append(b"z")
+    spool.close()
+
+
+def test_space_is_reused_once_drained(spool_path):
+    size = _HEADER.size + 2 * (_RECORD.size + 10)
+    spool = PublishSpool(spool_path, size)
+    for round_ in range(5):
+        assert spool.append(bytes([round_]) * 10)
+        assert spool.append(bytes([round_]) * 10)
+        payloads, offset = spool.read()
+        assert len(payloads) == 2
+        spool.commit(offset)
+    assert spool.is_empty()
+    spool.close()
+
+
+def test_uncommitted_records_survive_reopen(spool_path):
+    spool = PublishSpool(spool_path, 4096)
+    for payload in (b"a", b"b", b"c"):
+        spool.append(payload)
+    _, offset = spool.read(limit=1)
+    spool.commit(offset)
+    # Simulate a crash: drop the mapping without any shutdown bookkeeping
+    spool._map.close()
+    spool._file.close()
+
+    reopened = PublishSpool(spool_path, 4096)
+    assert reopened.path == spool.path
+    assert reopened.read()[0] == [b"b", b"c"]
+    reopened.close()
+
+
+def test_corrupted_tail_is_dropped(spool_path):
+    spool = PublishSpool(spool_path, 4096)
+    spool.append(b"good")
+    spool.append(b"bad!")
+    spool.append(b"lost")
+    # Flip a byte of the second payload
+    corrupt_at = _HEADER.size + _RECORD.size + len(b"good") + _RECORD.size
+    spool._map[corrupt_at] ^= 0xFF
+    spool.close()
+
+    reopened = PublishSpool(spool_path, 4096)
+    payloads, offset = reopened.read()
+    assert payloads == [b"good"]
+    reopened.commit(offset)
+    assert reopened.is_empty()
+    # Appends continue from the truncated end
+    reopened.append(b"next")
+    assert reopened.read()[0] == [b"next"]
+    reopened.close()
+
+
+def test_unreadable_header_is_reset(spool_path):
+    spool = PublishSpool(spool_path, 4096)
+    spool.append(b"a")
+    spool._map[0:4] = b"XXXX"
+    spool.close()
+
+    reopened = PublishSpool(spool_path, 4096)
+    assert reopened.is_empty()
+    reopened.close()
+
+
+def test_each_process_locks_its_own_slot(spool_path):
+    first = PublishSpool(spool_path, 4096)
+    second = PublishSpool(spool_path, 4096)
+    assert first.path == f"{spool_path}.0"
+    assert second.path == f"{spool_path}.1"
+    first.close()
+    second.close()
+
+
+def test_slot_is_private_to_its_owner(spool_path):
+    os.makedirs(os.path.dirname(spool_path))
+    # A slot left world-readable by an older version is tightened on open
+    with open(f"{spool_path}.0", "wb"):
+        pass
+    os.chmod(f"{spool_path}.0", 0o644)
+
+    spool = PublishSpool(spool_path, 4096)
+    assert stat.S_IMODE(os.stat(spool.path).st_mode) == 0o600
+    spool.close()
+
+
+class _Channel:
+    def __init__(self, fail: bool = False):
+        self.fail = fail
+        self.published = []
+
+    def basic_publish(self, exchange, routing_key, body, properties):
+        if self.fail:
+            raise ConnectionError("channel closed")
+        self.published.append(body)
+
+
+@pytest.fixture
+def publisher(spool_path, monkeypatch):
+    from app.rabbitmq import publisher as publisher_module
+
+    monkeypatch.setattr(publisher_module.rabbitmq_config, "spool_path", "")
+    background = publisher_module.BackgroundPublisher()
+    background._spool = PublishSpool(spool_path, 4096)
+    background._online = True
+    scheduled = []
+    background._schedule = lambda callback, delay=0: scheduled.append((callback, delay)) or True
+    background.scheduled = scheduled
+    yield background
+    background._spool.close()
+
+
+def _spool_record(publisher, body: bytes, enqueued_at: float) -> None:
+    publisher._spool.append(json.dumps({
+        "exchange": "otp",
+        "routing_key": "sms",
+        "body": body.decode("utf-8"),
+        "correlation_id": None,
+        "enqueued_at": enqueued_at
+    }).encode("utf-8"))
+
+
+def test_replay_drops_expired_records(publisher):
+    publisher._channel = _Channel()
+    _spool_record(publisher, b'{"otp_code": "old"}', time.time() - 3600)
+    _spool_record(publisher, b'{"otp_code": "new"}', time.time())
+
+    publisher._replay()
+    assert publisher._channel.published == [b'{"otp_code": "new"}']
+    assert publisher._replay_pending == 1
+
+
+def test_replay_commits_batch_of_only_expired_records(publisher):
+    publisher._channel = _Channel()
+    _spool_record(publisher, b'{"otp_code": "old"}', time.time() - 3600)
+
+    publisher._replay()
+    assert publisher._channel.published == []
+    assert publisher._spool.is_empty()
+    assert publisher.scheduled == [(publisher._replay, 0)]
+
+
+def test_replay_retries_when_first_publish_fails(publisher):
+    from app.rabbitmq.config import rabbitmq_config
+
+    publisher._channel = _Channel(fail=True)
+    _spool_record(publisher, b'{"otp_code": "new"}', time.time())
+
+    publisher._replay()
+    assert publisher._replay_pending == 0
+    assert not publisher._spool.is_empty()
+    assert publisher.scheduled == [(publisher._replay, rabbitmq_config.retry_delay)]
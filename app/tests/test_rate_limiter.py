@@ -0,0 +1,124 @@
+import pytest
+from app.services.auth import rate_limiter
+from app.services.auth.rate_limiter import RateLimiter, RateLimitPolicy
+
+# Long period: emission during a test run is negligible, so counts are exact
+POLICY = RateLimitPolicy(limit=100, period=3600)
+
+
+class _Inline:
+    """Runs background refills immediately, so call counts are deterministic"""
+
+    def submit(self, fn, *args):
+        fn(*args)
+
+
+@pytest.fixture
+def calls(redis_client, monkeypatch):
+    """Count GCRA script calls"""
+    counted = []
+    script = rate_limiter.GCRA_SCRIPT
+
+    def counting_script(*args, **kwargs):
+        counted.append(kwargs["args"])
+        return script(*args, **kwargs)
+
+    monkeypatch.setattr(rate_limiter, "GCRA_SCRIPT", counting_script)
+    return counted
+
+
+def _workers(count: int):
+    workers = [RateLimiter() for _ in range(count)]
+    for worker in workers:
+        worker._refills = _Inline()
+    return workers
+
+
+def _drive(workers, calls, requests: int, policy: RateLimitPolicy = POLICY):
+    """Round-robin requests of one client over the workers; returns (admitted, max calls per request)"""
+    admitted, most = 0, 0
+    for i in range(requests):
+        before = len(calls)
+        result = workers[i % len(workers)].acquire("test", "client", policy)
+        admitted += result.allowed
+        most = max(most, len(calls) - before)
+    return admitted, most
+
+
+def test_gcra_allows_burst_then_denies(redis_client):
+    limiter = RateLimiter()
+    policy = RateLimitPolicy(limit=5, period=3600)
+    results = [limiter.hit("test", "client", policy) for _ in range(6)]
+
+    assert [r.allowed for r in results] == [True] * 5 + [False]
+    assert [r.remaining for r in results[:5]] == [4, 3, 2, 1, 0]
+    assert 719 <= results[5].retry_after <= 720
+    # A denial consumes nothing
+    assert limiter.hit("test", "client", policy).retry_after <= results[5].retry_after
+
+
+def test_gcra_grants_part_of_a_batch(redis_client):
+    limiter = RateLimiter()
+    policy = RateLimitPolicy(limit=5, period=3600)
+    limiter.hit("test", "client", policy, quantity=1)
+
+    # At most half of what is left, and at least one request while any remains
+    grants = [limiter._take("test", "client", policy, quantity=10)[1] for _ in range(4)]
+    assert grants == [2, 1, 1, 0]
+
+
+@pytest.mark.parametrize("workers", [1, 4, 8])
+def test_under_limit_client_is_mostly_decided_locally(calls, workers):
+    admitted, most = _drive(_workers(workers), calls, 60)
+    assert admitted == 60
+    assert most <= 1
+    assert len(calls) <= workers + 60 / 5
+
+
+@pytest.mark.parametrize("workers", [1, 4, 8])
+def test_over_limit_client_gets_exactly_the_limit(calls, workers):
+    admitted, most = _drive(_workers(workers), calls, 400)
+    assert admitted == POLICY.limit
+    assert most <= 1
+    # Denials are cached locally until Redis would allow the key again
+    assert len(calls) / 400 < 0.25
+
+
+@pytest.mark.parametrize("workers", [4, 8])
+def test_requests_at_the_limit_are_admitted_or_still_leased(calls, workers):
+    pool = _workers(workers)
+    admitted, _ = _drive(pool, calls, POLICY.limit)
+    leased = sum(lease.tokens for lease in (w._leases.get(("test", "client")) for w in pool) if lease)
+    # Nothing is lost: requests a worker still holds are spent on its next turn
+    assert admitted + leased == POLICY.limit
+    assert leased <= 2 * workers
+
+
+def test_small_policy_skips_leasing(calls):
+    policy = RateLimitPolicy(limit=20, period=3600)
+    limiter = _workers(1)[0]
+    admitted, most = _drive([limiter], calls, 25, policy)
+    assert admitted == 20
+    assert most == 1
+    assert all(args[2] == 1 for args in calls)
+    assert limiter._leases.get(("test", "client")) is None
+
+
+def test_expired_lease_hands_back_unspent_requests(calls):
+    first, second = _workers(2)
+    assert first.acquire("test", "client", POLICY).allowed
+    lease = first._leases.get(("test", "client"))
+    assert lease.tokens == 9
+
+    # The client moves on; the lease expires with 9 requests unspent
+    lease.expires_at = 0
+    assert first.acquire("test", "client", POLICY).allowed
+    assert calls[-1][4] == 9
+
+    admitted, _ = _drive([second], calls, 200)
+    leftover = first._leases.get(("test", "client")).tokens
+    assert 2 + admitted + leftover == POLICY.limit
+
+
+def test_redis_down_fails_open(redis_down):
+    assert RateLimiter().acquire("test", "client", POLICY) is None
@@ -0,0 +1,91 @@
+import pytest
+from fastapi import HTTPException
+from app.models.refresh_token_family import RefreshTokenFamily
+from app.models.user import User
+from app.services.auth.jwt_handler import decode_refresh_token
+from app.services.auth.refresh_families import (
+    RefreshTokenFamilies,
+    create_refresh_family,
+    rotate_refresh_token,
+    sessions_key,
+)
+
+
+@pytest.fixture
+def user(db):
+    user = User(name="Test User", email="test@example.com")
+    db.add(user)
+    db.commit()
+    db.refresh(user)
+    return user
+
+
+def _login(db, user):
+    _, refresh_token = create_refresh_family(db, user)
+    return decode_refresh_token(refresh_token)
+
+
+def _rotate(db, payload):
+    _, refresh_token = rotate_refresh_token(db, payload)
+    return decode_refresh_token(refresh_token)
+
+
+def _family(db, payload):
+    db.expire_all()
+    return db.query(RefreshTokenFamily).filter_by(id=payload["fid"]).one()
+
+
+def test_rotation_swaps_the_current_jti(db, redis_client, user):
+    first = _login(db, user)
+    second = _rotate(db, first)
+
+    assert second["fid"] == first["fid"] and second["jti"] != first["jti"]
+    assert redis_client.hget(f"refresh_family:{first['fid']}", "jti") == second["jti"]
+    assert _family(db, first).current_jti == second["jti"]
+
+
+def test_reuse_revokes_the_family(db, redis_client, user):
+    first = _login(db, user)
+    second = _rotate(db, first)
+
+    with pytest.raises(HTTPException) as exc:
+        rotate_refresh_token(db, first)
+    assert exc.value.status_code == 401
+    assert _family(db, first).revoked_at is not None
+    assert not redis_client.zscore(sessions_key(user.id), first["fid"])
+
+    # The legitimate holder is logged out too
+    with pytest.raises(HTTPException):
+        rotate_refresh_token(db, second)
+
+
+def test_lost_family_is_restored_for_the_current_token(db, redis_client, user):
+    first = _login(db, user)
+    second = _rotate(db, first)
+    redis_client.flushall()
+
+    third = _rotate(db, second)
+    assert redis_client.hget(f"refresh_family:{first['fid']}", "jti") == third["jti"]
+    assert _family(db, first).current_jti == third["jti"]
+
+
+def test_lost_family_replayed_with_old_token_is_reuse(db, redis_client, user):
+    first = _login(db, user)
+    _rotate(db, first)
+    redis_client.flushall()
+
+    with pytest.raises(HTTPException) as exc:
+        rotate_refresh_token(db, first)
+    assert exc.value.detail == "Refresh token reuse detected"
+    assert _family(db, first).revoked_at is not None
+    assert not redis_client.exists(f"refresh_family:{first['fid']}")
+
+
+def test_restore_without_redis_is_unavailable(db, redis_down, user):
+    family = RefreshTokenFamily(user_id=user.id, current_jti="a" * 32)
+    db.add(family)
+    db.commit()
+
+    with pytest.raises(HTTPException) as exc:
+        RefreshTokenFamilies._restore_from_db(db, family.id, user.id, "a" * 32)
+    assert exc.value.status_code == 503
@@ -0,0 +1,98 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+from app.utils.single_flight import SingleFlight
+
+
+class _Fetch:
+    """Slow fetch that counts how often it really runs"""
+
+    def __init__(self, result="value", delay=0.2, error=None):
+        self.result = result
+        self.delay = delay
+        self.error = error
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def __call__(self):
+        with self._lock:
+            self.calls += 1
+        time.sleep(self.delay)
+        if self.error:
+            raise self.error
+        return self.result
+
+
+def _concurrently(count, fn):
+    with ThreadPoolExecutor(max_workers=count) as pool:
+        futures = [pool.submit(fn) for _ in range(count)]
+        return [future.result() for future in futures]
+
+
+def test_concurrent_calls_share_one_fetch():
+    flight, fetch = SingleFlight("test"), _Fetch()
+    results = _concurrently(8, lambda: flight.do("k", fetch))
+    assert results == ["value"] * 8
+    assert fetch.calls == 1
+
+    # Nothing is cached: a later call fetches again
+    assert flight.do("k", fetch) == "value"
+    assert fetch.calls == 2
+
+
+def test_error_is_shared_and_not_remembered():
+    flight, fetch = SingleFlight("test"), _Fetch(error=ValueError("down"))
+
+    def call():
+        with pytest.raises(ValueError):
+            flight.do("k", fetch)
+
+    _concurrently(4, call)
+    assert fetch.calls == 1
+    fetch.error = None
+    assert flight.do("k", fetch) == "value"
+
+
+def test_different_keys_fetch_independently():
+    flight, fetch = SingleFlight("test"), _Fetch()
+    keys = iter(["a", "b", "c"])
+    _concurrently(3, lambda: flight.do(next(keys), fetch))
+    assert fetch.calls == 3
+
+
+def test_workers_coalesce_through_the_redis_lock(redis_client):
+    # Two processes: each has its own in-process table, they share Redis and the cache
+    cache = {}
+    fetch = _Fetch()
+
+    def fetch_and_cache():
+        cache["k"] = fetch()
+        return cache["k"]
+
+    workers = [SingleFlight("test", redis_lock_ms=2000) for _ in range(2)]
+    flights = iter(workers * 4)
+    results = _concurrently(8, lambda: next(flights).do("k", fetch_and_cache, recheck=lambda: cache.get("k")))
+    assert results == ["value"] * 8
+    assert fetch.calls == 1
+    assert not redis_client.keys("single_flight:*")
+
+
+def test_waiter_fetches_itself_when_holder_stores_nothing(redis_client):
+    fetch = _Fetch(result=None, delay=0.1)
+    workers = [SingleFlight("test", redis_lock_ms=2000) for _ in range(2)]
+    flights = iter(workers)
+    _concurrently(2, lambda: next(flights).do("k", fetch, recheck=lambda: None))
+    assert fetch.calls == 2
+
+
+def test_lock_taken_over_after_expiry_is_not_released(redis_client):
+    flight = SingleFlight("test", redis_lock_ms=2000)
+
+    def fetch():
+        # Our lock expired and another worker took it
+        redis_client.set("single_flight:test:k", "other-owner")
+        return "value"
+
+    assert flight.do("k", fetch, recheck=lambda: None) == "value"
+    assert redis_client.get("single_flight:test:k") == "other-owner"
@@ -0,0 +1,58 @@
+from app.models.user import User
+from app.services.user_cache import UserCache, cache_user, invalidate_user
+
+USER_ID = "u1"
+
+
+def _snapshot(name="Alice", email="alice@example.com", profile_version=1, session_version=0) -> User:
+    """A user row as some reader loaded it"""
+    return User(id=USER_ID, name=name, email=email, profile_version=profile_version, session_version=session_version)
+
+
+def test_store_writes_record_and_identifier_keys(redis_client):
+    cache_user(_snapshot())
+    assert UserCache.get(USER_ID)["name"] == "Alice"
+    assert redis_client.get("user_id:alice@example.com") == USER_ID
+    assert redis_client.ttl(f"user:{USER_ID}") > 0
+
+
+def test_stale_profile_version_does_not_overwrite(redis_client):
+    cache_user(_snapshot(name="Alice Updated", profile_version=2))
+    # A reader that loaded the row before the update finishes last
+    cache_user(_snapshot(name="Alice", profile_version=1))
+    assert UserCache.get(USER_ID)["name"] == "Alice Updated"
+
+
+def test_stale_session_version_does_not_overwrite(redis_client):
+    # "Log out everywhere" bumped the session version and wrote the row through
+    cache_user(_snapshot(session_version=1))
+    cache_user(_snapshot(name="Stale", session_version=0))
+    record = UserCache.get(USER_ID)
+    assert record["name"] == "Alice" and record["session_version"] == 1
+
+
+def test_same_or_newer_versions_overwrite(redis_client):
+    cache_user(_snapshot(profile_version=2, session_version=1))
+    cache_user(_snapshot(name="Same", profile_version=2, session_version=1))
+    assert UserCache.get(USER_ID)["name"] == "Same"
+    cache_user(_snapshot(name="Newer", profile_version=3, session_version=1))
+    assert UserCache.get(USER_ID)["name"] == "Newer"
+
+
+def test_stale_store_does_not_restore_a_replaced_email(redis_client):
+    cache_user(_snapshot())
+    # Email change: new snapshot written through, old identifier dropped
+    invalidate_user(USER_ID, "alice@example.com")
+    cache_user(_snapshot(email="alice@new.example.com", profile_version=2))
+
+    cache_user(_snapshot(profile_version=1))
+    assert not redis_client.exists("user_id:alice@example.com")
+    assert UserCache.get_many_by_identifier(["alice@example.com"]) == {}
+    assert UserCache.get_many_by_identifier(["alice@new.example.com"])["alice@new.example.com"]["id"] == USER_ID
+
+
+def test_identifier_key_of_another_owner_is_ignored(redis_client):
+    cache_user(_snapshot())
+    # An identifier key can outlive a change of email
+    redis_client.set("user_id:someone@example.com", USER_ID)
+    assert UserCache.get_many_by_identifier(["someone@example.com"]) == {}
@@ -0,0 +1,102 @@
+import pytest
+from sqlalchemy import event
+from app.db.database import engine
+from app.models.user import User
+from app.rabbitmq.consumer import Delivery
+from app.services import user_lookup_service
+from app.services.user_lookup_consumer import ConsumerManager, LookupDispatcher
+
+
+class _Producer:
+    def __init__(self):
+        self.published = []
+
+    def publish_message(self, exchange, routing_key, message, correlation_id=None, content_type=None):
+        self.published.append((message, correlation_id, content_type))
+        return True
+
+
+@pytest.fixture
+def producer(monkeypatch):
+    producer = _Producer()
+    monkeypatch.setattr(user_lookup_service, "get_rabbitmq_producer", lambda: producer)
+    return producer
+
+
+@pytest.fixture
+def manager(producer):
+    # Dispatcher only: no broker connection or consumer thread
+    manager = ConsumerManager.__new__(ConsumerManager)
+    LookupDispatcher.__init__(manager)
+    return manager
+
+
+@pytest.fixture
+def users(db):
+    alice = User(name="Alice", email="alice@example.com", phone_number="+989121234567")
+    bob = User(name="Bob", email="bob@example.com")
+    db.add_all([alice, bob])
+    db.commit()
+    db.refresh(alice)
+    db.refresh(bob)
+    return alice, bob
+
+
+@pytest.fixture
+def user_queries():
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if "FROM users" in statement:
+            statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", record)
+    yield statements
+    event.remove(engine, "before_cursor_execute", record)
+
+
+def test_batch_replies_to_each_message_with_its_correlation_id(manager, producer, redis_client, users, user_queries):
+    alice, bob = users
+    deliveries = [
+        Delivery({"request_id": "r1", "phone_or_email": "ALICE@example.com"}, "application/json"),
+        Delivery({"request_id": "r2", "type": "user_lookup", "phone_or_email": "0912 123 4567"}, "application/msgpack"),
+        Delivery({"request_id": "r3", "phone_or_email": "nobody@example.com"}, "application/json"),
+        Delivery({"request_id": "r4", "type": "user_lookup_bulk", "identifiers": ["bob@example.com"],
+                  "user_ids": [alice.id, "missing-id"]}, "application/json"),
+        Delivery({"request_id": "r5", "type": "user_delete"}, "application/json"),
+    ]
+
+    assert manager._handle_batch(deliveries) == [True] * 5
+    # One reply per message, in order, correlated by request id and in the peer's encoding
+    assert [(m["request_id"], c, t) for m, c, t in producer.published] == [
+        (d.data["request_id"], d.data["request_id"], d.content_type) for d in deliveries
+    ]
+    replies = [message for message, _, _ in producer.published]
+    assert replies[0]["user_data"]["user_id"] == alice.id
+    assert replies[1]["user_data"]["user_id"] == alice.id
+    assert not replies[2]["success"] and replies[2]["user_data"] is None
+    assert replies[3]["results"]["bob@example.com"]["user_id"] == bob.id
+    assert replies[3]["results"][alice.id]["name"] == "Alice"
+    assert replies[3]["not_found"] == ["missing-id"]
+    assert not replies[4]["success"] and "user_delete" in replies[4]["error_message"]
+    # One query per message type, however many messages share it
+    assert len(user_queries) == 2
+
+
+def test_cached_users_are_resolved_without_a_query(manager, producer, redis_client, users, user_queries):
+    batch = [Delivery({"request_id": "r1", "phone_or_email": "alice@example.com"}, "application/json")]
+    manager._handle_batch(batch)
+    user_queries.clear()
+
+    manager._handle_batch(batch)
+    assert producer.published[-1][0]["success"]
+    assert user_queries == []
+
+
+def test_failed_publish_is_reported_per_message(manager, producer, redis_client, users, monkeypatch):
+    monkeypatch.setattr(producer, "publish_message", lambda **kwargs: kwargs["correlation_id"] != "r2")
+    deliveries = [
+        Delivery({"request_id": request_id, "phone_or_email": "alice@example.com"}, "application/json")
+        for request_id in ("r1", "r2", "r3")
+    ]
+    assert manager._handle_batch(deliveries) == [True, False, True]
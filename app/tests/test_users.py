@@ -1 +1,76 @@
- 
\ No newline at end of file
+import pytest
+from fastapi.testclient import TestClient
+from app.core.config import app_config
+from app.db.database import get_db
+from app.main import app
+from app.models.user import User
+from app.services.auth.jwt_handler import create_access_token, get_access_token_claims
+
+
+@pytest.fixture
+def client(db):
+    # No context manager: startup (Postgres, RabbitMQ) is not run
+    app.dependency_overrides[get_db] = lambda: db
+    yield TestClient(app)
+    app.dependency_overrides.clear()
+
+
+@pytest.fixture
+def email_only_user(db):
+    user = User(name="Email Only", email="email-only@example.com")
+    db.add(user)
+    db.commit()
+    db.refresh(user)
+    return user
+
+
+def _auth(user):
+    return {"Authorization": f"Bearer {create_access_token(get_access_token_claims(user))}"}
+
+
+def test_profile_of_email_only_user_from_cache(client, redis_client, email_only_user):
+    for _ in range(2):  # Postgres miss, then the Redis snapshot
+        response = client.get("/users/profile", headers=_auth(email_only_user))
+        assert response.status_code == 200
+        assert response.json()["phone_number"] is None
+        assert response.json()["email"] == "email-only@example.com"
+    assert redis_client.exists(f"user:{email_only_user.id}")
+
+
+def test_profile_of_email_only_user_from_claims(client, redis_client, email_only_user, monkeypatch):
+    monkeypatch.setattr(app_config, "stateless_profile", True)
+    response = client.get("/users/profile", headers=_auth(email_only_user))
+    assert response.status_code == 200
+    assert response.json()["phone_number"] is None
+    assert response.json()["id"] == email_only_user.id
+    # Answered from the token: no cache read-through happened
+    assert not redis_client.exists(f"user:{email_only_user.id}")
+
+
+@pytest.fixture
+def no_country_code(monkeypatch):
+    monkeypatch.setattr(app_config, "phone_default_country_code", "")
+
+
+def test_national_number_without_country_code_is_a_400(client, redis_client, no_country_code):
+    response = client.post("/auth/check", json={"identifier": "0912 123 4567"})
+    assert response.status_code == 400
+    assert "international format" in response.json()["detail"]
+
+    # International numbers keep working
+    assert client.post("/auth/check", json={"identifier": "+989121234567"}).status_code == 200
+
+
+def test_profile_update_with_national_number_without_country_code_is_a_400(client, redis_client, email_only_user, no_country_code):
+    response = client.patch("/users/profile", json={"phone_number": "09121234567"}, headers=_auth(email_only_user))
+    assert response.status_code == 400
+    assert "international format" in response.json()["detail"]
+
+
+def test_startup_check_tolerates_missing_country_code(no_country_code, monkeypatch):
+    from app.utils.validators import check_phone_country_code
+
+    assert check_phone_country_code() is False
+    monkeypatch.setattr(app_config, "phone_default_country_code", "+98")
+    with pytest.raises(RuntimeError):
+        check_phone_country_code()
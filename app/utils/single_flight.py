@@ -0,0 +1,111 @@
+import logging
+import threading
+import time
+import uuid
+from typing import Callable, Dict, Optional, TypeVar
+from app.redis.cache import get_cache
+from app.redis.scripts import register_script
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# Delete the lock only if this caller still holds it
+RELEASE_SCRIPT = register_script("single_flight_release", """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+""")
+
+POLL_INTERVAL = 0.01
+
+
+class _Call:
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error: Optional[BaseException] = None
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls for the same key into one.
+
+    Within a process, the first caller runs the fetch and every concurrent
+    caller for that key waits for and shares its result (or exception).
+    With `redis_lock_ms` set and a `recheck` callable, the leader also takes
+    a short Redis lock so leaders in other workers poll `recheck` (usually a
+    cache read) instead of fetching; once the lock is released or expires
+    without a result they fetch themselves.
+    """
+
+    def __init__(self, name: str, redis_lock_ms: int = 0):
+        self.name = name
+        self.redis_lock_ms = redis_lock_ms
+        self._calls: Dict[str, _Call] = {}
+        self._lock = threading.Lock()
+
+    def do(self, key: str, fn: Callable[[], T], recheck: Optional[Callable[[], Optional[T]]] = None) -> T:
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = self._lead(key, fn, recheck)
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    def _lead(self, key: str, fn: Callable[[], T], recheck: Optional[Callable[[], Optional[T]]]) -> T:
+        client = get_cache().client if self.redis_lock_ms and recheck else None
+        if not client:
+            return fn()
+
+        lock_key = f"single_flight:{self.name}:{key}"
+        token = uuid.uuid4().hex
+        try:
+            acquired = client.set(lock_key, token, nx=True, px=self.redis_lock_ms)
+        except Exception as e:
+            logger.error(f"Single-flight lock failed for {lock_key}: {e}")
+            return fn()
+
+        if not acquired:
+            # Another worker is fetching; wait for its result to land in the cache
+            deadline = time.monotonic() + self.redis_lock_ms / 1000
+            while time.monotonic() < deadline:
+                time.sleep(POLL_INTERVAL)
+                result = recheck()
+                if result is not None:
+                    return result
+                try:
+                    if not client.exists(lock_key):
+                        break
+                except Exception:
+                    break
+            # The holder may have stored its result just before releasing
+            result = recheck()
+            return result if result is not None else fn()
+
+        try:
+            return fn()
+        finally:
+            try:
+                RELEASE_SCRIPT(keys=[lock_key], args=[token], client=client)
+            except Exception as e:
+                logger.error(f"Single-flight unlock failed for {lock_key}: {e}")
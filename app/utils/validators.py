@@ -1,11 +1,97 @@
 import re
+from typing import Tuple
 from fastapi import HTTPException
+from app.core.config import app_config
+
+EMAIL_PATTERN = re.compile(r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$')
+# Separators people type inside phone numbers
+_PHONE_SEPARATORS = re.compile(r'[\s\-().]')
+COUNTRY_CODE_PATTERN = re.compile(r'^[1-9]\d{0,2}$')
+
+
+class MissingCountryCodeError(ValueError):
+    """A national phone number arrived while PHONE_DEFAULT_COUNTRY_CODE is unset"""
+
+
+def get_identifier_type(identifier: str) -> str:
+    """Classify an identifier as email or phone_number"""
+    return "email" if EMAIL_PATTERN.match(identifier.strip()) else "phone_number"
+
+
+def normalize_email(email: str) -> str:
+    """Canonical email: trimmed and lower-cased"""
+    if not email:
+        return email
+    return email.strip().lower()
+
 
 def normalize_phone_number(phone: str) -> str:
-    """Normalize phone number by removing leading '+' if present"""
+    """
+    Canonical E.164 phone number ("+" followed by 8-15 digits).
+    "00" international prefixes become "+", and a national number with a
+    leading trunk "0" gets PHONE_DEFAULT_COUNTRY_CODE.
+
+    Raises:
+        MissingCountryCodeError: if the number is national and no country code is configured
+        ValueError: if the number can't be brought into E.164 form
+    """
     if not phone:
         return phone
-    return phone.lstrip('+')
+    digits = _PHONE_SEPARATORS.sub('', phone.strip())
+    if digits.startswith('+'):
+        digits = digits[1:]
+    elif digits.startswith('00'):
+        digits = digits[2:]
+    elif digits.startswith('0'):
+        if not app_config.phone_default_country_code:
+            raise MissingCountryCodeError(
+                "National phone numbers are not accepted; use the international format starting with +"
+            )
+        digits = app_config.phone_default_country_code + digits[1:]
+
+    if not re.fullmatch(r'[1-9]\d{7,14}', digits):
+        raise ValueError(f"Invalid phone number: {phone}")
+    return f"+{digits}"
+
+
+def check_phone_country_code() -> bool:
+    """
+    Check whether national phone numbers can be canonicalized. Without a
+    country code they are rejected per request, so their owners have to
+    sign in with the international form until it is configured.
+
+    Returns:
+        True if PHONE_DEFAULT_COUNTRY_CODE is set
+
+    Raises:
+        RuntimeError: if PHONE_DEFAULT_COUNTRY_CODE is set but malformed
+    """
+    country_code = app_config.phone_default_country_code
+    if not country_code:
+        return False
+    if not COUNTRY_CODE_PATTERN.match(country_code):
+        raise RuntimeError(
+            "PHONE_DEFAULT_COUNTRY_CODE must be the country calling code (digits only, e.g. \"98\") "
+            "applied to national phone numbers"
+        )
+    return True
+
+
+def parse_identifier(identifier: str) -> Tuple[str, str]:
+    """
+    Classify and canonicalize an email or phone number once, so lookups are a
+    single equality on the matching unique column
+
+    Returns:
+        (identifier_type, canonical value)
+
+    Raises:
+        ValueError: if a phone number is malformed
+    """
+    identifier_type = get_identifier_type(identifier)
+    if identifier_type == "email":
+        return identifier_type, normalize_email(identifier)
+    return identifier_type, normalize_phone_number(identifier)
 
 def validate_name(value):
     if not re.match(r"^[A-Za-z\s]{2,100}$", value):